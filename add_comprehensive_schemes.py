@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 import pymongo
 from datetime import datetime
+from mongodb_adapter import bump_corpus_version, prepare_scheme_document
 
 # Connect to MongoDB
 client = pymongo.MongoClient('mongodb://localhost:27017/')
@@ -301,6 +302,7 @@ added = 0
 updated = 0
 
 for scheme in central_schemes:
+    prepare_scheme_document(scheme)
     existing = schemes.find_one({"title": scheme["title"]})
     
     if existing:
@@ -317,6 +319,9 @@ for scheme in central_schemes:
         added += 1
         print(f"✅ Added: {scheme['title']}")
 
+# Invalidate cached query results in running servers
+bump_corpus_version(db)
+
 print(f"\n📊 Summary:")
 print(f"   ✅ Added: {added} new schemes")
 print(f"   🔄 Updated: {updated} existing schemes")
@@ -25,4 +25,9 @@ urlpatterns = [
     
     # API endpoints
     path('api/stats/', views.api_scheme_stats, name='api_scheme_stats'),
+    path('api/mongodb-pool/', views.api_mongodb_pool_stats, name='api_mongodb_pool_stats'),
+    path('api/query-cache/', views.api_query_cache_stats, name='api_query_cache_stats'),
+    path('api/tts-cache/', views.api_tts_cache_stats, name='api_tts_cache_stats'),
+    path('api/chat-log/', views.api_chat_log_stats, name='api_chat_log_stats'),
+    path('api/pipeline/', views.api_query_pipeline, name='api_query_pipeline'),
 ]
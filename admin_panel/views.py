@@ -406,4 +406,118 @@ def api_scheme_stats(request):
         return Response({
             'success': False,
             'error': str(e)
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_mongodb_pool_stats(request):
+    """
+    API endpoint for MongoDB connection pool usage in this worker process
+    """
+    try:
+        from mongodb_adapter import get_pool_stats
+        from chatbot.query_compiler import query_compiler
+        
+        return Response({
+            'success': True,
+            'stats': get_pool_stats(),
+            'query_plan_shapes': query_compiler.get_stats()
+        })
+        
+    except Exception as e:
+        logger.error(f"Error in api_mongodb_pool_stats: {e}")
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_query_cache_stats(request):
+    """
+    API endpoint for query result cache counters in this worker process
+    """
+    try:
+        from chatbot.chatbot_logic import chatbot
+        
+        return Response({
+            'success': True,
+            'enabled': chatbot.query_cache is not None,
+            'stats': chatbot.query_cache.get_stats() if chatbot.query_cache else {}
+        })
+        
+    except Exception as e:
+        logger.error(f"Error in api_query_cache_stats: {e}")
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_tts_cache_stats(request):
+    """
+    API endpoint for synthesized speech cache counters in this worker process
+    """
+    try:
+        from chatbot.voice_processing import voice_processor
+        
+        tts_cache = voice_processor.tts_cache
+        return Response({
+            'success': True,
+            'enabled': tts_cache is not None,
+            'stats': tts_cache.get_stats() if tts_cache else {}
+        })
+        
+    except Exception as e:
+        logger.error(f"Error in api_tts_cache_stats: {e}")
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_chat_log_stats(request):
+    """
+    API endpoint for the background chat log writer in this worker process
+    """
+    try:
+        from chatbot.chat_log import chat_log_writer
+        
+        return Response({
+            'success': True,
+            'stats': chat_log_writer.get_stats()
+        })
+        
+    except Exception as e:
+        logger.error(f"Error in api_chat_log_stats: {e}")
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_query_pipeline(request):
+    """
+    API endpoint describing the query pipeline stages and the route each intent takes
+    """
+    try:
+        from chatbot.chatbot_logic import chatbot
+        
+        return Response({
+            'success': True,
+            'pipeline': chatbot.pipeline.describe()
+        })
+        
+    except Exception as e:
+        logger.error(f"Error in api_query_pipeline: {e}")
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
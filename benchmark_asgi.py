@@ -0,0 +1,153 @@
+"""
+Compare sync (WSGI) and async (ASGI) throughput of the chat and search endpoints
+
+Start both servers with the same number of workers, for example
+    gunicorn govt_voice_chatbot.wsgi -w 1 --threads 8 -b 127.0.0.1:8001
+    uvicorn govt_voice_chatbot.asgi:application --workers 1 --port 8002
+and run
+    python benchmark_asgi.py --wsgi http://127.0.0.1:8001 --asgi http://127.0.0.1:8002
+or let the script start them with --launch (gunicorn and uvicorn must be installed).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from urllib.parse import urlencode, urlsplit
+
+# name -> (method, path, JSON body)
+ENDPOINTS = {
+    'greeting': ('POST', '/api/chat/text/', {'query': 'hello', 'language': 'en'}),
+    'text_chat': ('POST', '/api/chat/text/', {'query': 'What are the agriculture schemes available?', 'language': 'en'}),
+    'scheme_search': ('GET', '/api/schemes/search/?' + urlencode({'q': 'health insurance for senior citizens'}), None),
+    'advanced_search': ('POST', '/api/chat/advanced-search/', {'sector': 'health', 'sortBy': 'alphabetical'}),
+}
+
+
+async def send(host: str, port: int, method: str, path: str, body) -> int:
+    """One HTTP/1.1 request on a fresh connection; returns the status code"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        payload = json.dumps(body).encode() if body is not None else b''
+        head = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+        if body is not None:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+        writer.write(head.encode() + b"\r\n" + payload)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def run_load(base_url: str, endpoint: str, concurrency: int, duration: float) -> dict:
+    """Keep `concurrency` requests in flight for `duration` seconds"""
+    url = urlsplit(base_url)
+    method, path, body = ENDPOINTS[endpoint]
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status = await send(url.hostname, url.port or 80, method, path, body)
+                if status >= 400:
+                    errors += 1
+            except (OSError, ValueError, IndexError):
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000 if latencies else 0.0
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+def wait_for_server(base_url: str, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            request = urllib.request.Request(base_url + '/api/schemes/sectors/', headers={'Host': 'localhost'})
+            urllib.request.urlopen(request, timeout=2)
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} did not start within {timeout}s")
+
+
+def launch_servers(workers: int, threads: int, wsgi_port: int, asgi_port: int):
+    """Start gunicorn (sync workers) and uvicorn with the same worker count"""
+    env = dict(os.environ, VOICE_WARMUP_ON_STARTUP=os.getenv('VOICE_WARMUP_ON_STARTUP', 'False'))
+    wsgi = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'govt_voice_chatbot.wsgi', '-w', str(workers),
+         '--threads', str(threads), '-b', f'127.0.0.1:{wsgi_port}', '--log-level', 'warning'],
+        env=dict(env, ASYNC_VIEWS='False')
+    )
+    asgi = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'govt_voice_chatbot.asgi:application', '--workers', str(workers),
+         '--port', str(asgi_port), '--log-level', 'warning'],
+        env=env
+    )
+    return [wsgi, asgi]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--wsgi', default='http://127.0.0.1:8001', help='Base URL of the WSGI server')
+    parser.add_argument('--asgi', default='http://127.0.0.1:8002', help='Base URL of the ASGI server')
+    parser.add_argument('--endpoints', nargs='+', default=list(ENDPOINTS), choices=list(ENDPOINTS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64, 256])
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per measurement')
+    parser.add_argument('--launch', action='store_true', help='Start gunicorn and uvicorn here')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes per server (--launch)')
+    parser.add_argument('--threads', type=int, default=8, help='Threads per gunicorn worker (--launch)')
+    args = parser.parse_args()
+
+    processes = []
+    if args.launch:
+        processes = launch_servers(args.workers, args.threads, urlsplit(args.wsgi).port, urlsplit(args.asgi).port)
+    try:
+        for base_url in (args.wsgi, args.asgi):
+            wait_for_server(base_url)
+
+        print(f"{'endpoint':<16} {'server':<6} {'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+              f"{'p99 ms':>9} {'errors':>7}")
+        for endpoint in args.endpoints:
+            for concurrency in args.concurrency:
+                for server, base_url in (('wsgi', args.wsgi), ('asgi', args.asgi)):
+                    result = asyncio.run(run_load(base_url, endpoint, concurrency, args.duration))
+                    print(f"{endpoint:<16} {server:<6} {concurrency:>5} {result['rps']:>9.1f} "
+                          f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} "
+                          f"{result['errors']:>7}")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Compare speech recognition engines (see chatbot/stt_engines.py) on the same clips
+
+Each engine runs in its own process so memory figures don't mix, for example
+    python benchmark_stt.py clips/*.wav --engines whisper ctranslate2 --model base
+Reported per engine:
+    load s       time to load the model
+    RTF          processing seconds per second of audio (lower is better; < 1 is faster than real time)
+    batch RTF    the same with all clips transcribed in one batch
+    RSS MB       resident memory after loading, and peak over the run
+Use --model-dir ENGINE=PATH to point an engine at a local model (e.g. a converted CTranslate2 directory).
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+
+def measure(engine_name: str, model_name: str, paths, language, compute_type: str, threads: int) -> dict:
+    """Load one engine and transcribe every clip, one at a time and then as one batch"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'govt_voice_chatbot.settings')
+    import django
+    django.setup()
+
+    from chatbot.audio_decoding import SAMPLE_RATE, decode_audio
+    from chatbot.model_registry import resident_memory_mb
+    from chatbot.stt_engines import create_engine
+    from chatbot.voice_processing import SUPPORTED_LANGUAGES
+
+    clips = []
+    for path in paths:
+        with open(path, 'rb') as audio_file:
+            clips.append((decode_audio(audio_file.read()), language))
+    audio_seconds = sum(len(audio) for audio, _ in clips) / SAMPLE_RATE
+
+    baseline = resident_memory_mb()
+    started = time.perf_counter()
+    engine = create_engine(engine_name, model_name, SUPPORTED_LANGUAGES,
+                           compute_type=compute_type, cpu_threads=threads)
+    load_seconds = time.perf_counter() - started
+    engine.warm()
+    loaded = resident_memory_mb()
+
+    texts = []
+    started = time.perf_counter()
+    for clip in clips:
+        result = engine.transcribe_batch([clip], {})[0]
+        texts.append(str(result) if isinstance(result, Exception) else result['text'].strip())
+    sequential = time.perf_counter() - started
+
+    started = time.perf_counter()
+    engine.transcribe_batch(clips, {})
+    batched = time.perf_counter() - started
+
+    return {
+        'engine': engine_name,
+        'model': model_name,
+        'clips': len(clips),
+        'audio_seconds': audio_seconds,
+        'load_seconds': load_seconds,
+        'rtf': sequential / audio_seconds,
+        'batch_rtf': batched / audio_seconds,
+        'model_rss_mb': loaded - baseline,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'texts': texts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('clips', nargs='+', help='Audio files (WAV, or anything ffmpeg reads)')
+    parser.add_argument('--engines', nargs='+', default=['whisper', 'ctranslate2'])
+    parser.add_argument('--model', default='base', help='Model size for every engine')
+    parser.add_argument('--model-dir', action='append', default=[], metavar='ENGINE=PATH',
+                        help='Local model for one engine (overrides --model)')
+    parser.add_argument('--language', default=None, help='Skip language detection and decode in this language')
+    parser.add_argument('--compute-type', default='int8', help='CTranslate2 weight type')
+    parser.add_argument('--threads', type=int, default=0, help='Inference threads (0 = runtime default)')
+    parser.add_argument('--show-text', action='store_true', help='Print each engine\'s transcripts')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    models = dict(item.split('=', 1) for item in args.model_dir)
+
+    if args.child:
+        if args.threads:
+            import torch
+            torch.set_num_threads(args.threads)
+        result = measure(args.child, models.get(args.child, args.model), args.clips, args.language,
+                         args.compute_type, args.threads)
+        print(json.dumps(result))
+        return
+
+    results = []
+    for engine in args.engines:
+        command = [sys.executable, __file__, *args.clips, '--child', engine, '--model', args.model,
+                   '--compute-type', args.compute_type, '--threads', str(args.threads)]
+        command += [f'--model-dir={item}' for item in args.model_dir]
+        if args.language:
+            command += ['--language', args.language]
+        completed = subprocess.run(command, stdout=subprocess.PIPE, text=True)
+        if completed.returncode != 0:
+            print(f"{engine}: failed (exit {completed.returncode})", file=sys.stderr)
+            continue
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    if not results:
+        sys.exit(1)
+    print(f"{len(args.clips)} clip(s), {results[0]['audio_seconds']:.1f}s of audio")
+    print(f"{'engine':<12} {'load s':>7} {'RTF':>7} {'batch RTF':>10} {'model RSS MB':>13} {'peak RSS MB':>12}")
+    for result in results:
+        print(f"{result['engine']:<12} {result['load_seconds']:>7.2f} {result['rtf']:>7.3f} "
+              f"{result['batch_rtf']:>10.3f} {result['model_rss_mb']:>13.0f} {result['peak_rss_mb']:>12.0f}")
+    if args.show_text:
+        for result in results:
+            print(f"\n{result['engine']}:")
+            for path, text in zip(args.clips, result['texts']):
+                print(f"  {os.path.basename(path)}: {text}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,15 @@
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ChatbotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chatbot'
+    
+    def ready(self):
+        # Build the in-memory scheme index in the background so the first query doesn't pay for it
+        if settings.SCHEME_SEARCH_ENGINE == 'bm25' and settings.SCHEME_SEARCH_INDEX_PRELOAD:
+            from mongodb_adapter import warm_search_index
+            threading.Thread(target=warm_search_index, name='scheme-index-warmup', daemon=True).start()
@@ -0,0 +1,206 @@
+"""
+Native async versions of the chat, search and voice endpoints
+Used instead of the sync views when ASYNC_VIEWS is on (the ASGI entry point
+sets it). MongoDB is awaited on the async client, chat logging is only a
+queue put, and speech models run on the offload thread pool, so one worker
+keeps many requests in flight while recognition or synthesis runs.
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from rest_framework import status
+
+from .chatbot_logic import chatbot
+from .views import (
+    _advanced_search_message, _advanced_search_params, _advanced_search_response_data, _flag,
+    _log_advanced_search, _scheme_search_response_data, _text_chat_response_data, _voice_busy_response,
+    _voice_response_data, _voice_too_long_response
+)
+from .voice_processing import MAX_AUDIO_BYTES, voice_processor
+
+logger = logging.getLogger(__name__)
+
+
+async def _asession_id(request):
+    """Get the chat session ID, starting a session on first use"""
+    session_id = await request.session.aget('session_id')
+    if not session_id:
+        session_id = str(uuid.uuid4())
+        await request.session.aset('session_id', session_id)
+    return session_id
+
+
+def _request_data(request):
+    """JSON or form body, as DRF's request.data gives the sync views"""
+    if request.content_type == 'application/json':
+        return json.loads(request.body or b'{}')
+    return request.POST
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def voice_api(request):
+    """
+    Handle voice input from the frontend
+    This endpoint processes voice input and returns both text and audio responses
+    """
+    try:
+        # Turn the upload away before parsing it when recognition cannot take another job
+        if voice_processor.stt_busy():
+            return _voice_busy_response()
+
+        session_id = await _asession_id(request)
+        language = request.POST.get('language', 'en')
+        context = chatbot.get_context(session_id, language)
+
+        if 'audio' not in request.FILES:
+            return JsonResponse({
+                'success': False,
+                'error': 'No audio file provided',
+                'bot': 'Please provide an audio file or use the microphone.'
+            })
+
+        audio_file = request.FILES['audio']
+        if audio_file.size > MAX_AUDIO_BYTES:
+            return JsonResponse({
+                'success': False,
+                'error': 'Audio file too large (max 10MB)',
+                'bot': 'Sorry, that recording is too long. Please try a shorter question.'
+            })
+        audio_bytes = audio_file.read()
+
+        include_base64 = _flag(request.POST.get('audio_base64', request.GET.get('audio_base64')),
+                               settings.VOICE_AUDIO_BASE64_DEFAULT)
+
+        result = await chatbot.aprocess_voice_query(audio_bytes, include_audio_base64=include_base64, context=context)
+        if result.get('busy'):
+            return _voice_busy_response()
+        if result.get('too_long'):
+            return _voice_too_long_response(result['error'])
+
+        return JsonResponse(_voice_response_data(result, include_base64))
+
+    except Exception as e:
+        logger.error(f"Voice API error: {e}")
+        return JsonResponse({
+            'success': False,
+            'error': str(e),
+            'bot': 'Sorry, there was an error processing your request. Please try again.'
+        })
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def text_chat_api(request):
+    """
+    Handle text-based chat queries
+    This endpoint processes text input and returns relevant scheme information
+    """
+    try:
+        data = _request_data(request)
+        query = data.get('query', '').strip()
+        language = data.get('language', 'en')
+
+        if not query:
+            return JsonResponse({
+                'success': False,
+                'error': 'Query is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        context = chatbot.get_context(await _asession_id(request), language)
+        result = await chatbot.aprocess_query(query, language, context=context)
+
+        response_data, response_status = _text_chat_response_data(result)
+        return JsonResponse(response_data, status=response_status)
+
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid JSON data'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    except Exception as e:
+        logger.error(f"Text chat API error: {e}")
+        return JsonResponse({
+            'success': False,
+            'error': str(e),
+            'response': 'Sorry, there was an error processing your request. Please try again.'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_http_methods(["GET"])
+async def scheme_search_api(request):
+    """
+    Search for government schemes
+    """
+    try:
+        query = request.GET.get('q', '').strip()
+        language = request.GET.get('language', 'en')
+        limit = int(request.GET.get('limit', 10))
+
+        if not query:
+            return JsonResponse({
+                'success': False,
+                'error': 'Query parameter "q" is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Not logged to any session
+        result = await chatbot.aprocess_query(query, language)
+
+        return JsonResponse(_scheme_search_response_data(result, query, language, limit))
+
+    except Exception as e:
+        logger.error(f"Scheme search API error: {e}")
+        return JsonResponse({
+            'success': False,
+            'error': str(e),
+            'schemes': []
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def advanced_search_api(request):
+    """
+    Advanced search API with filters and sorting
+    """
+    try:
+        data = json.loads(request.body)
+        language = data.get('language', 'en')
+        context = chatbot.get_context(await _asession_id(request), language)
+
+        search = _advanced_search_params(data)
+
+        from mongodb_adapter import get_adapter, get_async_adapter
+        adapter = get_async_adapter()
+        if adapter is not None:
+            schemes = await adapter.advanced_search(**search)
+        else:
+            schemes = await asyncio.to_thread(get_adapter().advanced_search, **search)
+        response_msg = _advanced_search_message(schemes, search)
+
+        _log_advanced_search(context, search['query'], response_msg, schemes, language)
+
+        return JsonResponse(_advanced_search_response_data(response_msg, schemes, search, language))
+
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid JSON data',
+            'schemes': []
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    except Exception as e:
+        logger.error(f"Advanced search API error: {e}")
+        return JsonResponse({
+            'success': False,
+            'error': str(e),
+            'schemes': []
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,126 @@
+"""
+In-memory audio decoding for speech recognition
+Turns uploaded audio bytes into 16 kHz mono float32 samples without touching disk
+"""
+
+import io
+import logging
+import os
+import subprocess
+import tempfile
+import wave
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Whisper expects 16 kHz mono float32 in [-1, 1]
+SAMPLE_RATE = 16000
+
+# ffmpeg demuxer for each container we can recognize
+FFMPEG_INPUT_FORMATS = {
+    'wav': 'wav',
+    'webm': 'matroska',
+    'ogg': 'ogg',
+    'mp3': 'mp3',
+    'flac': 'flac',
+    'mp4': 'mov',
+    'aiff': 'aiff',
+}
+
+# tmpfs directory for libraries that can only write to a path (e.g. pyttsx3)
+MEMORY_TEMP_DIR = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else None
+
+
+def detect_audio_format(data: bytes) -> Optional[str]:
+    """Identify the audio container from its magic bytes"""
+    if data[:4] == b'RIFF' and data[8:12] == b'WAVE':
+        return 'wav'
+    if data[:4] == b'\x1a\x45\xdf\xa3':  # EBML header (WebM / Matroska)
+        return 'webm'
+    if data[:4] == b'OggS':
+        return 'ogg'
+    if data[:4] == b'fLaC':
+        return 'flac'
+    if data[4:8] == b'ftyp':
+        return 'mp4'
+    if data[:4] == b'FORM' and data[8:12] in (b'AIFF', b'AIFC'):
+        return 'aiff'
+    if data[:3] == b'ID3' or (len(data) > 1 and data[0] == 0xFF and data[1] & 0xE0 == 0xE0):
+        return 'mp3'
+    return None
+
+
+def _decode_wav(data: bytes) -> Optional[np.ndarray]:
+    """Parse 16 kHz PCM WAV natively; returns None for anything that needs ffmpeg"""
+    try:
+        with wave.open(io.BytesIO(data)) as wav_file:
+            channels = wav_file.getnchannels()
+            sample_width = wav_file.getsampwidth()
+            frame_rate = wav_file.getframerate()
+            frames = wav_file.readframes(wav_file.getnframes())
+    except (wave.Error, EOFError):
+        return None  # e.g. float or compressed WAV
+
+    if frame_rate != SAMPLE_RATE or sample_width not in (1, 2, 4):
+        return None
+
+    if sample_width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        samples = np.frombuffer(frames, dtype='<i2').astype(np.float32) / 32768.0
+    else:
+        samples = np.frombuffer(frames, dtype='<i4').astype(np.float32) / 2147483648.0
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples.astype(np.float32, copy=False)
+
+
+def _decode_with_ffmpeg(data: bytes, audio_format: Optional[str]) -> np.ndarray:
+    """Decode any container ffmpeg understands, piping bytes in and PCM out"""
+    command = ['ffmpeg', '-nostdin', '-threads', '0']
+    if audio_format in FFMPEG_INPUT_FORMATS:
+        command += ['-f', FFMPEG_INPUT_FORMATS[audio_format]]
+    command += [
+        '-i', 'pipe:0',
+        '-f', 's16le', '-ac', '1', '-acodec', 'pcm_s16le', '-ar', str(SAMPLE_RATE),
+        'pipe:1'
+    ]
+
+    try:
+        result = subprocess.run(command, input=data, capture_output=True, check=True)
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg is not installed")
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f"Failed to decode audio: {e.stderr.decode(errors='ignore')[-200:]}")
+
+    return np.frombuffer(result.stdout, dtype='<i2').astype(np.float32) / 32768.0
+
+
+def decode_audio(data: bytes) -> np.ndarray:
+    """
+    Decode uploaded audio bytes to 16 kHz mono float32 samples
+    Args:
+        data: Raw audio file contents (WAV, WebM, Ogg, MP3, FLAC, MP4, ...)
+    Returns:
+        numpy array of samples
+    """
+    if not data:
+        raise ValueError("Audio file is empty")
+
+    audio_format = detect_audio_format(data)
+    logger.debug(f"Decoding {len(data)} bytes of {audio_format or 'unknown'} audio")
+
+    if audio_format == 'wav':
+        samples = _decode_wav(data)
+        if samples is not None:
+            return samples
+
+    return _decode_with_ffmpeg(data, audio_format)
+
+
+def memory_temp_file(suffix: str):
+    """Named temporary file on tmpfs when available, for APIs that insist on a path"""
+    return tempfile.NamedTemporaryFile(suffix=suffix, delete=False, dir=MEMORY_TEMP_DIR)
@@ -0,0 +1,152 @@
+"""
+Short-lived store for synthesized voice responses
+Clips are saved under the SHA-256 of their bytes and served by ID from
+/api/audio/<id>/ until their TTL runs out
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+AUDIO_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+AUDIO_CONTENT_TYPES = {
+    'mp3': 'audio/mpeg',
+    'wav': 'audio/wav',
+}
+
+
+class AudioArtifactStore:
+    """Content-addressed directory of audio clips with TTL cleanup"""
+
+    def __init__(self, directory: str, ttl_seconds: float = 3600, cleanup_interval: float = 300):
+        self.directory = str(directory)
+        self.ttl_seconds = ttl_seconds
+        # Expired clips are swept at most this often (from save())
+        self.cleanup_interval = cleanup_interval
+        self._lock = threading.Lock()
+        self._cleaned_at = 0.0
+
+        self.saved = 0
+        self.served = 0
+        self.expired = 0
+
+    def _path(self, audio_id: str, audio_format: str) -> str:
+        return os.path.join(self.directory, f"{audio_id}.{audio_format}")
+
+    def save(self, audio_data: bytes, audio_format: str) -> str:
+        """
+        Store a clip (idempotent for identical bytes)
+        Args:
+            audio_data: Audio file contents
+            audio_format: 'mp3' or 'wav'
+        Returns:
+            audio ID
+        """
+        if audio_format not in AUDIO_CONTENT_TYPES:
+            raise ValueError(f"Unsupported audio format: {audio_format}")
+
+        audio_id = hashlib.sha256(audio_data).hexdigest()
+        path = self._path(audio_id, audio_format)
+
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(path):
+            os.utime(path)  # restart the TTL for a clip that is being handed out again
+        else:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.', suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(audio_data)
+            os.replace(temp_path, path)
+            with self._lock:
+                self.saved += 1
+
+        self._maybe_cleanup()
+        return audio_id
+
+    def get(self, audio_id: str) -> Optional[Dict]:
+        """
+        Look up a stored clip
+        Returns:
+            dict with 'path', 'format', 'content_type', 'size', 'etag', 'max_age' or None
+        """
+        if not AUDIO_ID_PATTERN.match(audio_id or ''):
+            return None
+
+        for audio_format, content_type in AUDIO_CONTENT_TYPES.items():
+            path = self._path(audio_id, audio_format)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+
+            age = time.time() - stat.st_mtime
+            if age >= self.ttl_seconds:
+                return None
+
+            with self._lock:
+                self.served += 1
+            return {
+                'path': path,
+                'format': audio_format,
+                'content_type': content_type,
+                'size': stat.st_size,
+                'etag': f'"{audio_id}"',
+                'max_age': int(self.ttl_seconds - age),
+            }
+        return None
+
+    def _maybe_cleanup(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._cleaned_at < self.cleanup_interval:
+                return
+            self._cleaned_at = now
+        self.cleanup()
+
+    def cleanup(self) -> int:
+        """Delete clips older than the TTL; returns how many were removed"""
+        if not os.path.isdir(self.directory):
+            return 0
+
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass  # removed by another worker
+
+        with self._lock:
+            self.expired += removed
+        if removed:
+            logger.info(f"Removed {removed} expired voice responses")
+        return removed
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'directory': self.directory,
+                'ttl_seconds': self.ttl_seconds,
+                'saved': self.saved,
+                'served': self.served,
+                'expired': self.expired,
+            }
+
+
+# Global store instance
+audio_store = AudioArtifactStore(
+    settings.VOICE_AUDIO_DIR,
+    ttl_seconds=settings.VOICE_AUDIO_TTL_SECONDS,
+    cleanup_interval=settings.VOICE_AUDIO_CLEANUP_INTERVAL_SECONDS
+)
@@ -0,0 +1,256 @@
+"""
+Buffered chat logging
+Requests enqueue chat messages; a background thread writes them to the
+database in batches, so request latency does not depend on the logging DB
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# What to do when the queue is full
+DROP_NEWEST = 'drop_newest'
+DROP_OLDEST = 'drop_oldest'
+OVERFLOW_POLICIES = (DROP_NEWEST, DROP_OLDEST)
+
+
+class ChatLogWriter:
+    """Bounded queue of chat messages flushed with bulk_create by size or interval"""
+
+    def __init__(self, max_queue_size: int = 10000, batch_size: int = 200,
+                 flush_interval: float = 1.0, overflow_policy: str = DROP_NEWEST,
+                 asynchronous: bool = True):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        # False writes every message on the calling thread (development, debugging)
+        self.asynchronous = asynchronous
+
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        self.last_flush_seconds = None
+
+    def log(self, session_id: str, message_type: str, text_content: str, language: str, **fields) -> bool:
+        """
+        Queue a chat message for writing
+        Args:
+            session_id: Chat session ID (the session is created on first write)
+            message_type: 'user', 'bot' or 'system'
+            text_content: Message text
+            language: Message language
+            **fields: Other ChatMessage fields (related_schemes, confidence_score)
+        Returns:
+            False if the message was dropped
+        """
+        message = dict(fields, session_id=session_id, message_type=message_type,
+                       text_content=text_content, language=language)
+
+        if not self.asynchronous:
+            self._write([message])
+            return True
+
+        self._ensure_started()
+        accepted = True
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            if self.overflow_policy == DROP_OLDEST:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    self._queue.put_nowait(message)
+                except queue.Full:
+                    accepted = False
+            else:
+                accepted = False
+
+            with self._lock:
+                self.dropped += 1
+            logger.warning(f"Chat log queue full, dropped a message ({self.overflow_policy})")
+
+        with self._lock:
+            if accepted:
+                self.enqueued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return accepted
+
+    def _ensure_started(self):
+        """Start the writer thread (again after a fork, which does not copy threads)"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='chat-log-writer', daemon=True)
+            self._thread.start()
+
+    def _take_batch(self) -> List[Dict]:
+        """Wait for the first message, then collect until the batch is full or the interval ends"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+        self.flush()
+
+    def _drain(self) -> List[Dict]:
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def flush(self) -> int:
+        """Write everything queued so far on the calling thread; returns messages written"""
+        written = 0
+        batch = self._drain()
+        for start in range(0, len(batch), self.batch_size):
+            written += self._write(batch[start:start + self.batch_size])
+        return written
+
+    def _write(self, batch: List[Dict]) -> int:
+        """Create any missing sessions, then insert the batch in one bulk_create"""
+        from .models import ChatMessage, ChatSession
+
+        started = time.perf_counter()
+        try:
+            with self._write_lock:
+                session_ids = {message['session_id'] for message in batch}
+                sessions = {
+                    session.session_id: session
+                    for session in ChatSession.objects.filter(session_id__in=session_ids)
+                }
+
+                missing = {}
+                for message in batch:
+                    if message['session_id'] not in sessions:
+                        missing.setdefault(message['session_id'], message['language'])
+                if missing:
+                    ChatSession.objects.bulk_create(
+                        [ChatSession(session_id=sid, language=language) for sid, language in missing.items()],
+                        ignore_conflicts=True
+                    )
+                    sessions.update(
+                        (session.session_id, session)
+                        for session in ChatSession.objects.filter(session_id__in=list(missing))
+                    )
+
+                messages = []
+                for message in batch:
+                    fields = dict(message)
+                    fields['session'] = sessions[fields.pop('session_id')]
+                    messages.append(ChatMessage(**fields))
+                ChatMessage.objects.bulk_create(messages)
+
+            with self._lock:
+                self.written += len(messages)
+                self.batches += 1
+                self.last_flush_seconds = time.perf_counter() - started
+            return len(messages)
+        except Exception as e:
+            with self._lock:
+                self.failed += len(batch)
+            logger.error(f"Failed to write {len(batch)} chat messages: {e}")
+            return 0
+        finally:
+            if self.asynchronous:
+                close_old_connections()
+
+    def stop(self, timeout: float = 5):
+        """Stop the writer thread and write whatever is still queued (shutdown hook)"""
+        self._stopping.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout)
+        self.flush()
+
+    def get_stats(self) -> Dict:
+        """Get writer counters"""
+        with self._lock:
+            return {
+                'asynchronous': self.asynchronous,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_size': self._queue.maxsize,
+                'max_queue_depth': self.max_queue_depth,
+                'batch_size': self.batch_size,
+                'flush_interval': self.flush_interval,
+                'overflow_policy': self.overflow_policy,
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'batches': self.batches,
+                'last_flush_seconds': self.last_flush_seconds,
+            }
+
+
+# Global writer instance
+chat_log_writer = ChatLogWriter(
+    max_queue_size=settings.CHAT_LOG_MAX_QUEUE_SIZE,
+    batch_size=settings.CHAT_LOG_BATCH_SIZE,
+    flush_interval=settings.CHAT_LOG_FLUSH_INTERVAL_SECONDS,
+    overflow_policy=settings.CHAT_LOG_OVERFLOW_POLICY,
+    asynchronous=settings.CHAT_LOG_ASYNC
+)
+atexit.register(chat_log_writer.stop)
+
+
+def _collect_chat_log_metrics():
+    """Chat log writer counters for /metrics"""
+    stats = chat_log_writer.get_stats()
+    return [
+        ('chatbot_chat_log_messages_total', 'counter', 'Chat messages by outcome',
+         [({'outcome': 'enqueued'}, stats['enqueued']), ({'outcome': 'written'}, stats['written']),
+          ({'outcome': 'dropped'}, stats['dropped']), ({'outcome': 'failed'}, stats['failed'])]),
+        ('chatbot_chat_log_queue_depth', 'gauge', 'Chat messages waiting to be written',
+         [({}, stats['queue_depth'])]),
+    ]
+
+
+metrics_registry.register_collector(_collect_chat_log_metrics)
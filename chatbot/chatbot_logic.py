@@ -3,398 +3,434 @@ Chatbot logic for processing user queries and returning relevant scheme informat
 Supports multiple languages and intelligent query processing
 """
 
-import re
+import asyncio
+import base64
 import logging
-from typing import List, Dict, Optional, Tuple
+import threading
+from typing import List, Dict, Optional, Tuple, Union
 from datetime import datetime
-from .models import GovernmentScheme, ChatSession, ChatMessage
+from django.conf import settings
+from .models import GovernmentScheme
+from .chat_log import chat_log_writer
+from .metrics import metrics_registry, set_request_labels, span
+from .offload import run_blocking
+from .pipeline import QueryPipeline, Stage
+from .query_cache import QueryResultCache
+from .query_matcher import QueryAnalysis, query_matcher
 from .voice_processing import voice_processor
+from .audio_store import audio_store
 import json
 
 logger = logging.getLogger(__name__)
 
 
+def _metric_language(language: str) -> str:
+    """Language label for metrics (user input, so unknown codes are folded together)"""
+    return language if language in settings.VOICE_SUPPORTED_LANGUAGES else 'other'
+
+
+def _get_corpus_version() -> int:
+    """Version source for the query cache"""
+    from mongodb_adapter import get_adapter
+    return get_adapter().get_corpus_version()
+
+
+async def _aget_corpus_version() -> int:
+    """Version source for the query cache, read from async code"""
+    from mongodb_adapter import get_async_adapter
+    adapter = get_async_adapter()
+    if adapter is None:
+        return await asyncio.to_thread(_get_corpus_version)
+    return await adapter.get_corpus_version()
+
+
+class ChatContext:
+    """Per-request chat state: the session messages are logged to and the reply language"""
+    
+    def __init__(self, session_id: Optional[str] = None, language: str = 'en'):
+        self.session_id = session_id
+        self.language = language
+
+
 class GovernmentChatbot:
-    """Main chatbot class for processing government scheme queries"""
+    """
+    Main chatbot class for processing government scheme queries
+    Holds no per-request state, so one instance serves concurrent requests;
+    session and language travel in a ChatContext
+    """
+    
+    # Languages the fixed replies are written in
+    RESPONSE_LANGUAGES = ('en', 'hi', 'kn')
     
     def __init__(self):
-        self.language = 'en'
-        self.session_id = None
-        self.session = None
+        # Results of repeated questions, shared by all requests in this process
+        self.query_cache = None
+        if settings.QUERY_CACHE_ENABLED:
+            self.query_cache = QueryResultCache(
+                max_entries=settings.QUERY_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.QUERY_CACHE_TTL_SECONDS,
+                version_source=_get_corpus_version,
+                version_check_seconds=settings.QUERY_CACHE_VERSION_CHECK_SECONDS
+            )
+        
+        # Replies that do not depend on the query, by intent and language
+        self.static_replies = {
+            'greeting': {language: self._get_greeting_response(language) for language in self.RESPONSE_LANGUAGES},
+            'help': {language: self._get_help_response(language) for language in self.RESPONSE_LANGUAGES},
+        }
+        self.pipeline = self._build_pipeline()
     
-    def set_language(self, language: str):
-        """Set the language for responses"""
-        self.language = language
+    def _build_pipeline(self) -> QueryPipeline:
+        """Declare the query stages and the route each intent takes through them"""
+        stages = [
+            Stage('static_reply', self._stage_static_reply,
+                  needs=('intent', 'language'), provides=('response', 'scheme_ids', 'schemes'),
+                  description='Precomputed reply for intents that need no schemes'),
+            Stage('cache_lookup', self._stage_cache_lookup,
+                  needs=('query', 'language', 'intent'), provides=('cache_key',),
+                  description='Answer repeated questions from the query result cache',
+                  async_handler=self._astage_cache_lookup),
+            Stage('search', self._stage_search,
+                  needs=('query', 'keywords', 'entities', 'intent'), provides=('found_schemes',),
+                  description='Search MongoDB for matching schemes',
+                  async_handler=self._astage_search),
+            Stage('response', self._stage_response,
+                  needs=('query', 'found_schemes', 'intent', 'language'),
+                  provides=('response', 'scheme_ids', 'schemes'),
+                  description='Write the reply for the intent from the found schemes'),
+            Stage('cache_store', self._stage_cache_store,
+                  needs=('cache_key', 'found_schemes', 'keywords', 'scheme_ids', 'schemes', 'response'),
+                  description='Cache non-empty results for repeated questions'),
+        ]
+        return QueryPipeline(
+            stages,
+            routes={intent: ('static_reply',) for intent in self.static_replies},
+            default_route=('cache_lookup', 'search', 'response', 'cache_store'),
+            inputs=('query', 'language', 'intent', 'keywords', 'entities')
+        )
     
-    def set_session(self, session_id: str):
-        """Set the current chat session"""
-        self.session_id = session_id
-        try:
-            self.session = ChatSession.objects.get(session_id=session_id)
-        except ChatSession.DoesNotExist:
-            self.session = ChatSession.objects.create(
-                session_id=session_id,
-                language=self.language
-            )
+    def get_context(self, session_id: Optional[str] = None, language: str = 'en') -> ChatContext:
+        """
+        Build the context for one request
+        Args:
+            session_id: Chat session ID (None: nothing is logged); the session
+                row is created by the chat log writer on its first message
+            language: Language for responses
+        Returns:
+            ChatContext
+        """
+        return ChatContext(session_id=session_id, language=language)
     
-    def process_query(self, query: str, language: str = 'en') -> Dict:
+    def _log_message(self, context: Optional[ChatContext], message_type: str, text: str,
+                     language: str, **fields):
+        """Queue a chat message for the context's session (no-op without one)"""
+        if context is None or not context.session_id:
+            return
+        chat_log_writer.log(context.session_id, message_type, text, language, **fields)
+    
+    def process_query(self, query: str, language: str = 'en', context: Optional[ChatContext] = None) -> Dict:
         """
         Process user query and return relevant scheme information
         Args:
             query: User's query text
             language: Language of the query
+            context: Request context (session to log the exchange to)
         Returns:
             dict with response information
         """
         try:
-            self.set_language(language)
-            
-            # Log user message
-            if self.session:
-                ChatMessage.objects.create(
-                    session=self.session,
-                    message_type='user',
-                    text_content=query,
-                    language=language
-                )
-            
-            # Analyze query intent
-            intent = self._analyze_intent(query)
-            
-            # Extract keywords and entities
-            keywords = self._extract_keywords(query)
-            entities = self._extract_entities(query)
+            analysis, state = self._start_query(query, language, context)
             
-            # Search for relevant schemes
-            relevant_schemes = self._search_schemes(query, keywords, entities, intent)
+            # Run only the stages this intent needs (see _build_pipeline)
+            stages = self.pipeline.run(analysis.intent, state)
             
-            # Generate response
-            response = self._generate_response(query, relevant_schemes, intent, language)
+            return self._finish_query(analysis, state, stages, context)
             
-            # Log bot response
-            if self.session:
-                ChatMessage.objects.create(
-                    session=self.session,
-                    message_type='bot',
-                    text_content=response['text'],
-                    language=language,
-                    related_schemes=[scheme.get('_id', '') for scheme in relevant_schemes[:3]],
-                    confidence_score=response.get('confidence', 0.8)
-                )
-            
-            return {
-                'success': True,
-                'response': response,
-                'schemes': [self._format_scheme(scheme) for scheme in relevant_schemes[:5]],
-                'intent': intent,
-                'keywords': keywords,
-                'language': language
-            }
+        except Exception as e:
+            logger.error(f"Error processing query: {e}")
+            return self._query_error_result(e, language)
+    
+    async def aprocess_query(self, query: str, language: str = 'en', context: Optional[ChatContext] = None) -> Dict:
+        """process_query for async views: MongoDB is awaited on the async client"""
+        try:
+            analysis, state = self._start_query(query, language, context)
+            stages = await self.pipeline.arun(analysis.intent, state)
+            return self._finish_query(analysis, state, stages, context)
             
         except Exception as e:
             logger.error(f"Error processing query: {e}")
-            return {
-                'success': False,
-                'error': str(e),
-                'response': {
-                    'text': self._get_error_response(language),
-                    'confidence': 0.0,
-                    'intent': 'error',
-                    'scheme_count': 0
-                }
+            return self._query_error_result(e, language)
+    
+    def _start_query(self, query: str, language: str, context: Optional[ChatContext]) -> Tuple[QueryAnalysis, Dict]:
+        """Log the user message and analyze the query; returns the analysis and the pipeline state"""
+        # Log user message
+        with span('logging'):
+            self._log_message(context, 'user', query, language)
+        
+        # Analyze query intent, entities and keywords in one pass
+        with span('analysis'):
+            analysis = self._analyze_query(query)
+        set_request_labels(language=_metric_language(language), intent=analysis.intent)
+        
+        state = {
+            'query': query,
+            'language': language,
+            'intent': analysis.intent,
+            'keywords': analysis.keywords,
+            'entities': analysis.entities()
+        }
+        return analysis, state
+    
+    def _finish_query(self, analysis: QueryAnalysis, state: Dict, stages: List[str],
+                      context: Optional[ChatContext]) -> Dict:
+        """Log the bot reply and build the process_query result"""
+        response = state['response']
+        language = state['language']
+        
+        # Log bot response
+        with span('logging'):
+            self._log_message(
+                context, 'bot', response['text'], language,
+                related_schemes=state['scheme_ids'][:3],
+                confidence_score=response.get('confidence', 0.8)
+            )
+        
+        return {
+            'success': True,
+            'response': response,
+            'schemes': state['schemes'],
+            'intent': analysis.intent,
+            'intents': analysis.intents,
+            'keywords': state['keywords'],
+            'language': language,
+            'stages': stages
+        }
+    
+    def _query_error_result(self, error: Exception, language: str) -> Dict:
+        return {
+            'success': False,
+            'error': str(error),
+            'response': {
+                'text': self._get_error_response(language),
+                'confidence': 0.0,
+                'intent': 'error',
+                'scheme_count': 0
             }
+        }
     
-    def process_voice_query(self, audio_file_path: str) -> Dict:
+    def process_voice_query(self, audio_file_path: Union[str, bytes], include_audio_base64: bool = False,
+                            context: Optional[ChatContext] = None) -> Dict:
         """
         Process voice query: convert speech to text and process
         Args:
-            audio_file_path: Path to the audio file
+            audio_file_path: Path to the audio file, or the uploaded audio bytes
+            include_audio_base64: Also return the spoken reply inline as base64 (old clients)
+            context: Request context (session to log the exchange to)
         Returns:
-            dict with response and audio
+            dict with response and audio ID (served from /api/audio/<id>/)
         """
         try:
             # Convert speech to text using voice processor
-            stt_result = voice_processor.process_voice_input(audio_file_path)
-            
+            stt_result = voice_processor.process_voice_input(audio_file_path, settings.STT_DECODING_PROFILES['voice'])
             if not stt_result['success']:
-                return {
-                    'success': False,
-                    'error': stt_result['error'],
-                    'text_response': 'Voice processing failed. Please try again or use text input.',
-                    'audio_response': None,
-                    'language': 'en',
-                    'schemes': [],
-                    'confidence': 0.0
-                }
+                return self._voice_failure(stt_result['error'], 'Voice processing failed. Please try again or use text input.',
+                                           busy=stt_result.get('busy', False), too_long=stt_result.get('too_long', False))
             
             # Process the text query using our chatbot logic
-            query_result = self.process_query(
-                stt_result['text'], 
-                stt_result['language']
-            )
-            
+            query_result = self.process_query(stt_result['text'], stt_result['language'], context=context)
             if not query_result['success']:
-                return {
-                    'success': False,
-                    'error': query_result.get('error', 'Query processing failed'),
-                    'text_response': query_result['response']['text'],
-                    'audio_response': None,
-                    'language': stt_result['language'],
-                    'schemes': [],
-                    'confidence': 0.0
-                }
-            
-            # Generate voice response
-            try:
-                voice_result = voice_processor.generate_voice_response(
+                return self._voice_failure(
+                    query_result.get('error', 'Query processing failed'),
                     query_result['response']['text'],
-                    query_result['language']
+                    stt_result['language']
                 )
-                audio_response = voice_result.get('audio_data') if voice_result.get('success') else None
-            except Exception as e:
-                logger.warning(f"Voice response generation failed: {e}")
-                audio_response = None
             
-            return {
-                'success': True,
-                'text_response': query_result['response']['text'],
-                'audio_response': audio_response,
-                'language': query_result['language'],
-                'schemes': query_result['schemes'],
-                'confidence': query_result['response'].get('confidence', 0.8),
-                'user_text': stt_result['text']
-            }
+            # Generate voice response
+            speech = self._speak_reply(query_result, include_audio_base64)
+            
+            return self._voice_result(stt_result, query_result, speech)
             
         except Exception as e:
             logger.error(f"Error processing voice query: {e}")
-            return {
-                'success': False,
-                'error': str(e),
-                'text_response': 'An error occurred while processing your voice input. Please try again.',
-                'audio_response': None,
-                'language': 'en',
-                'schemes': [],
-                'confidence': 0.0
-            }
+            return self._voice_failure(str(e), 'An error occurred while processing your voice input. Please try again.')
     
-    def _analyze_intent(self, query: str) -> str:
-        """Analyze user intent from the query"""
-        query_lower = query.lower()
+    async def aprocess_voice_query(self, audio_file_path: Union[str, bytes], include_audio_base64: bool = False,
+                                   context: Optional[ChatContext] = None) -> Dict:
+        """process_voice_query for async views: recognition and synthesis run on the offload pool"""
+        try:
+            stt_result = await run_blocking(voice_processor.process_voice_input, audio_file_path,
+                                            settings.STT_DECODING_PROFILES['voice'])
+            if not stt_result['success']:
+                return self._voice_failure(stt_result['error'], 'Voice processing failed. Please try again or use text input.',
+                                           busy=stt_result.get('busy', False), too_long=stt_result.get('too_long', False))
+            
+            return await self.arespond_to_speech(stt_result, include_audio_base64, context)
+            
+        except Exception as e:
+            logger.error(f"Error processing voice query: {e}")
+            return self._voice_failure(str(e), 'An error occurred while processing your voice input. Please try again.')
+    
+    async def arespond_to_speech(self, stt_result: Dict, include_audio_base64: bool = False,
+                                 context: Optional[ChatContext] = None) -> Dict:
+        """
+        Answer recognized speech: search, reply and synthesize the spoken reply
+        Args:
+            stt_result: Recognition result with 'text', 'language' and 'timings'
+            include_audio_base64: Also return the spoken reply inline as base64
+            context: Request context (session to log the exchange to)
+        Returns:
+            dict as from process_voice_query
+        """
+        query_result = await self.aprocess_query(stt_result['text'], stt_result['language'], context=context)
+        if not query_result['success']:
+            return self._voice_failure(
+                query_result.get('error', 'Query processing failed'),
+                query_result['response']['text'],
+                stt_result['language']
+            )
         
-        # Intent patterns (English and Kannada)
-        intent_patterns = {
-            'search_scheme': [
-                r'scheme.*for',
-                r'program.*for',
-                r'yojana.*for',
-                r'benefit.*for',
-                r'help.*with',
-                r'support.*for',
-                # Kannada patterns
-                r'ಯೋಜನೆ',
-                r'ಕಾರ್ಯಕ್ರಮ',
-                r'ಲಾಭ',
-                r'ಸಹಾಯ',
-                r'ಬೆಂಬಲ'
-            ],
-            'get_info': [
-                r'what.*is',
-                r'tell.*about',
-                r'information.*about',
-                r'details.*of',
-                r'explain',
-                # Kannada patterns
-                r'ಏನು',
-                r'ಹೇಳಿ',
-                r'ಮಾಹಿತಿ',
-                r'ವಿವರ',
-                r'ವಿವರಿಸಿ'
-            ],
-            'eligibility': [
-                r'eligible',
-                r'qualify',
-                r'criteria',
-                r'requirements',
-                r'who.*can.*apply',
-                # Kannada patterns
-                r'ಅರ್ಹತೆ',
-                r'ಅರ್ಹ',
-                r'ನಿಯಮ',
-                r'ಅವಶ್ಯಕತೆ',
-                r'ಯಾರು.*ಅರ್ಜಿ'
-            ],
-            'application': [
-                r'how.*to.*apply',
-                r'apply.*for',
-                r'application.*process',
-                r'where.*to.*apply',
-                r'documents.*required',
-                # Kannada patterns
-                r'ಎಲ್ಲಿ.*ಅರ್ಜಿ',
-                r'ಅರ್ಜಿ.*ಹಾಕಿ',
-                r'ಅರ್ಜಿ.*ಪ್ರಕ್ರಿಯೆ',
-                r'ಎಲ್ಲಿ.*ಅರ್ಜಿ',
-                r'ದಾಖಲೆ.*ಅವಶ್ಯಕ'
-            ],
-            'benefits': [
-                r'benefits',
-                r'advantages',
-                r'what.*do.*i.*get',
-                r'assistance',
-                r'help.*provided',
-                # Kannada patterns
-                r'ಲಾಭ',
-                r'ಅನುಕೂಲ',
-                r'ಏನು.*ಸಿಗುತ್ತದೆ',
-                r'ಸಹಾಯ',
-                r'ಬೆಂಬಲ.*ನೀಡುತ್ತಾರೆ'
-            ],
-            'sector_specific': [
-                r'agriculture',
-                r'health',
-                r'education',
-                r'employment',
-                r'farmer',
-                r'student',
-                r'job',
-                # Kannada patterns
-                r'ಕೃಷಿ',
-                r'ಆರೋಗ್ಯ',
-                r'ಶಿಕ್ಷಣ',
-                r'ಉದ್ಯೋಗ',
-                r'ರೈತ',
-                r'ವಿದ್ಯಾರ್ಥಿ',
-                r'ಕೆಲಸ'
-            ],
-            'greeting': [
-                r'hello',
-                r'hi',
-                r'good.*morning',
-                r'good.*afternoon',
-                r'good.*evening',
-                # Kannada patterns
-                r'ನಮಸ್ಕಾರ',
-                r'ಹಲೋ',
-                r'ಶುಭ.*ಬೆಳಿಗ್ಗೆ',
-                r'ಶುಭ.*ಮಧ್ಯಾಹ್ನ',
-                r'ಶುಭ.*ಸಂಜೆ'
-            ],
-            'help': [
-                r'help',
-                r'what.*can.*you.*do',
-                r'how.*to.*use',
-                r'commands',
-                # Kannada patterns
-                r'ಸಹಾಯ',
-                r'ಏನು.*ಮಾಡಬಹುದು',
-                r'ಹೇಗೆ.*ಬಳಸುವುದು',
-                r'ಆಜ್ಞೆಗಳು'
-            ]
-        }
+        speech = await run_blocking(self._speak_reply, query_result, include_audio_base64)
         
-        for intent, patterns in intent_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, query_lower):
-                    return intent
+        return self._voice_result(stt_result, query_result, speech)
+    
+    def _speak_reply(self, query_result: Dict, include_audio_base64: bool) -> Dict:
+        """Synthesize the reply and store it for /api/audio/<id>/ (blocking: TTS and a file write)"""
+        speech = {'audio_id': None, 'audio_format': None, 'audio_response': None}
+        try:
+            with span('tts'):
+                voice_result = voice_processor.synthesize(
+                    query_result['response']['text'],
+                    query_result['language']
+                )
+            if voice_result['audio_bytes']:
+                speech['audio_format'] = voice_result['format']
+                speech['audio_id'] = audio_store.save(voice_result['audio_bytes'], voice_result['format'])
+                if include_audio_base64:
+                    speech['audio_response'] = base64.b64encode(voice_result['audio_bytes']).decode('utf-8')
+        except Exception as e:
+            logger.warning(f"Voice response generation failed: {e}")
+        return speech
+    
+    def _voice_result(self, stt_result: Dict, query_result: Dict, speech: Dict) -> Dict:
+        return {
+            'success': True,
+            'text_response': query_result['response']['text'],
+            'audio_id': speech['audio_id'],
+            'audio_format': speech['audio_format'],
+            'audio_response': speech['audio_response'],
+            'language': query_result['language'],
+            'schemes': query_result['schemes'],
+            'confidence': query_result['response'].get('confidence', 0.8),
+            'user_text': stt_result['text'],
+            'stt_timings': stt_result.get('timings', {})
+        }
+    
+    def _voice_failure(self, error: str, text_response: str, language: str = 'en', busy: bool = False,
+                       too_long: bool = False) -> Dict:
+        return {
+            'success': False,
+            'busy': busy,
+            'too_long': too_long,
+            'error': error,
+            'text_response': text_response,
+            'audio_response': None,
+            'language': language,
+            'schemes': [],
+            'confidence': 0.0
+        }
+    
+    def _stage_static_reply(self, state: Dict) -> bool:
+        """Answer greeting and help from the precomputed replies"""
+        replies = self.static_replies[state['intent']]
+        state['response'] = {
+            'text': replies.get(state['language'], replies['en']),
+            'confidence': 0.8,
+            'intent': state['intent'],
+            'scheme_count': 0
+        }
+        state['scheme_ids'] = []
+        state['schemes'] = []
+        return True
+    
+    def _stage_cache_lookup(self, state: Dict, check_version: bool = True) -> bool:
+        """Answer from the query result cache on a hit"""
+        cache_key = None
+        if self.query_cache:
+            cache_key = self.query_cache.make_key(state['query'], state['language'], state['intent'])
+        state['cache_key'] = cache_key
         
-        return 'general_query'
+        cached = self.query_cache.get(cache_key, check_version=check_version) if cache_key else None
+        if not cached:
+            return False
+        state['keywords'] = list(cached['keywords'])
+        state['scheme_ids'] = cached['scheme_ids']
+        state['schemes'] = list(cached['schemes'])
+        state['response'] = dict(cached['response'])
+        return True
+    
+    async def _astage_cache_lookup(self, state: Dict) -> bool:
+        """Cache lookup with the corpus version read on the async client"""
+        cache = self.query_cache
+        if cache and cache.version_source is not None and cache.version_check_due():
+            try:
+                cache.update_version(await _aget_corpus_version())
+            except Exception as e:
+                logger.warning(f"Could not read corpus version: {e}")
+        return self._stage_cache_lookup(state, check_version=False)
+    
+    def _stage_search(self, state: Dict):
+        """Find schemes for the query"""
+        state['found_schemes'] = self._search_schemes(
+            state['query'], state['keywords'], state['entities'], state['intent']
+        )
+    
+    async def _astage_search(self, state: Dict):
+        """Find schemes for the query on the async client"""
+        state['found_schemes'] = await self._asearch_schemes(
+            state['query'], state['keywords'], state['entities'], state['intent']
+        )
+    
+    def _stage_response(self, state: Dict):
+        """Build the reply and the formatted schemes"""
+        schemes = state['found_schemes']
+        state['response'] = self._generate_response(state['query'], schemes, state['intent'], state['language'])
+        state['scheme_ids'] = [scheme.get('_id', '') for scheme in schemes]
+        state['schemes'] = [self._format_scheme(scheme) for scheme in schemes[:5]]
+    
+    def _stage_cache_store(self, state: Dict):
+        """Cache the result for repeated questions"""
+        # Empty results are not cached: they may come from a failed search
+        if state['cache_key'] and state['found_schemes']:
+            self.query_cache.set(state['cache_key'], {
+                'keywords': list(state['keywords']),
+                'scheme_ids': state['scheme_ids'],
+                'schemes': list(state['schemes']),
+                'response': dict(state['response'])
+            })
+    
+    def _analyze_query(self, query: str) -> QueryAnalysis:
+        """Find intents, entities and keywords in one pass (see query_matcher)"""
+        return query_matcher.analyze(query)
+    
+    def _analyze_intent(self, query: str) -> str:
+        """Analyze user intent from the query (highest scoring intent)"""
+        return query_matcher.analyze(query).intent
     
     def _extract_keywords(self, query: str) -> List[str]:
         """Extract keywords from the query"""
-        # Remove common stop words
-        stop_words = {
-            'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you', 'your', 'yours',
-            'yourself', 'yourselves', 'he', 'him', 'his', 'himself', 'she', 'her', 'hers',
-            'herself', 'it', 'its', 'itself', 'they', 'them', 'their', 'theirs', 'themselves',
-            'what', 'which', 'who', 'whom', 'this', 'that', 'these', 'those', 'am', 'is', 'are',
-            'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'having', 'do', 'does',
-            'did', 'doing', 'a', 'an', 'the', 'and', 'but', 'if', 'or', 'because', 'as', 'until',
-            'while', 'of', 'at', 'by', 'for', 'with', 'through', 'during', 'before', 'after',
-            'above', 'below', 'up', 'down', 'in', 'out', 'on', 'off', 'over', 'under', 'again',
-            'further', 'then', 'once', 'here', 'there', 'when', 'where', 'why', 'how', 'all',
-            'any', 'both', 'each', 'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor',
-            'not', 'only', 'own', 'same', 'so', 'than', 'too', 'very', 'can', 'will', 'just',
-            'should', 'now', 'please', 'thank', 'thanks'
-        }
-        
-        # Extract words and phrases
-        # First try to find exact scheme names
-        scheme_names = [
-            'pradhan mantri awas yojana',
-            'pmay',
-            'awas yojana'
-        ]
-        query_lower = query.lower()
-        for scheme in scheme_names:
-            if scheme in query_lower:
-                return [scheme]
-        
-        # If no exact scheme found, extract individual words
-        words = re.findall(r'\b\w+\b', query_lower)
-        keywords = [word for word in words if word not in stop_words and len(word) > 2]
-        
-        return keywords[:10]  # Limit to 10 keywords
+        return query_matcher.analyze(query).keywords
     
     def _extract_entities(self, query: str) -> Dict:
         """Extract entities from the query"""
-        entities = {
-            'sectors': [],
-            'age_groups': [],
-            'genders': [],
-            'locations': [],
-            'scheme_types': []
-        }
-        
-        query_lower = query.lower()
-        
-        # Extract sectors
-        sector_keywords = {
-            'agriculture': ['agriculture', 'farmer', 'farming', 'crop', 'irrigation', 'kisan'],
-            'health': ['health', 'medical', 'hospital', 'doctor', 'medicine', 'treatment'],
-            'education': ['education', 'school', 'college', 'student', 'scholarship', 'learning'],
-            'employment': ['employment', 'job', 'work', 'skill', 'training', 'rogar'],
-            'housing': ['housing', 'house', 'home', 'awas', 'pmay', 'residence'],
-            'social_welfare': ['welfare', 'pension', 'widow', 'disabled', 'senior', 'social', 'housing', 'house', 'awas'],
-            'urban_development': ['urban', 'city', 'housing', 'house', 'awas', 'pmay'],
-            'women_empowerment': ['women', 'girl', 'female', 'empowerment', 'beti', 'mahila'],
-            'youth_development': ['youth', 'young', 'student', 'youth development']
-        }
-        
-        for sector, keywords in sector_keywords.items():
-            if any(keyword in query_lower for keyword in keywords):
-                entities['sectors'].append(sector)
-        
-        # Extract age groups
-        age_patterns = {
-            'children': ['child', 'children', 'kid', 'kids', 'minor', 'under 18'],
-            'youth': ['youth', 'young', 'teenager', '18-30', '18-35'],
-            'adult': ['adult', 'middle age', '30-60', '35-60'],
-            'senior': ['senior', 'elderly', 'old', 'above 60', '60+', 'pension']
-        }
-        
-        for age_group, patterns in age_patterns.items():
-            if any(pattern in query_lower for pattern in patterns):
-                entities['age_groups'].append(age_group)
-        
-        # Extract genders
-        if any(word in query_lower for word in ['women', 'woman', 'girl', 'female', 'ladies']):
-            entities['genders'].append('female')
-        if any(word in query_lower for word in ['men', 'man', 'boy', 'male', 'gentlemen']):
-            entities['genders'].append('male')
-        
-        return entities
+        return query_matcher.analyze(query).entities()
     
     def _search_schemes(self, query: str, keywords: List[str], entities: Dict, intent: str) -> List[Dict]:
         """Search for relevant schemes based on query using MongoDB"""
         try:
-            # Import MongoDB adapter
-            import sys
-            import os
-            sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-            from mongodb_adapter import MongoDBAdapter
+            from mongodb_adapter import get_adapter
             
-            # Use MongoDB adapter
-            adapter = MongoDBAdapter()
+            # Use the process-wide MongoDB adapter (shared connection pool)
+            adapter = get_adapter()
             schemes = adapter.search_schemes(query, keywords, entities, intent)
             
             return schemes
@@ -403,6 +439,20 @@ class GovernmentChatbot:
             logger.error(f"Error searching schemes: {e}")
             return []
     
+    async def _asearch_schemes(self, query: str, keywords: List[str], entities: Dict, intent: str) -> List[Dict]:
+        """_search_schemes on the async MongoDB client (the sync one on a thread without it)"""
+        try:
+            from mongodb_adapter import get_async_adapter
+            
+            adapter = get_async_adapter()
+            if adapter is None:
+                return await asyncio.to_thread(self._search_schemes, query, keywords, entities, intent)
+            return await adapter.search_schemes(query, keywords, entities, intent)
+            
+        except Exception as e:
+            logger.error(f"Error searching schemes: {e}")
+            return []
+    
     def _generate_response(self, query: str, schemes: List[GovernmentScheme], intent: str, language: str) -> Dict:
         """Generate response based on query and found schemes"""
         try:
@@ -414,12 +464,8 @@ class GovernmentChatbot:
                     'scheme_count': 0
                 }
             
-            # Generate response based on intent
-            if intent == 'greeting':
-                response_text = self._get_greeting_response(language)
-            elif intent == 'help':
-                response_text = self._get_help_response(language)
-            elif intent == 'get_info':
+            # Generate response based on intent (greeting and help never get here)
+            if intent == 'get_info':
                 response_text = self._get_info_response(schemes, language)
             elif intent == 'eligibility':
                 response_text = self._get_eligibility_response(schemes, language)
@@ -563,6 +609,16 @@ class GovernmentChatbot:
         }
         return responses.get(language, responses['en'])
     
+    def static_responses(self) -> List[Tuple[str, str]]:
+        """Get (text, language) for every reply that does not depend on the query"""
+        responses = []
+        for language in self.RESPONSE_LANGUAGES:
+            responses.append((self._get_greeting_response(language), language))
+            responses.append((self._get_help_response(language), language))
+            responses.append((self._get_no_results_response('general_query', language), language))
+            responses.append((self._get_error_response(language), language))
+        return responses
+    
     def _format_scheme(self, scheme: Dict) -> Dict:
         """Format scheme for API response"""
         return {
@@ -594,3 +650,47 @@ class GovernmentChatbot:
 
 # Global chatbot instance
 chatbot = GovernmentChatbot()
+
+
+def _collect_query_cache_metrics():
+    """Query result cache counters for /metrics"""
+    if chatbot.query_cache is None:
+        return []
+    stats = chatbot.query_cache.get_stats()
+    return [
+        ('chatbot_query_cache_lookups_total', 'counter', 'Query result cache lookups',
+         [({'result': 'hit'}, stats['hits']), ({'result': 'miss'}, stats['misses'])]),
+        ('chatbot_query_cache_hit_ratio', 'gauge', 'Query result cache hit ratio',
+         [({}, stats['hit_rate'])]),
+        ('chatbot_query_cache_entries', 'gauge', 'Entries in the query result cache',
+         [({}, stats['entries'])]),
+        ('chatbot_query_cache_removals_total', 'counter', 'Query result cache entries removed',
+         [({'reason': 'evicted'}, stats['evictions']), ({'reason': 'expired'}, stats['expirations']),
+          ({'reason': 'corpus_changed'}, stats['invalidations'])]),
+    ]
+
+
+metrics_registry.register_collector(_collect_query_cache_metrics)
+
+
+def prewarm_voice_responses() -> int:
+    """
+    Synthesize the fixed replies in every language so their audio is served
+    from the TTS cache. Returns the number of clips available.
+    """
+    ready = 0
+    for text, language in chatbot.static_responses():
+        try:
+            if voice_processor.synthesize(text, language)['audio_bytes']:
+                ready += 1
+        except Exception as e:
+            logger.warning(f"Could not prewarm voice response ({language}): {e}")
+    logger.info(f"Prewarmed {ready} voice responses")
+    return ready
+
+
+def prewarm_voice_responses_in_background() -> threading.Thread:
+    """Start prewarming the fixed replies without blocking the caller (server startup hook)"""
+    thread = threading.Thread(target=prewarm_voice_responses, name='tts-prewarm', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,31 @@
+"""
+Management command to load and warm the speech models
+"""
+
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from chatbot.model_registry import model_registry
+import chatbot.voice_processing  # noqa: F401 (registers the Whisper model)
+
+
+class Command(BaseCommand):
+    help = 'Load the registered speech models, run a warmup inference on each and prewarm the TTS cache'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Warming up models...')
+        
+        readiness = model_registry.warmup()
+        
+        for name, status in readiness.items():
+            if status['state'] == 'ready':
+                self.stdout.write(self.style.SUCCESS(
+                    f"{name}: ready (load {status['load_seconds']:.2f}s, warmup {status['warmup_seconds'] or 0:.2f}s)"
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f"{name}: {status['state']} ({status['error']})"))
+        
+        if settings.TTS_CACHE_ENABLED:
+            from chatbot.chatbot_logic import prewarm_voice_responses
+            self.stdout.write('Prewarming voice responses...')
+            ready = prewarm_voice_responses()
+            self.stdout.write(self.style.SUCCESS(f"tts_cache: {ready} voice responses cached"))
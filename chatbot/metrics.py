@@ -0,0 +1,294 @@
+"""
+Process-local metrics and per-request timing spans
+Histograms, counters and collected stats rendered in the Prometheus text
+format at /metrics; the spans of each request also feed its Server-Timing header
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers cache hits (ms) through long transcriptions
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _labels(self, key: Tuple) -> Dict:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+
+    metric_type = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Last set value per label set"""
+
+    metric_type = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket latency histogram per label set"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += 1
+            state[2] += value
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, count, total) in self._values.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append((f'{self.name}_bucket', dict(labels, le=_format_value(float(bound))), cumulative))
+                samples.append((f'{self.name}_bucket', dict(labels, le='+Inf'), count))
+                samples.append((f'{self.name}_count', labels, count))
+                samples.append((f'{self.name}_sum', labels, total))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Holds this process's metrics plus collectors that report existing stats
+    (caches, pools, queues) at scrape time. Each worker exports its own values.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable] = []
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Iterable[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, Iterable[Tuple[Dict, float]]]]]):
+        """
+        Register a callable run at scrape time
+        It yields (name, type, help, [(labels, value), ...]) for each metric family
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format (0.0.4)"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        for metric in metrics:
+            samples = metric.samples()
+            if not samples:
+                continue
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.metric_type}')
+            for name, labels, value in samples:
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+# Global registry instance
+metrics_registry = MetricsRegistry()
+
+STAGE_SECONDS = metrics_registry.histogram(
+    'chatbot_stage_duration_seconds',
+    'Time spent in each pipeline stage',
+    ('stage', 'endpoint', 'language', 'intent')
+)
+REQUEST_SECONDS = metrics_registry.histogram(
+    'chatbot_request_duration_seconds',
+    'Total request time per endpoint',
+    ('endpoint', 'method', 'status', 'language', 'intent')
+)
+MODEL_INFERENCE_SECONDS = metrics_registry.histogram(
+    'chatbot_model_inference_seconds',
+    'Model inference time (speech recognition and synthesis)',
+    ('model', 'operation')
+)
+
+
+class RequestTimings:
+    """Stage spans and labels collected while one request is handled"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+        self.labels = {'language': '', 'intent': ''}
+
+    def add(self, stage: str, seconds: float):
+        self.spans.append((stage, seconds))
+
+    def totals(self) -> Dict[str, float]:
+        """Seconds per stage, repeated stages summed, in first-seen order"""
+        totals: Dict[str, float] = {}
+        for stage, seconds in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        return totals
+
+    def server_timing(self) -> str:
+        """Server-Timing header value (durations in milliseconds)"""
+        entries = [f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in self.totals().items()]
+        entries.append(f'total;dur={(time.perf_counter() - self.started) * 1000:.1f}')
+        return ', '.join(entries)
+
+
+_current_timings: contextvars.ContextVar = contextvars.ContextVar('request_timings', default=None)
+
+
+def start_request() -> Tuple[RequestTimings, contextvars.Token]:
+    """Begin collecting spans for the current request (see RequestTimingMiddleware)"""
+    timings = RequestTimings()
+    return timings, _current_timings.set(timings)
+
+
+def finish_request(timings: RequestTimings, token: contextvars.Token, endpoint: str,
+                   method: str = '', status: int = 200):
+    """Stop collecting and export the request's spans to the histograms"""
+    _current_timings.reset(token)
+    labels = dict(timings.labels, endpoint=endpoint)
+    for stage, seconds in timings.totals().items():
+        STAGE_SECONDS.observe(seconds, stage=stage, **labels)
+    REQUEST_SECONDS.observe(time.perf_counter() - timings.started, method=method, status=status, **labels)
+
+
+def set_request_labels(**labels):
+    """Attach labels (language, intent) to the current request's spans"""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.labels.update((name, value) for name, value in labels.items() if value)
+
+
+def record_span(stage: str, seconds: float):
+    """Record a stage duration in the current request, or directly outside of one"""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+    else:
+        STAGE_SECONDS.observe(seconds, stage=stage, endpoint='', language='', intent='')
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block as one pipeline stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - started)
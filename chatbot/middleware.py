@@ -0,0 +1,56 @@
+"""
+Request timing middleware
+Collects pipeline stage spans per request, exports them as latency histograms
+and reports them to the client in a Server-Timing header
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import finish_request, start_request
+
+
+class RequestTimingMiddleware:
+    """Wraps each request in a metrics timing context (sync and async requests)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        timings, token = start_request()
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            self._finish(request, response, timings, token)
+
+    async def __acall__(self, request):
+        timings, token = start_request()
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            self._finish(request, response, timings, token)
+
+    def _finish(self, request, response, timings, token):
+        match = getattr(request, 'resolver_match', None)
+        # URL names keep the endpoint label bounded (raw paths contain IDs)
+        endpoint = match.url_name if match and match.url_name else 'unmatched'
+        finish_request(
+            timings, token, endpoint,
+            method=request.method,
+            status=response.status_code if response is not None else 500
+        )
+        if response is not None and settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = timings.server_timing()
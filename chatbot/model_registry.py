@@ -0,0 +1,350 @@
+"""
+Process-wide registry for heavy ML models (Whisper, the pyttsx3 engine)
+Each model is loaded at most once per process, lazily or through an explicit warmup.
+Models idle for longer than idle_seconds are unloaded and loaded again on their
+next use, and loading one past the memory budget unloads the least recently used.
+"""
+
+import ctypes
+import gc
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+from .metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# Model states reported by readiness()
+UNLOADED = 'unloaded'
+LOADING = 'loading'
+READY = 'ready'
+FAILED = 'failed'
+# Unloaded after idling (or to make room); the next get() loads it again
+EVICTED = 'evicted'
+
+# Cold-start policies: what get() does with an evicted model
+WAIT = 'wait'  # load it and return it (the caller waits)
+REJECT = 'reject'  # return None at once and load it in the background
+COLD_START_POLICIES = (WAIT, REJECT)
+
+MODEL_RELOAD_SECONDS = metrics_registry.histogram(
+    'chatbot_model_reload_seconds', 'Load and warmup time of models brought back after being unloaded', ('model',)
+)
+MODEL_EVICTIONS = metrics_registry.counter(
+    'chatbot_model_evictions_total', 'Models unloaded, by reason (idle, memory)', ('model', 'reason')
+)
+
+
+def resident_memory_mb() -> Optional[float]:
+    """Resident set size of this process (None where /proc is missing)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+    except OSError:
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def release_freed_memory():
+    """Hand memory the C allocator has freed back to the OS (glibc keeps it for reuse otherwise)"""
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class ModelRegistry:
+    """Loads registered models once and tracks whether they are warm"""
+
+    def __init__(self, retry_seconds: float = 60, idle_seconds: float = 0, memory_budget_mb: float = 0,
+                 cold_start: str = WAIT):
+        # A failed load is not retried on every request, only after this long
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        self._reaper = None
+        self._reaper_pid = None
+        self.configure(idle_seconds, memory_budget_mb, cold_start)
+
+    def configure(self, idle_seconds: float = 0, memory_budget_mb: float = 0, cold_start: str = WAIT):
+        """
+        Set the lifecycle policy
+        Args:
+            idle_seconds: Unload a model unused for this long (0 = keep models loaded)
+            memory_budget_mb: Memory the loaded models may hold together (0 = no limit)
+            cold_start: WAIT or REJECT, for a request that finds its model unloaded
+        Raises:
+            ValueError: Unknown cold-start policy
+        """
+        if cold_start not in COLD_START_POLICIES:
+            raise ValueError(f"Unknown cold-start policy '{cold_start}' (choose from {', '.join(COLD_START_POLICIES)})")
+        self.idle_seconds = idle_seconds
+        self.memory_budget_mb = memory_budget_mb
+        self.cold_start = cold_start
+
+    def register(self, name: str, loader: Callable[[], object],
+                 warmup: Optional[Callable[[object], None]] = None,
+                 unload: Optional[Callable[[object], None]] = None,
+                 memory_mb: Optional[Callable[[object], float]] = None):
+        """
+        Register a model
+        Args:
+            name: Registry key
+            loader: Callable returning the loaded model (or None if unavailable)
+            warmup: Optional callable running a dummy inference on the model
+            unload: Optional callable releasing the model's resources when it is unloaded
+            memory_mb: Optional callable estimating the loaded model's memory (default: the
+                growth of this process's resident memory during the load)
+        """
+        with self._lock:
+            self._entries[name] = {
+                'loader': loader,
+                'warmup': warmup,
+                'unload': unload,
+                'memory_mb': memory_mb,
+                'model': None,
+                'state': UNLOADED,
+                'error': None,
+                'load_seconds': None,
+                'warmup_seconds': None,
+                'failed_at': None,
+                'resident_mb': None,
+                'last_used': None,
+                'loads': 0,
+                'reloader': None,
+                'lock': threading.Lock(),
+            }
+
+    def _entry(self, name: str) -> Dict:
+        entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(f"Model '{name}' is not registered")
+        return entry
+
+    def get(self, name: str):
+        """
+        Get a model, loading (and warming) it on first use
+        A model unloaded since is loaded again here with the WAIT policy; with REJECT
+        this returns None while it loads in the background.
+        """
+        entry = self._entry(name)
+        entry['last_used'] = time.monotonic()
+        # One read: the reaper may unload between a state check and a model read,
+        # and a caller holding the reference keeps the model alive until it finishes
+        model = entry['model']
+        if model is not None or self._recently_failed(entry):
+            return model
+
+        if entry['loads'] and self.cold_start == REJECT:
+            self._reload_in_background(name, entry)
+            return None
+
+        with entry['lock']:
+            if entry['state'] != READY and not self._recently_failed(entry):
+                self._load(name, entry)
+            return entry['model']
+
+    def _recently_failed(self, entry: Dict) -> bool:
+        return entry['state'] == FAILED and time.monotonic() - entry['failed_at'] < self.retry_seconds
+
+    def _reload_in_background(self, name: str, entry: Dict):
+        with self._lock:
+            if entry['reloader'] is not None and entry['reloader'].is_alive():
+                return
+            entry['reloader'] = threading.Thread(
+                target=self.get_loaded, args=(name,), name=f'model-reload-{name}', daemon=True
+            )
+            entry['reloader'].start()
+
+    def get_loaded(self, name: str):
+        """Get a model, loading it if needed whatever the cold-start policy"""
+        entry = self._entry(name)
+        with entry['lock']:
+            if entry['state'] != READY and not self._recently_failed(entry):
+                self._load(name, entry)
+            return entry['model']
+
+    def _load(self, name: str, entry: Dict):
+        reloading = entry['loads'] > 0
+        if self.memory_budget_mb and entry['resident_mb']:
+            # Make room first, so the old and new models are never resident together
+            self._evict_for(name, self.memory_budget_mb - entry['resident_mb'])
+        entry['state'] = LOADING
+        entry['error'] = None
+        try:
+            before = resident_memory_mb()
+            started = time.perf_counter()
+            model = entry['loader']()
+            entry['load_seconds'] = time.perf_counter() - started
+
+            if model is None:
+                raise RuntimeError(f"Model '{name}' is not available")
+
+            if entry['warmup'] is not None:
+                started = time.perf_counter()
+                entry['warmup'](model)
+                entry['warmup_seconds'] = time.perf_counter() - started
+
+            entry['model'] = model
+            entry['state'] = READY
+            entry['loads'] += 1
+            entry['last_used'] = time.monotonic()
+            if entry['memory_mb'] is not None:
+                entry['resident_mb'] = entry['memory_mb'](model)
+            elif before is not None:
+                entry['resident_mb'] = max(0.0, resident_memory_mb() - before)
+            if reloading:
+                MODEL_RELOAD_SECONDS.observe(entry['load_seconds'] + (entry['warmup_seconds'] or 0), model=name)
+            logger.info(f"Model '{name}' ready (load {entry['load_seconds']:.2f}s, "
+                        f"warmup {entry['warmup_seconds'] or 0:.2f}s, {entry['resident_mb'] or 0:.0f} MB)")
+        except Exception as e:
+            entry['model'] = None
+            entry['state'] = FAILED
+            entry['failed_at'] = time.monotonic()
+            entry['error'] = str(e)
+            logger.error(f"Failed to load model '{name}': {e}")
+            return
+        if self.memory_budget_mb:
+            self._evict_for(name, self.memory_budget_mb)
+        if self.idle_seconds:
+            self._start_reaper()
+
+    def _evict_for(self, name: str, budget_mb: float):
+        """Unload the least recently used other models until the loaded ones fit budget_mb"""
+        busy = set()
+        while True:
+            loaded = [(other, entry) for other, entry in list(self._entries.items()) if entry['state'] == READY]
+            if sum(entry['resident_mb'] or 0 for _, entry in loaded) <= budget_mb:
+                return
+            candidates = [(other, entry) for other, entry in loaded if other != name and other not in busy]
+            if not candidates:
+                return
+            other, entry = min(candidates, key=lambda item: item[1]['last_used'] or 0)
+            # Never wait on another model's lock while holding this one's (two loads could deadlock)
+            if not entry['lock'].acquire(blocking=False):
+                busy.add(other)
+                continue
+            try:
+                if entry['state'] == READY:
+                    self._unload(other, entry, 'memory')
+            finally:
+                entry['lock'].release()
+
+    def _unload(self, name: str, entry: Dict, reason: str):
+        """Drop the registry's reference (callers still using the model keep theirs until they finish)"""
+        model, entry['model'] = entry['model'], None
+        entry['state'] = EVICTED
+        if entry['unload'] is not None:
+            try:
+                entry['unload'](model)
+            except Exception as e:
+                logger.warning(f"Unloading model '{name}' failed: {e}")
+        del model
+        gc.collect()
+        release_freed_memory()
+        MODEL_EVICTIONS.inc(model=name, reason=reason)
+        logger.info(f"Model '{name}' unloaded ({reason}, {entry['resident_mb'] or 0:.0f} MB)")
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Unload every model unused for idle_seconds; returns how many were unloaded"""
+        if not self.idle_seconds:
+            return 0
+        now = time.monotonic() if now is None else now
+        evicted = 0
+        for name, entry in list(self._entries.items()):
+            if entry['state'] != READY or now - entry['last_used'] < self.idle_seconds:
+                continue
+            # A model being (re)loaded right now is not idle
+            if not entry['lock'].acquire(blocking=False):
+                continue
+            try:
+                if entry['state'] == READY and now - entry['last_used'] >= self.idle_seconds:
+                    self._unload(name, entry, 'idle')
+                    evicted += 1
+            finally:
+                entry['lock'].release()
+        return evicted
+
+    def _start_reaper(self):
+        """Start the thread unloading idle models (again after a fork, which does not copy threads)"""
+        with self._lock:
+            if self._reaper is not None and self._reaper_pid == os.getpid() and self._reaper.is_alive():
+                return
+            self._reaper_pid = os.getpid()
+            self._reaper = threading.Thread(target=self._reap, name='model-reaper', daemon=True)
+            self._reaper.start()
+
+    def _reap(self):
+        while self.idle_seconds:
+            time.sleep(min(60.0, max(1.0, self.idle_seconds / 4)))
+            self.evict_idle()
+
+    def reload(self, name: str):
+        """Discard a model and load it again"""
+        entry = self._entry(name)
+        with entry['lock']:
+            entry['model'] = None
+            entry['state'] = UNLOADED
+            self._load(name, entry)
+        return entry['model']
+
+    def warmup(self, names: Optional[Iterable[str]] = None) -> Dict:
+        """Load and warm the given (default: all) models, returning readiness"""
+        for name in list(names or self._entries):
+            self.get(name)
+        return self.readiness()
+
+    def is_ready(self, name: str) -> bool:
+        entry = self._entries.get(name)
+        return entry is not None and entry['state'] == READY
+
+    def readiness(self) -> Dict:
+        """Get the state of every registered model (never triggers a load)"""
+        now = time.monotonic()
+        return {
+            name: {
+                'state': entry['state'],
+                'error': entry['error'],
+                'load_seconds': entry['load_seconds'],
+                'warmup_seconds': entry['warmup_seconds'],
+                'resident_mb': entry['resident_mb'] if entry['state'] == READY else 0,
+                'idle_seconds': now - entry['last_used'] if entry['last_used'] is not None else None,
+            }
+            for name, entry in list(self._entries.items())
+        }
+
+
+# Global registry instance
+model_registry = ModelRegistry()
+
+
+def _collect_model_metrics():
+    """Model load state and load/warmup durations for /metrics"""
+    readiness = model_registry.readiness()
+    return [
+        ('chatbot_model_ready', 'gauge', 'Whether a registered model is loaded and warm',
+         [({'model': name}, int(status['state'] == READY)) for name, status in readiness.items()]),
+        ('chatbot_model_load_seconds', 'gauge', 'Duration of the last model load',
+         [({'model': name}, status['load_seconds']) for name, status in readiness.items()]),
+        ('chatbot_model_warmup_seconds', 'gauge', 'Duration of the last model warmup inference',
+         [({'model': name}, status['warmup_seconds']) for name, status in readiness.items()]),
+        ('chatbot_model_resident_mb', 'gauge', 'Estimated memory of each loaded model',
+         [({'model': name}, status['resident_mb']) for name, status in readiness.items()]),
+        ('chatbot_model_idle_seconds', 'gauge', 'Seconds since each model was last used',
+         [({'model': name}, status['idle_seconds']) for name, status in readiness.items()]),
+    ]
+
+
+metrics_registry.register_collector(_collect_model_metrics)
+
+
+def warmup_models_in_background(names: Optional[Iterable[str]] = None) -> threading.Thread:
+    """Start warming models without blocking the caller (server startup hook)"""
+    thread = threading.Thread(
+        target=model_registry.warmup, args=(names,), name='model-warmup', daemon=True
+    )
+    thread.start()
+    return thread
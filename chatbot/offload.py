@@ -0,0 +1,28 @@
+"""
+Blocking work from async views
+Speech recognition, synthesis and file writes run on a bounded thread pool,
+so the event loop keeps serving other requests while they run
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+# gTTS and file writes release the GIL while they wait, so threads give real
+# parallelism. In-process openai-whisper inference is serialized per model (see
+# stt_engines); the worker pool is where recognition runs in parallel.
+# The bound keeps hundreds of waiting requests from becoming hundreds of threads.
+_executor = ThreadPoolExecutor(max_workers=settings.VOICE_OFFLOAD_WORKERS, thread_name_prefix='voice-offload')
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run a blocking call on the offload pool and wait for it without blocking the loop
+    The caller's context goes along, so stage spans land in the request's timings
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
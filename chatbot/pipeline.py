@@ -0,0 +1,114 @@
+"""
+Declared query pipeline
+Each stage names the request state it needs and provides; each intent is
+routed through only the stages it needs, so a greeting never reaches search
+"""
+
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .metrics import span
+
+
+class Stage:
+    """
+    One pipeline step
+    The handler reads and updates the request state dict; returning True
+    means the request is answered and the rest of the route is skipped.
+    Stages that wait on I/O also give an async_handler for the async views.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Dict], Optional[bool]],
+                 needs: Iterable[str] = (), provides: Iterable[str] = (), description: str = '',
+                 async_handler: Optional[Callable[[Dict], Awaitable[Optional[bool]]]] = None):
+        self.name = name
+        self.handler = handler
+        self.async_handler = async_handler
+        self.needs = tuple(needs)
+        self.provides = tuple(provides)
+        self.description = description
+
+
+class QueryPipeline:
+    """Stages plus the route (ordered stage names) each intent takes through them"""
+
+    def __init__(self, stages: Iterable[Stage], routes: Dict[str, Sequence[str]],
+                 default_route: Sequence[str], inputs: Iterable[str] = ()):
+        """
+        Args:
+            stages: Every stage a route may use
+            routes: Intent -> stage names, for intents that do not take the default route
+            default_route: Stage names for every other intent
+            inputs: State keys present before the first stage runs
+        Raises:
+            ValueError: A route names an unknown stage or uses state no earlier stage provides
+        """
+        self._stages = {stage.name: stage for stage in stages}
+        self.inputs = tuple(inputs)
+        self.routes = {intent: tuple(route) for intent, route in routes.items()}
+        self.default_route = tuple(default_route)
+
+        for intent, route in list(self.routes.items()) + [('default', self.default_route)]:
+            self._validate(intent, route)
+
+    def _validate(self, intent: str, route: Tuple[str, ...]):
+        available = set(self.inputs)
+        for name in route:
+            stage = self._stages.get(name)
+            if stage is None:
+                raise ValueError(f"Route for {intent!r} uses unknown stage {name!r}")
+            missing = [key for key in stage.needs if key not in available]
+            if missing:
+                raise ValueError(f"Stage {name!r} in route for {intent!r} needs {missing} before it runs")
+            available.update(stage.provides)
+
+    def route(self, intent: str) -> Tuple[str, ...]:
+        """Stage names the intent runs through"""
+        return self.routes.get(intent, self.default_route)
+
+    def run(self, intent: str, state: Dict) -> List[str]:
+        """
+        Run the intent's route over the request state, timing each stage
+        Returns:
+            Names of the stages that ran
+        """
+        ran = []
+        for name in self.route(intent):
+            with span(name):
+                answered = self._stages[name].handler(state)
+            ran.append(name)
+            if answered:
+                break
+        return ran
+
+    async def arun(self, intent: str, state: Dict) -> List[str]:
+        """Run the intent's route from async code (stages without an async_handler run inline)"""
+        ran = []
+        for name in self.route(intent):
+            stage = self._stages[name]
+            with span(name):
+                if stage.async_handler is not None:
+                    answered = await stage.async_handler(state)
+                else:
+                    answered = stage.handler(state)
+            ran.append(name)
+            if answered:
+                break
+        return ran
+
+    def describe(self) -> Dict:
+        """The stage graph as plain data (admin debugging endpoint)"""
+        return {
+            'inputs': list(self.inputs),
+            'stages': [
+                {
+                    'name': stage.name,
+                    'needs': list(stage.needs),
+                    'provides': list(stage.provides),
+                    'description': stage.description,
+                    'async': stage.async_handler is not None,
+                }
+                for stage in self._stages.values()
+            ],
+            'routes': {intent: list(route) for intent, route in self.routes.items()},
+            'default_route': list(self.default_route),
+        }
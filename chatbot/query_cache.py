@@ -0,0 +1,132 @@
+"""
+Query result cache for the chat pipeline
+Bounded LRU + TTL cache that is dropped whenever the scheme corpus version changes
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from .search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for cache lookups (case, Unicode form, punctuation, spacing)"""
+    return " ".join(tokenize(query))
+
+
+class QueryResultCache:
+    """Thread-safe LRU cache with per-entry TTL and corpus-version invalidation"""
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 300,
+                 version_source: Optional[Callable[[], int]] = None,
+                 version_check_seconds: float = 5):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version_source = version_source
+        self.version_check_seconds = version_check_seconds
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[float, Dict]]" = OrderedDict()
+        self._version = None
+        self._version_checked_at = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(query: str, language: str, intent: str) -> Tuple[str, str, str]:
+        return (normalize_query(query), language, intent)
+
+    def version_check_due(self) -> bool:
+        """True (once per interval) when the corpus version should be polled again"""
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_seconds:
+            return False
+        self._version_checked_at = now
+        return True
+
+    def _check_version(self):
+        """Clear the cache if the corpus version moved (polled at most every few seconds)"""
+        if self.version_source is None or not self.version_check_due():
+            return
+
+        try:
+            version = self.version_source()
+        except Exception as e:
+            logger.warning(f"Could not read corpus version: {e}")
+            return
+
+        self.update_version(version)
+
+    def update_version(self, version: int):
+        """Record the corpus version read by the caller, clearing the cache if it moved"""
+        with self._lock:
+            if self._version is not None and version != self._version:
+                self._entries.clear()
+                self.invalidations += 1
+                logger.info(f"Scheme corpus changed ({self._version} -> {version}), query cache cleared")
+            self._version = version
+
+    def get(self, key: Tuple, check_version: bool = True) -> Optional[Dict]:
+        """
+        Get a cached value, or None on a miss
+        check_version=False skips the corpus version poll (async callers poll it themselves)
+        """
+        if check_version:
+            self._check_version()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Tuple, value: Dict):
+        """Store a value, evicting the least recently used entries beyond the bound"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def get_stats(self) -> Dict:
+        """Get cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'corpus_version': self._version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
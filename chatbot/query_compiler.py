@@ -0,0 +1,150 @@
+"""
+Query compiler for MongoDB scheme searches
+Turns raw user text into escaped, bounded predicates that indexes can serve
+"""
+
+import logging
+import re
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from .search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Pre-lowercased token array stored on every scheme document (multikey indexed)
+SEARCH_TERMS_FIELD = 'search_terms'
+# Every field basic or advanced search matches on, so no hit depends on the scan fallback
+SEARCH_TERMS_SOURCE_FIELDS = ('title', 'keywords', 'search_tags', 'short_description', 'description', 'benefits')
+
+# Limits applied to every compiled query
+MAX_QUERY_LENGTH = 500
+MAX_TERMS = 10
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 40
+# Terms at least this long also match longer tokens ("farmer" -> "farmers")
+MIN_PREFIX_LENGTH = 4
+
+
+def build_search_terms(scheme: Dict) -> List[str]:
+    """Build the search_terms token array stored on a scheme document"""
+    terms = set()
+    for field in SEARCH_TERMS_SOURCE_FIELDS:
+        terms.update(tokenize(scheme.get(field)))
+    return sorted(terms)
+
+
+class CompiledQuery:
+    """Normalized query terms plus the MongoDB predicates built from them"""
+
+    def __init__(self, terms: List[str], dropped: List[str], truncated: bool):
+        self.terms = terms
+        self.dropped = dropped
+        self.truncated = truncated
+        self.exact_terms = [term for term in terms if len(term) < MIN_PREFIX_LENGTH]
+        self.prefix_terms = [term for term in terms if len(term) >= MIN_PREFIX_LENGTH]
+
+    def __bool__(self) -> bool:
+        return bool(self.terms)
+
+    def token_filter(self) -> Dict:
+        """
+        Predicate on the search_terms array: exact tokens plus anchored,
+        case-sensitive prefixes, both of which are bounded index scans
+        """
+        values = list(self.exact_terms)
+        values.extend(re.compile('^' + re.escape(term)) for term in self.prefix_terms)
+        return {SEARCH_TERMS_FIELD: {"$in": values}}
+
+    def regex_filter(self, fields: Iterable[str], array_fields: Iterable[str] = ()) -> Dict:
+        """
+        Escaped unanchored alternation over text fields, for documents that do
+        not carry search_terms yet. This still scans, so it is reported as slow.
+        """
+        pattern = "|".join(re.escape(term) for term in self.terms)
+        clauses = [{field: {"$regex": pattern, "$options": "i"}} for field in fields]
+        clauses.extend(
+            {field: {"$elemMatch": {"$regex": pattern, "$options": "i"}}} for field in array_fields
+        )
+        return {"$or": clauses}
+
+    def plan(self, shape: str) -> Dict:
+        """Describe the query that was (or will be) executed"""
+        return {
+            'shape': shape,
+            'terms': self.terms,
+            'exact_terms': len(self.exact_terms),
+            'prefix_terms': len(self.prefix_terms),
+            'dropped_terms': self.dropped,
+            'truncated': self.truncated,
+        }
+
+
+class QueryCompiler:
+    """Tokenizes, normalizes, bounds and escapes user search terms"""
+
+    # Plan shapes in order of cost
+    INDEXED_SHAPE = 'indexed_tokens'
+    SCAN_SHAPE = 'escaped_regex_scan'
+
+    def __init__(self, max_terms: int = MAX_TERMS, max_query_length: int = MAX_QUERY_LENGTH,
+                 min_term_length: int = MIN_TERM_LENGTH, max_term_length: int = MAX_TERM_LENGTH):
+        self.max_terms = max_terms
+        self.max_query_length = max_query_length
+        self.min_term_length = min_term_length
+        self.max_term_length = max_term_length
+        self._lock = threading.Lock()
+        self._shape_counts: Dict[str, int] = {}
+
+    def compile(self, raw_terms) -> CompiledQuery:
+        """
+        Compile raw user input into a bounded set of search terms
+        Args:
+            raw_terms: Query string or list of keywords/phrases
+        Returns:
+            CompiledQuery
+        """
+        if isinstance(raw_terms, str):
+            raw_terms = [raw_terms]
+
+        text = " ".join(term for term in raw_terms if term)
+        truncated = len(text) > self.max_query_length
+        text = text[:self.max_query_length]
+
+        terms, dropped = [], []
+        for token in tokenize(text):
+            if len(token) < self.min_term_length:
+                dropped.append(token)
+                continue
+            token = token[:self.max_term_length]
+            if token in terms:
+                continue
+            if len(terms) >= self.max_terms:
+                dropped.append(token)
+                truncated = True
+                continue
+            terms.append(token)
+
+        return CompiledQuery(terms, dropped, truncated)
+
+    def report(self, compiled: CompiledQuery, shape: str, result_count: Optional[int] = None):
+        """Record and log the plan of an executed query"""
+        with self._lock:
+            self._shape_counts[shape] = self._shape_counts.get(shape, 0) + 1
+
+        plan = compiled.plan(shape)
+        plan['results'] = result_count
+        if shape == self.SCAN_SHAPE:
+            logger.warning(f"Slow query shape (collection scan): {plan}")
+        else:
+            logger.debug(f"Compiled query plan: {plan}")
+        return plan
+
+    def get_stats(self) -> Dict:
+        """Get how often each plan shape has been executed"""
+        with self._lock:
+            return dict(self._shape_counts)
+
+
+# Global compiler instance
+query_compiler = QueryCompiler()
@@ -0,0 +1,319 @@
+"""
+Single-pass query analysis
+One Aho-Corasick automaton, built at import from the English, Kannada and Hindi
+tables below, finds intent cues, gazetteer entities, scheme names and stopwords
+"""
+
+from collections import deque
+from typing import Dict, Iterator, List, Tuple
+
+from .search_index import TOKEN_PATTERN, normalize_text
+
+# Cues shorter than this must match a whole word ("hi" is not "his"); longer
+# ones also match inflected forms ("farmer" -> "farmers", "ರೈತ" -> "ರೈತರಿಗೆ").
+# Short cues list their inflected forms explicitly ("job", "jobs").
+MIN_PREFIX_LENGTH = 4
+MIN_INDIC_PREFIX_LENGTH = 3
+
+# Intent cues in priority order (used to break score ties). "a.*b" means the
+# words appear in this order anywhere in the query; such cues score per part.
+INTENT_CUES = {
+    'search_scheme': [
+        'scheme.*for', 'program.*for', 'yojana.*for', 'benefit.*for', 'help.*with', 'support.*for',
+        # Kannada
+        'ಯೋಜನೆ', 'ಕಾರ್ಯಕ್ರಮ', 'ಲಾಭ', 'ಸಹಾಯ', 'ಬೆಂಬಲ',
+        # Hindi
+        'योजना', 'कार्यक्रम', 'के.*लिए.*योजना',
+    ],
+    'get_info': [
+        'what.*is', 'tell.*about', 'information.*about', 'details.*of', 'explain',
+        # Kannada
+        'ಏನು', 'ಹೇಳಿ', 'ಮಾಹಿತಿ', 'ವಿವರ', 'ವಿವರಿಸಿ',
+        # Hindi
+        'क्या.*है', 'बताइए', 'बताओ', 'जानकारी', 'विवरण',
+    ],
+    'eligibility': [
+        'eligible', 'qualify', 'criteria', 'requirements', 'who.*can.*apply',
+        # Kannada
+        'ಅರ್ಹತೆ', 'ಅರ್ಹ', 'ನಿಯಮ', 'ಅವಶ್ಯಕತೆ', 'ಯಾರು.*ಅರ್ಜಿ',
+        # Hindi
+        'पात्रता', 'पात्र', 'योग्यता', 'कौन.*आवेदन',
+    ],
+    'application': [
+        'how.*to.*apply', 'apply.*for', 'application.*process', 'where.*to.*apply', 'documents.*required',
+        # Kannada
+        'ಎಲ್ಲಿ.*ಅರ್ಜಿ', 'ಅರ್ಜಿ.*ಹಾಕಿ', 'ಅರ್ಜಿ.*ಪ್ರಕ್ರಿಯೆ', 'ದಾಖಲೆ.*ಅವಶ್ಯಕ',
+        # Hindi
+        'आवेदन.*कैसे', 'कैसे.*आवेदन', 'आवेदन.*प्रक्रिया', 'दस्तावेज़',
+    ],
+    'benefits': [
+        'benefits', 'advantages', 'what.*do.*i.*get', 'assistance', 'help.*provided',
+        # Kannada
+        'ಲಾಭ', 'ಅನುಕೂಲ', 'ಏನು.*ಸಿಗುತ್ತದೆ', 'ಸಹಾಯ', 'ಬೆಂಬಲ.*ನೀಡುತ್ತಾರೆ',
+        # Hindi
+        'लाभ', 'फायदा', 'क्या.*मिलेगा', 'सहायता',
+    ],
+    'sector_specific': [
+        'agriculture', 'health', 'education', 'employment', 'farmer', 'student', 'job', 'jobs',
+        # Kannada
+        'ಕೃಷಿ', 'ಆರೋಗ್ಯ', 'ಶಿಕ್ಷಣ', 'ಉದ್ಯೋಗ', 'ರೈತ', 'ವಿದ್ಯಾರ್ಥಿ', 'ಕೆಲಸ',
+        # Hindi
+        'कृषि', 'किसान', 'स्वास्थ्य', 'शिक्षा', 'रोजगार', 'छात्र', 'नौकरी',
+    ],
+    'greeting': [
+        'hello', 'hi', 'good.*morning', 'good.*afternoon', 'good.*evening',
+        # Kannada
+        'ನಮಸ್ಕಾರ', 'ಹಲೋ', 'ಶುಭ.*ಬೆಳಿಗ್ಗೆ', 'ಶುಭ.*ಮಧ್ಯಾಹ್ನ', 'ಶುಭ.*ಸಂಜೆ',
+        # Hindi
+        'नमस्ते', 'नमस्कार', 'सुप्रभात',
+    ],
+    'help': [
+        'help', 'what.*can.*you.*do', 'how.*to.*use', 'commands',
+        # Kannada
+        'ಸಹಾಯ', 'ಏನು.*ಮಾಡಬಹುದು', 'ಹೇಗೆ.*ಬಳಸುವುದು', 'ಆಜ್ಞೆಗಳು',
+        # Hindi
+        'मदद', 'आप.*क्या.*कर.*सकते',
+    ],
+}
+DEFAULT_INTENT = 'general_query'
+
+SECTOR_GAZETTEER = {
+    'agriculture': ['agriculture', 'farmer', 'farming', 'crop', 'irrigation', 'kisan',
+                    'ಕೃಷಿ', 'ರೈತ', 'ಬೆಳೆ', 'कृषि', 'किसान', 'खेती', 'फसल'],
+    'health': ['health', 'medical', 'hospital', 'doctor', 'medicine', 'treatment',
+               'ಆರೋಗ್ಯ', 'ಆಸ್ಪತ್ರೆ', 'ಚಿಕಿತ್ಸೆ', 'स्वास्थ्य', 'अस्पताल', 'इलाज'],
+    'education': ['education', 'school', 'college', 'student', 'scholarship', 'learning',
+                  'ಶಿಕ್ಷಣ', 'ಶಾಲೆ', 'ವಿದ್ಯಾರ್ಥಿ', 'ವಿದ್ಯಾರ್ಥಿವೇತನ', 'शिक्षा', 'स्कूल', 'छात्र', 'छात्रवृत्ति'],
+    'employment': ['employment', 'job', 'jobs', 'work', 'skill', 'training', 'rogar',
+                   'ಉದ್ಯೋಗ', 'ಕೆಲಸ', 'ತರಬೇತಿ', 'रोजगार', 'नौकरी', 'प्रशिक्षण'],
+    'housing': ['housing', 'house', 'home', 'awas', 'pmay', 'residence', 'ವಸತಿ', 'ಮನೆ', 'आवास', 'घर'],
+    'social_welfare': ['welfare', 'pension', 'widow', 'disabled', 'senior', 'social', 'housing', 'house', 'awas',
+                       'ಪಿಂಚಣಿ', 'ಕಲ್ಯಾಣ', 'पेंशन', 'कल्याण'],
+    'urban_development': ['urban', 'city', 'housing', 'house', 'awas', 'pmay', 'ನಗರ', 'शहरी'],
+    'women_empowerment': ['women', 'girl', 'female', 'empowerment', 'beti', 'mahila',
+                          'ಮಹಿಳೆ', 'ಮಹಿಳಾ', 'महिला', 'बेटी'],
+    'youth_development': ['youth', 'young', 'student', 'youth development', 'ಯುವ', 'युवा'],
+}
+
+AGE_GAZETTEER = {
+    'children': ['child', 'children', 'kid', 'kids', 'minor', 'under 18', 'ಮಕ್ಕಳು', 'बच्चे', 'बच्चों'],
+    'youth': ['youth', 'young', 'teenager', '18-30', '18-35', 'ಯುವ', 'युवा'],
+    'adult': ['adult', 'middle age', '30-60', '35-60'],
+    'senior': ['senior', 'elderly', 'old', 'above 60', '60+', 'pension', 'ಹಿರಿಯ', 'ವೃದ್ಧ', 'वृद्ध', 'बुजुर्ग'],
+}
+
+GENDER_GAZETTEER = {
+    'female': ['women', 'woman', 'girl', 'female', 'ladies', 'ಮಹಿಳೆ', 'ಹೆಣ್ಣು', 'महिला', 'लड़की'],
+    'male': ['men', 'man', 'boy', 'boys', 'male', 'gentlemen', 'ಪುರುಷ', 'पुरुष', 'लड़का'],
+}
+
+# Exact scheme names returned as the only keyword when mentioned
+SCHEME_NAMES = ['pradhan mantri awas yojana', 'pmay', 'awas yojana']
+
+STOPWORDS = [
+    'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you', 'your', 'yours',
+    'yourself', 'yourselves', 'he', 'him', 'his', 'himself', 'she', 'her', 'hers',
+    'herself', 'it', 'its', 'itself', 'they', 'them', 'their', 'theirs', 'themselves',
+    'what', 'which', 'who', 'whom', 'this', 'that', 'these', 'those', 'am', 'is', 'are',
+    'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'having', 'do', 'does',
+    'did', 'doing', 'a', 'an', 'the', 'and', 'but', 'if', 'or', 'because', 'as', 'until',
+    'while', 'of', 'at', 'by', 'for', 'with', 'through', 'during', 'before', 'after',
+    'above', 'below', 'up', 'down', 'in', 'out', 'on', 'off', 'over', 'under', 'again',
+    'further', 'then', 'once', 'here', 'there', 'when', 'where', 'why', 'how', 'all',
+    'any', 'both', 'each', 'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor',
+    'not', 'only', 'own', 'same', 'so', 'than', 'too', 'very', 'can', 'will', 'just',
+    'should', 'now', 'please', 'thank', 'thanks',
+    # Kannada
+    'ಮತ್ತು', 'ಈ', 'ಆ', 'ನನಗೆ', 'ನಾನು', 'ನನ್ನ', 'ಇದೆ', 'ಇವೆ', 'ದಯವಿಟ್ಟು', 'ಬಗ್ಗೆ', 'ಯಾವುದು', 'ಯಾವ',
+    # Hindi
+    'है', 'हैं', 'के', 'की', 'का', 'में', 'और', 'को', 'से', 'पर', 'यह', 'वह', 'क्या', 'मुझे', 'मेरे',
+    'मैं', 'कृपया', 'लिए', 'कोई', 'भी', 'हो', 'था', 'थी',
+]
+
+MAX_KEYWORDS = 10
+MIN_KEYWORD_LENGTH = 3
+
+
+class AhoCorasick:
+    """Multi-pattern string matcher: every occurrence of every pattern in one pass"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, object]]] = [[]]
+
+    def add(self, pattern: str, payload):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((len(pattern), payload))
+
+    def build(self):
+        """Compute failure links (breadth first) and merge outputs along them"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, object]]:
+        """Yield (start, end, payload) for every pattern occurrence"""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, payload in output[state]:
+                yield index + 1 - length, index + 1, payload
+
+
+class QueryAnalysis:
+    """Everything the matcher found in one query"""
+
+    def __init__(self, intents: List[Tuple[str, float]], sectors: List[str], age_groups: List[str],
+                 genders: List[str], keywords: List[str]):
+        # (intent, score) best first; scores sum to 1
+        self.intents = intents
+        self.intent = intents[0][0] if intents else DEFAULT_INTENT
+        self.sectors = sectors
+        self.age_groups = age_groups
+        self.genders = genders
+        self.keywords = keywords
+
+    def entities(self) -> Dict:
+        return {
+            'sectors': list(self.sectors),
+            'age_groups': list(self.age_groups),
+            'genders': list(self.genders),
+            'locations': [],
+            'scheme_types': []
+        }
+
+
+class QueryMatcher:
+    """Precompiled automaton over all pattern tables"""
+
+    def __init__(self):
+        self._automaton = AhoCorasick()
+        self._intent_priority = {intent: rank for rank, intent in enumerate(INTENT_CUES)}
+        # Sequence cues: (intent, parts) scored when the parts occur in order
+        self._sequences: List[Tuple[str, Tuple[str, ...]]] = []
+
+        for intent, cues in INTENT_CUES.items():
+            for cue in cues:
+                parts = tuple(normalize_text(part) for part in cue.split('.*'))
+                if len(parts) == 1:
+                    self._add(parts[0], ('intent', intent))
+                else:
+                    self._sequences.append((intent, parts))
+                    for part in parts:
+                        self._add(part, ('part', part))
+
+        for kind, gazetteer in (('sector', SECTOR_GAZETTEER), ('age', AGE_GAZETTEER), ('gender', GENDER_GAZETTEER)):
+            for value, terms in gazetteer.items():
+                for term in terms:
+                    self._add(normalize_text(term), (kind, value))
+
+        for name in SCHEME_NAMES:
+            self._add(normalize_text(name), ('scheme_name', name))
+        for word in STOPWORDS:
+            self._add(normalize_text(word), ('stopword', None), whole_word=True)
+
+        self._automaton.build()
+
+    def _add(self, pattern: str, payload: Tuple, whole_word: bool = False):
+        if not whole_word:
+            whole_word = len(pattern) < (MIN_PREFIX_LENGTH if pattern.isascii() else MIN_INDIC_PREFIX_LENGTH)
+        self._automaton.add(pattern, payload + (whole_word,))
+
+    def analyze(self, query: str) -> QueryAnalysis:
+        """
+        Match every table against the query in one pass
+        Args:
+            query: User's query text
+        Returns:
+            QueryAnalysis with scored intents, entities and keywords
+        """
+        text = normalize_text(query or '')
+        tokens = [match.span() for match in TOKEN_PATTERN.finditer(text)]
+        # Positions inside a word: a match may not start there, nor (whole words) end there
+        inside = set()
+        for start, end in tokens:
+            inside.update(range(start + 1, end))
+
+        intent_scores: Dict[str, float] = {}
+        part_positions: Dict[str, List[int]] = {}
+        found: Dict[str, set] = {'sector': set(), 'age': set(), 'gender': set()}
+        scheme_names = set()
+        stopword_spans = set()
+
+        for start, end, (kind, value, whole_word) in self._automaton.iter_matches(text):
+            if start in inside or (whole_word and end in inside):
+                continue
+            if kind == 'intent':
+                intent_scores[value] = intent_scores.get(value, 0) + 1
+            elif kind == 'part':
+                part_positions.setdefault(value, []).append(start)
+            elif kind == 'scheme_name':
+                scheme_names.add(value)
+            elif kind == 'stopword':
+                stopword_spans.add((start, end))
+            else:
+                found[kind].add(value)
+
+        # Ordered multi-word cues, resolved from the recorded positions
+        for intent, parts in self._sequences:
+            position = -1
+            for part in parts:
+                later = [start for start in part_positions.get(part, ()) if start > position]
+                if not later:
+                    break
+                position = min(later)
+            else:
+                intent_scores[intent] = intent_scores.get(intent, 0) + len(parts)
+
+        total = sum(intent_scores.values())
+        intents = sorted(
+            ((intent, score / total) for intent, score in intent_scores.items()),
+            key=lambda item: (-item[1], self._intent_priority[item[0]])
+        )
+
+        return QueryAnalysis(
+            intents=intents,
+            sectors=[value for value in SECTOR_GAZETTEER if value in found['sector']],
+            age_groups=[value for value in AGE_GAZETTEER if value in found['age']],
+            genders=[value for value in GENDER_GAZETTEER if value in found['gender']],
+            keywords=self._keywords(text, tokens, scheme_names, stopword_spans)
+        )
+
+    @staticmethod
+    def _keywords(text: str, tokens: List[Tuple[int, int]], scheme_names: set, stopword_spans: set) -> List[str]:
+        for name in SCHEME_NAMES:
+            if name in scheme_names:
+                return [name]
+
+        keywords = []
+        for start, end in tokens:
+            if (start, end) in stopword_spans or end - start < MIN_KEYWORD_LENGTH:
+                continue
+            keywords.append(text[start:end])
+            if len(keywords) >= MAX_KEYWORDS:
+                break
+        return keywords
+
+
+# Global matcher instance (automaton built once at import)
+query_matcher = QueryMatcher()
@@ -0,0 +1,181 @@
+"""
+In-memory inverted index for government scheme search
+Ranks active schemes with field-weighted BM25 (BM25F) instead of regex scans
+"""
+
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Letters/digits plus Indic combining marks (Devanagari .. Sinhala, without the
+# danda punctuation) and zero-width joiners, so Kannada/Hindi words stay whole
+TOKEN_PATTERN = re.compile(r'(?:[^\W_]|[\u0900-\u0963\u0966-\u0DFF\u200c\u200d])+')
+
+# Relative importance of each scheme field when scoring
+DEFAULT_FIELD_WEIGHTS = {
+    'title': 3.0,
+    'keywords': 2.0,
+    'search_tags': 2.0,
+    'short_description': 1.5,
+    'description': 1.0,
+}
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for matching (Unicode NFC + case folding)"""
+    return unicodedata.normalize('NFC', text).casefold()
+
+
+def tokenize(text) -> List[str]:
+    """Split text (or a list of strings) into normalized word tokens"""
+    if not text:
+        return []
+    if isinstance(text, (list, tuple)):
+        text = ' '.join(str(item) for item in text if item)
+    return TOKEN_PATTERN.findall(normalize_text(str(text)))
+
+
+class SchemeSearchIndex:
+    """Inverted index over scheme documents with BM25F scoring"""
+
+    def __init__(self, field_weights: Optional[Dict[str, float]] = None, k1: float = 1.2, b: float = 0.75):
+        self.field_weights = dict(field_weights or DEFAULT_FIELD_WEIGHTS)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self):
+        # term -> {doc_id: {field: term frequency}}
+        self._postings: Dict[str, Dict[str, Dict[str, int]]] = {}
+        # doc_id -> stored document, and doc_id -> {field: token count}
+        self._documents: Dict[str, Dict] = {}
+        self._field_lengths: Dict[str, Dict[str, int]] = {}
+        self._total_field_lengths = {field: 0 for field in self.field_weights}
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __contains__(self, doc_id) -> bool:
+        return str(doc_id) in self._documents
+
+    def build(self, documents: Iterable[Dict]):
+        """Replace the index contents with the given documents"""
+        with self._lock:
+            self._clear()
+            for document in documents:
+                self._add(document)
+
+    def add_document(self, document: Dict):
+        """Add or replace a single document"""
+        with self._lock:
+            self._remove(str(document['_id']))
+            self._add(document)
+
+    def remove_document(self, doc_id) -> bool:
+        """Remove a single document, returning whether it was indexed"""
+        with self._lock:
+            return self._remove(str(doc_id))
+
+    def _add(self, document: Dict):
+        doc_id = str(document['_id'])
+        stored = dict(document)
+        stored['_id'] = doc_id
+
+        lengths = {}
+        for field in self.field_weights:
+            tokens = tokenize(document.get(field))
+            lengths[field] = len(tokens)
+            self._total_field_lengths[field] += len(tokens)
+            for token in tokens:
+                fields = self._postings.setdefault(token, {}).setdefault(doc_id, {})
+                fields[field] = fields.get(field, 0) + 1
+
+        self._documents[doc_id] = stored
+        self._field_lengths[doc_id] = lengths
+
+    def _remove(self, doc_id: str) -> bool:
+        document = self._documents.pop(doc_id, None)
+        if document is None:
+            return False
+
+        lengths = self._field_lengths.pop(doc_id)
+        for field, length in lengths.items():
+            self._total_field_lengths[field] -= length
+
+        for field in self.field_weights:
+            for token in set(tokenize(document.get(field))):
+                postings = self._postings.get(token)
+                if postings is None:
+                    continue
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[token]
+        return True
+
+    def search(self, terms: Iterable[str], limit: int = 10,
+               filter_fn: Optional[Callable[[Dict], bool]] = None) -> List[Tuple[float, Dict]]:
+        """
+        Rank documents containing any of the terms
+        Args:
+            terms: Query terms (tokenized with the same rules as the documents)
+            limit: Maximum number of results
+            filter_fn: Optional predicate a document must satisfy
+        Returns:
+            list of (score, document copy) sorted by descending score
+        """
+        query_terms = []
+        for term in terms:
+            for token in tokenize(term):
+                if token not in query_terms:
+                    query_terms.append(token)
+
+        with self._lock:
+            total_docs = len(self._documents)
+            if not total_docs or not query_terms:
+                return []
+
+            avg_lengths = {
+                field: (total / total_docs) or 1.0
+                for field, total in self._total_field_lengths.items()
+            }
+
+            scores: Dict[str, float] = {}
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+
+                doc_freq = len(postings)
+                idf = math.log(1 + (total_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+                for doc_id, field_tfs in postings.items():
+                    lengths = self._field_lengths[doc_id]
+                    # BM25F: length-normalize per field, combine with weights, then saturate
+                    weighted_tf = 0.0
+                    for field, tf in field_tfs.items():
+                        norm = 1 - self.b + self.b * lengths[field] / avg_lengths[field]
+                        weighted_tf += self.field_weights[field] * tf / norm
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * weighted_tf / (self.k1 + weighted_tf)
+
+            candidates = scores.items()
+            if filter_fn is not None:
+                candidates = [
+                    (doc_id, score) for doc_id, score in candidates
+                    if filter_fn(self._documents[doc_id])
+                ]
+
+            top = heapq.nlargest(limit, candidates, key=lambda item: item[1])
+            return [(score, dict(self._documents[doc_id])) for doc_id, score in top]
+
+    def get_stats(self) -> Dict:
+        """Get index size information"""
+        with self._lock:
+            return {
+                'documents': len(self._documents),
+                'terms': len(self._postings),
+                'field_weights': dict(self.field_weights),
+            }
@@ -91,4 +91,132 @@ class VoiceHandler {
     isSupported() {
         return !!(navigator.mediaDevices && navigator.mediaDevices.getUserMedia);
     }
-}
\ No newline at end of file
+}
+
+// Streams microphone audio to /ws/voice/ as 16 kHz PCM16 and reports partial
+// and final transcripts and the chatbot's answer as the server sends them
+class VoiceStreamClient {
+    constructor(options = {}) {
+        this.language = options.language || 'en';
+        this.onReady = options.onReady || (() => {});
+        this.onPartial = options.onPartial || (() => {});
+        this.onFinal = options.onFinal || (() => {});
+        this.onResponse = options.onResponse || (() => {});
+        this.onError = options.onError || (() => {});
+        // Called instead of onReady when the server cannot stream (WSGI, no speech model)
+        this.onUnavailable = options.onUnavailable || (() => {});
+
+        this.socket = null;
+        this.audioContext = null;
+        this.processor = null;
+        this.stream = null;
+        this.ready = false;
+    }
+
+    static isSupported() {
+        return !!(window.WebSocket && (window.AudioContext || window.webkitAudioContext) &&
+                  navigator.mediaDevices && navigator.mediaDevices.getUserMedia);
+    }
+
+    async start() {
+        const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        this.socket = new WebSocket(`${scheme}://${window.location.host}/ws/voice/?language=${encodeURIComponent(this.language)}`);
+        this.socket.binaryType = 'arraybuffer';
+
+        this.socket.onmessage = async (event) => {
+            const message = JSON.parse(event.data);
+            if (message.type === 'ready') {
+                try {
+                    await this.startMicrophone();
+                    this.ready = true;
+                    this.onReady();
+                } catch (error) {
+                    this.close();
+                    this.onError({ error: error.message });
+                }
+            } else if (message.type === 'partial') {
+                this.onPartial(message);
+            } else if (message.type === 'final') {
+                this.onFinal(message);
+            } else if (message.type === 'response') {
+                this.onResponse(message);
+            } else if (message.type === 'error' && this.ready) {
+                // Before ready the server closes right after, and onUnavailable follows
+                this.onError(message);
+            }
+        };
+        this.socket.onclose = () => {
+            if (!this.ready) {
+                this.onUnavailable();
+            }
+            this.stopMicrophone();
+        };
+    }
+
+    async startMicrophone() {
+        this.stream = await navigator.mediaDevices.getUserMedia({
+            audio: { echoCancellation: true, noiseSuppression: true, channelCount: 1 }
+        });
+        const AudioContextClass = window.AudioContext || window.webkitAudioContext;
+        this.audioContext = new AudioContextClass();
+        this.socket.send(JSON.stringify({ type: 'start', language: this.language, sample_rate: 16000 }));
+
+        const source = this.audioContext.createMediaStreamSource(this.stream);
+        this.processor = this.audioContext.createScriptProcessor(4096, 1, 1);
+        this.processor.onaudioprocess = (event) => {
+            if (this.socket.readyState === WebSocket.OPEN) {
+                this.socket.send(this.toPcm16(event.inputBuffer.getChannelData(0), this.audioContext.sampleRate));
+            }
+        };
+        source.connect(this.processor);
+        this.processor.connect(this.audioContext.destination);
+    }
+
+    // Downsample to 16 kHz (averaging) and convert to 16-bit little-endian PCM
+    toPcm16(samples, sampleRate) {
+        const ratio = sampleRate / 16000;
+        const length = Math.floor(samples.length / ratio);
+        const pcm = new DataView(new ArrayBuffer(length * 2));
+        for (let i = 0; i < length; i++) {
+            const start = Math.floor(i * ratio);
+            const end = Math.max(start + 1, Math.floor((i + 1) * ratio));
+            let sum = 0;
+            for (let j = start; j < end; j++) {
+                sum += samples[j];
+            }
+            const value = Math.max(-1, Math.min(1, sum / (end - start)));
+            pcm.setInt16(i * 2, value < 0 ? value * 0x8000 : value * 0x7FFF, true);
+        }
+        return pcm.buffer;
+    }
+
+    // Stop sending audio; the server still answers the utterance in progress
+    stop() {
+        this.stopMicrophone();
+        if (this.socket && this.socket.readyState === WebSocket.OPEN) {
+            this.socket.send(JSON.stringify({ type: 'stop' }));
+        }
+    }
+
+    stopMicrophone() {
+        if (this.processor) {
+            this.processor.disconnect();
+            this.processor = null;
+        }
+        if (this.audioContext) {
+            this.audioContext.close();
+            this.audioContext = null;
+        }
+        if (this.stream) {
+            this.stream.getTracks().forEach(track => track.stop());
+            this.stream = null;
+        }
+    }
+
+    close() {
+        this.stopMicrophone();
+        if (this.socket) {
+            this.socket.close();
+        }
+    }
+}
@@ -0,0 +1,713 @@
+"""
+Speech recognition engines
+Each engine runs Whisper on one runtime behind the same small interface, so a
+deployment picks the fastest one it has installed (STT_ENGINE setting):
+    whisper      openai-whisper on PyTorch, fp32 on CPU (weights memory-mapped and
+                 shared between processes when mmap_dir is set)
+    ctranslate2  faster-whisper on CTranslate2, int8-quantized on CPU
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .audio_decoding import SAMPLE_RATE
+from .model_registry import release_freed_memory
+
+try:
+    import torch
+    import whisper
+    from whisper.model import ModelDimensions, Whisper
+    OPENAI_WHISPER_AVAILABLE = True
+except ImportError:
+    OPENAI_WHISPER_AVAILABLE = False
+
+try:
+    import ctranslate2
+    from faster_whisper import WhisperModel
+    from faster_whisper.audio import pad_or_trim
+    from faster_whisper.tokenizer import Tokenizer
+    CTRANSLATE2_AVAILABLE = True
+except ImportError:
+    CTRANSLATE2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Whisper's encoder always sees 30 s windows
+WINDOW_SAMPLES = 30 * SAMPLE_RATE
+# Most tokens Whisper decodes for one window
+MAX_SAMPLE_LEN = 224
+
+# Whisper's own rules for a failed decode worth retrying at a higher temperature
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+# Decoding profiles, chosen per endpoint (STT_DECODING_PROFILES setting):
+#   beam_size          beam search width for the temperature 0 pass (1 = greedy)
+#   temperatures       fallback ladder; a clip is re-decoded at the next temperature while it fails
+#   best_of            samples per clip at temperatures above 0
+#   tokens_per_second  token cap per second of audio, on top of min_tokens (runaway loops stop early)
+#   time_budget        seconds a request may take; no fallback pass starts that would overrun it,
+#                      and the worker pool fails the job once it is spent
+#   condition_on_previous_text  feed each long-form window the previous window's text
+DECODING_PROFILES = {
+    'fast': {
+        'beam_size': 1, 'temperatures': (0.0,), 'best_of': 1,
+        'min_tokens': 24, 'tokens_per_second': 10, 'time_budget': 5.0,
+        'condition_on_previous_text': False,
+    },
+    'balanced': {
+        'beam_size': 1, 'temperatures': (0.0, 0.4), 'best_of': 1,
+        'min_tokens': 32, 'tokens_per_second': 12, 'time_budget': 10.0,
+        'condition_on_previous_text': False,
+    },
+    'accurate': {
+        'beam_size': 5, 'temperatures': (0.0, 0.2, 0.4, 0.6, 0.8, 1.0), 'best_of': 5,
+        'min_tokens': 48, 'tokens_per_second': 15, 'time_budget': 30.0,
+        'condition_on_previous_text': True,
+    },
+}
+DEFAULT_PROFILE = 'balanced'
+
+# A transcript dict (see transcript()) per clip, or the exception it raised
+ClipResult = Union[Dict, Exception]
+
+
+def transcript(text: str, language: str, language_probability: Optional[float],
+               avg_logprob: Optional[float], no_speech_prob: Optional[float], temperature: float = 0.0) -> Dict:
+    """
+    One clip's result from an engine
+    avg_logprob (mean token log-probability) and no_speech_prob (the model's belief that
+    the clip is silence) are Whisper's own confidence signals; None when unknown.
+    temperature is that of the decode kept (above 0 after a fallback).
+    """
+    return {
+        'text': text,
+        'language': language,
+        'language_probability': language_probability,
+        'avg_logprob': avg_logprob,
+        'no_speech_prob': no_speech_prob,
+        'temperature': temperature,
+    }
+
+
+def decoding_profile(name: Optional[str] = None) -> Dict:
+    """
+    Settings of a decoding profile (default: DEFAULT_PROFILE), with its name under 'name'
+    Raises:
+        ValueError: Unknown profile
+    """
+    name = name or DEFAULT_PROFILE
+    try:
+        return dict(DECODING_PROFILES[name], name=name)
+    except KeyError:
+        raise ValueError(f"Unknown decoding profile '{name}' (choose from {', '.join(DECODING_PROFILES)})")
+
+
+def token_cap(profile: Dict, samples: int) -> int:
+    """Most tokens worth decoding for a clip of this many samples"""
+    seconds = min(samples, WINDOW_SAMPLES) / SAMPLE_RATE
+    return min(MAX_SAMPLE_LEN, profile['min_tokens'] + math.ceil(profile['tokens_per_second'] * seconds))
+
+
+def compression_ratio(text: str) -> float:
+    """gzip ratio of the text; repetition loops compress far better than speech"""
+    data = text.encode('utf-8')
+    return len(data) / len(zlib.compress(data)) if data else 0.0
+
+
+def needs_fallback(ratio: float, avg_logprob: float, no_speech_prob: float) -> bool:
+    """Whether a decode failed Whisper's checks (silence does not count: retrying won't help)"""
+    if no_speech_prob > NO_SPEECH_THRESHOLD and avg_logprob < LOGPROB_THRESHOLD:
+        return False
+    return ratio > COMPRESSION_RATIO_THRESHOLD or avg_logprob < LOGPROB_THRESHOLD
+
+
+class FallbackLadder:
+    """
+    Walks a batch through the profile's temperatures: each pass decodes the clips left in
+    `pending` (the caller keeps only the failed ones there), and a pass that the previous
+    one says would overrun the time budget is not started
+    """
+
+    def __init__(self, profile: Dict, positions: List[int]):
+        self.profile = profile
+        self.pending = list(positions)
+        self.deadline = time.perf_counter() + profile['time_budget']
+
+    def temperatures(self):
+        last_pass = 0.0
+        for attempt, temperature in enumerate(self.profile['temperatures']):
+            if not self.pending or (attempt and time.perf_counter() + last_pass > self.deadline):
+                return
+            started = time.perf_counter()
+            yield temperature
+            last_pass = time.perf_counter() - started
+
+
+def mean_confidence(segments: List[Tuple[float, float]]) -> Tuple[Optional[float], Optional[float]]:
+    """(avg_logprob, no_speech_prob) over the (avg_logprob, no_speech_prob) of each long-form segment"""
+    if not segments:
+        return None, None
+    logprobs, no_speech = zip(*segments)
+    return float(np.mean(logprobs)), float(np.mean(no_speech))
+
+
+def pick_language(probs: Dict[str, float], supported: Iterable[str]) -> Tuple[str, float]:
+    """Most likely supported language in one clip's language probabilities"""
+    candidates = {code: probs[code] for code in supported if code in probs}
+    if not candidates:
+        return 'en', 0.0
+    language = max(candidates, key=candidates.get)
+    return language, float(candidates[language])
+
+
+class STTEngine:
+    """
+    One Whisper runtime
+    Subclasses load the model in load() and implement detect_language() and
+    transcribe_batch(); both take 16 kHz mono float32 samples.
+    """
+
+    name = None
+    # Keyword options of create_engine() this engine takes
+    options = ()
+
+    def __init__(self, model_name: str, languages: Iterable[str]):
+        """
+        Args:
+            model_name: Model size ('tiny', 'base', ...) or a local model directory
+            languages: Language codes detection may choose from
+        """
+        self.model_name = model_name
+        self.languages = list(languages)
+        self.model = None
+
+    @classmethod
+    def installed(cls) -> bool:
+        """Whether this engine's runtime can be imported"""
+        raise NotImplementedError
+
+    def load(self) -> 'STTEngine':
+        raise NotImplementedError
+
+    def warm(self):
+        """Run a dummy inference so the first real request doesn't pay for kernel setup"""
+        self.transcribe_batch([(np.zeros(SAMPLE_RATE, dtype=np.float32), 'en')], {}, decoding_profile('fast'))
+
+    def detect_language(self, audio: np.ndarray) -> Tuple[str, float]:
+        """(language code, probability) of the first 30 s of a clip"""
+        raise NotImplementedError
+
+    def transcribe_batch(self, clips: List[Tuple[np.ndarray, Optional[str]]], timings: Dict[str, float],
+                         profile: Optional[Dict] = None) -> List[ClipResult]:
+        """
+        Transcribe several clips together
+        Args:
+            clips: (samples, language or None to detect it) pairs
+            timings: Seconds per stage, added to for the whole batch
+            profile: decoding_profile() to decode with (default: DEFAULT_PROFILE)
+        Returns:
+            One ClipResult per clip, in order
+        """
+        raise NotImplementedError
+
+    def describe(self) -> Dict:
+        return {'engine': self.name, 'model': self.model_name}
+
+
+class OpenAIWhisperEngine(STTEngine):
+    """openai-whisper on PyTorch (the reference implementation)"""
+
+    name = 'whisper'
+    options = ('mmap_dir',)
+
+    def __init__(self, model_name: str, languages: Iterable[str], mmap_dir: Optional[str] = None):
+        """
+        Args:
+            model_name: Model size ('tiny', 'base', ...) or a checkpoint file
+            languages: Language codes detection may choose from
+            mmap_dir: Directory for fp32 copies of checkpoints, which are memory-mapped so every
+                process using the model shares one copy of the weights (None = private copy)
+        """
+        super().__init__(model_name, languages)
+        self.mmap_dir = mmap_dir
+        self.mapped_file = None
+        # Whisper's decoder keeps its key/value cache in hooks on the shared model, so
+        # two decodes at once on one model (request threads) would corrupt each other
+        self._lock = threading.Lock()
+
+    @classmethod
+    def installed(cls) -> bool:
+        return OPENAI_WHISPER_AVAILABLE
+
+    def load(self) -> 'OpenAIWhisperEngine':
+        if self.mmap_dir:
+            try:
+                self.model = self._load_mapped()
+                return self
+            except Exception as e:
+                logger.warning(f"Memory-mapped load of Whisper {self.model_name} failed, "
+                               f"loading a private copy: {e}")
+                self.mapped_file = None
+        self.model = whisper.load_model(self.model_name)
+        return self
+
+    def _mapped_checkpoint(self) -> str:
+        """Path of the fp32 checkpoint to map, written from the regular checkpoint on first use"""
+        if os.path.isfile(self.model_name):
+            source = os.path.abspath(self.model_name)
+            stem = f"{os.path.splitext(os.path.basename(source))[0]}-{zlib.crc32(source.encode()):08x}"
+        else:
+            source, stem = None, self.model_name
+        path = os.path.join(self.mmap_dir, f'{stem}-fp32.pt')
+        if os.path.exists(path) and (source is None or os.path.getmtime(path) >= os.path.getmtime(source)):
+            return path
+
+        # Checkpoints are fp16; converting once here keeps the mapped pages read-only afterwards
+        model = whisper.load_model(self.model_name, device='cpu')
+        state = model.state_dict()
+        buffers = {name: buffer for name, buffer in model.named_buffers() if name not in state}
+        os.makedirs(self.mmap_dir, exist_ok=True)
+        # Workers starting together may all convert; the rename keeps the file whole either way
+        partial = f'{path}.{os.getpid()}.tmp'
+        torch.save({
+            'dims': model.dims.__dict__,
+            'model_state_dict': state,
+            'buffers': {name: buffer.to_dense() for name, buffer in buffers.items()},
+            'sparse_buffers': [name for name, buffer in buffers.items() if buffer.is_sparse],
+        }, partial)
+        os.replace(partial, path)
+        logger.info(f"Wrote memory-mappable Whisper {self.model_name} weights to {path}")
+        return path
+
+    def _load_mapped(self):
+        """Build the model around weights mapped from disk instead of copied into private memory"""
+        self.mapped_file = self._mapped_checkpoint()
+        checkpoint = torch.load(self.mapped_file, map_location='cpu', mmap=True, weights_only=True)
+        # (Whisper's constructor can't run on the meta device; the weights it creates are freed below)
+        model = Whisper(ModelDimensions(**checkpoint['dims']))
+        # assign=True keeps the mapped tensors rather than copying them into the new parameters
+        model.load_state_dict(checkpoint['model_state_dict'], assign=True)
+        for name, buffer in checkpoint['buffers'].items():
+            module_name, _, buffer_name = name.rpartition('.')
+            if name in checkpoint['sparse_buffers']:
+                buffer = buffer.to_sparse()
+            model.get_submodule(module_name).register_buffer(buffer_name, buffer, persistent=False)
+        release_freed_memory()
+        return model.eval()
+
+    def describe(self) -> Dict:
+        return dict(super().describe(), mapped_weights=self.mapped_file)
+
+    def _mel(self, audio: np.ndarray):
+        """Log-mel spectrogram of the first 30 s window, as the model expects it"""
+        n_mels = getattr(self.model.dims, 'n_mels', 80)
+        return whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels=n_mels).to(self.model.device)
+
+    def detect_language(self, audio: np.ndarray) -> Tuple[str, float]:
+        with self._lock:
+            _, probs = self.model.detect_language(self._mel(audio))
+        return pick_language(probs, self.languages)
+
+    def _options(self, language: str, temperature: float, profile: Dict, sample_len: int):
+        # Beam search for the first pass, sampling for the fallback passes (as whisper.transcribe does)
+        return whisper.DecodingOptions(
+            language=language, temperature=temperature, sample_len=sample_len,
+            beam_size=profile['beam_size'] if temperature == 0 and profile['beam_size'] > 1 else None,
+            best_of=profile['best_of'] if temperature > 0 and profile['best_of'] > 1 else None,
+            fp16=False, without_timestamps=True
+        )
+
+    def transcribe_batch(self, clips, timings, profile=None):
+        """
+        The encoder runs once over the stacked mels and its output serves both
+        language detection and batched decoding (one decoder batch per language and
+        fallback pass). Clips longer than the 30 s window take Whisper's sliding-window transcribe.
+        """
+        profile = profile or decoding_profile()
+        results: List[ClipResult] = [None] * len(clips)
+        languages = [language for _, language in clips]
+        probabilities = [None] * len(clips)
+        caps = [token_cap(profile, len(audio)) for audio, _ in clips]
+
+        with self._lock:
+            window = [index for index, (audio, _) in enumerate(clips) if len(audio) <= WINDOW_SAMPLES]
+            if window:
+                started = time.perf_counter()
+                mel = torch.stack([self._mel(clips[index][0]) for index in window])
+                timings['log_mel'] = timings.get('log_mel', 0.0) + time.perf_counter() - started
+
+                started = time.perf_counter()
+                with torch.no_grad():
+                    features = self.model.embed_audio(mel)
+                timings['encoding'] = timings.get('encoding', 0.0) + time.perf_counter() - started
+
+                # detect_language and decode take the encoder output as is instead of re-encoding
+                undetected = [position for position, index in enumerate(window) if not languages[index]]
+                if undetected:
+                    started = time.perf_counter()
+                    _, probs = self.model.detect_language(features[undetected])
+                    for position, clip_probs in zip(undetected, probs):
+                        index = window[position]
+                        languages[index], probabilities[index] = pick_language(clip_probs, self.languages)
+                    timings['language_detection'] = time.perf_counter() - started
+
+                started = time.perf_counter()
+                ladder = FallbackLadder(profile, range(len(window)))
+                for temperature in ladder.temperatures():
+                    by_language = {}
+                    for position in ladder.pending:
+                        by_language.setdefault(languages[window[position]], []).append(position)
+                    if (profile['beam_size'] if temperature == 0 else profile['best_of']) > 1:
+                        # whisper.decode does not repeat the audio features per beam/sample,
+                        # so beam search and best-of sampling only work one clip at a time
+                        groups = [(language, [position]) for language, positions in by_language.items()
+                                  for position in positions]
+                    else:
+                        groups = list(by_language.items())
+                    failed = []
+                    for language, positions in groups:
+                        sample_len = max(caps[window[position]] for position in positions)
+                        decoded = whisper.decode(self.model, features[positions],
+                                                 self._options(language, temperature, profile, sample_len))
+                        for position, result in zip(positions, decoded):
+                            index = window[position]
+                            results[index] = transcript(result.text, language, probabilities[index],
+                                                        result.avg_logprob, result.no_speech_prob, temperature)
+                            if needs_fallback(result.compression_ratio, result.avg_logprob, result.no_speech_prob):
+                                failed.append(position)
+                    ladder.pending = failed
+                timings['transcription'] = timings.get('transcription', 0.0) + time.perf_counter() - started
+
+            for index, (audio, language) in enumerate(clips):
+                if results[index] is not None:
+                    continue
+                started = time.perf_counter()
+                try:
+                    if not language:
+                        _, probs = self.model.detect_language(self._mel(audio))
+                        language, probabilities[index] = pick_language(probs, self.languages)
+                    result = self.model.transcribe(
+                        audio, language=language, temperature=profile['temperatures'],
+                        condition_on_previous_text=profile['condition_on_previous_text'],
+                        beam_size=profile['beam_size'] if profile['beam_size'] > 1 else None,
+                        best_of=profile['best_of'] if profile['best_of'] > 1 else None,
+                        sample_len=caps[index], fp16=False, verbose=False
+                    )
+                    segments = result.get('segments', [])
+                    confidence = mean_confidence([(segment['avg_logprob'], segment['no_speech_prob'])
+                                                  for segment in segments])
+                    temperature = max((segment['temperature'] for segment in segments), default=0.0)
+                    results[index] = transcript(result.get('text', ''), language, probabilities[index],
+                                                *confidence, temperature)
+                except Exception as e:
+                    results[index] = e
+                timings['transcription'] = timings.get('transcription', 0.0) + time.perf_counter() - started
+        return results
+
+
+class CTranslate2Engine(STTEngine):
+    """
+    faster-whisper's CTranslate2 Whisper with quantized weights
+    The model is thread-safe, so no lock: concurrent calls queue inside CTranslate2.
+    """
+
+    name = 'ctranslate2'
+    options = ('compute_type', 'cpu_threads')
+
+    def __init__(self, model_name: str, languages: Iterable[str], compute_type: str = 'int8',
+                 cpu_threads: int = 0):
+        """
+        Args:
+            model_name: Model size (downloaded as a converted checkpoint) or a local CTranslate2 model directory
+            languages: Language codes detection may choose from
+            compute_type: CTranslate2 weight type ('int8', 'int8_float32', 'float32', ...)
+            cpu_threads: Intra-op threads (0 = CTranslate2's default)
+        """
+        super().__init__(model_name, languages)
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+
+    @classmethod
+    def installed(cls) -> bool:
+        return CTRANSLATE2_AVAILABLE
+
+    def load(self) -> 'CTranslate2Engine':
+        self.model = WhisperModel(
+            self.model_name, device='cpu', compute_type=self.compute_type, cpu_threads=self.cpu_threads
+        )
+        return self
+
+    def _features(self, clips: List[np.ndarray]) -> np.ndarray:
+        """Log-mel spectrograms of the first 30 s windows, stacked for the encoder"""
+        frames = self.model.feature_extractor.nb_max_frames
+        return np.stack([pad_or_trim(self.model.feature_extractor(audio)[:, :frames], frames) for audio in clips])
+
+    def _languages(self, encoded) -> List[Tuple[str, float]]:
+        """Detection for each clip from its encoder output"""
+        picked = []
+        for clip_probs in self.model.model.detect_language(encoded):
+            # Tokens look like '<|en|>'
+            probs = {token[2:-2]: probability for token, probability in clip_probs}
+            picked.append(pick_language(probs, self.languages))
+        return picked
+
+    def detect_language(self, audio: np.ndarray) -> Tuple[str, float]:
+        return self._languages(self.model.encode(self._features([audio])))[0]
+
+    def _generate(self, encoded, prompts: List[List[int]], temperature: float, profile: Dict, max_new_tokens: int):
+        """One decoding pass; beam search at temperature 0, best-of-n sampling above it"""
+        if temperature > 0:
+            options = {'beam_size': 1, 'sampling_topk': 0, 'sampling_temperature': temperature,
+                       'num_hypotheses': profile['best_of']}
+        else:
+            options = {'beam_size': profile['beam_size']}
+        return self.model.model.generate(
+            encoded, prompts, max_length=len(prompts[0]) + max_new_tokens,
+            suppress_blank=True, suppress_tokens=[-1], return_scores=True, return_no_speech_prob=True,
+            **options
+        )
+
+    def transcribe_batch(self, clips, timings, profile=None):
+        """
+        Like the openai-whisper engine: one encoder pass for the batch, then one
+        generate call per fallback pass (each clip's prompt carries its own language token)
+        """
+        profile = profile or decoding_profile()
+        results: List[ClipResult] = [None] * len(clips)
+        caps = [token_cap(profile, len(audio)) for audio, _ in clips]
+        window = [index for index, (audio, _) in enumerate(clips) if len(audio) <= WINDOW_SAMPLES]
+
+        if window:
+            started = time.perf_counter()
+            features = self._features([clips[index][0] for index in window])
+            timings['log_mel'] = timings.get('log_mel', 0.0) + time.perf_counter() - started
+
+            started = time.perf_counter()
+            encoded = self.model.encode(features)
+            timings['encoding'] = timings.get('encoding', 0.0) + time.perf_counter() - started
+
+            languages = [(clips[index][1], None) for index in window]
+            if not all(language for language, _ in languages):
+                started = time.perf_counter()
+                detected = self._languages(encoded)
+                languages = [given if given[0] else found for given, found in zip(languages, detected)]
+                timings['language_detection'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            tokenizers = {
+                language: Tokenizer(self.model.hf_tokenizer, self.model.model.is_multilingual,
+                                    task='transcribe', language=language)
+                for language in {language for language, _ in languages}
+            }
+            prompts = [list(tokenizers[language].sot_sequence) + [tokenizers[language].no_timestamps]
+                       for language, _ in languages]
+            ladder = FallbackLadder(profile, range(len(window)))
+            for temperature in ladder.temperatures():
+                positions = ladder.pending
+                if len(positions) < len(window):
+                    # Retry only the failed clips: copy their rows of the encoder output
+                    batch = ctranslate2.StorageView.from_array(np.ascontiguousarray(np.array(encoded)[positions]))
+                else:
+                    batch = encoded
+                max_new_tokens = max(caps[window[position]] for position in positions)
+                generated = self._generate(batch, [prompts[position] for position in positions],
+                                           temperature, profile, max_new_tokens)
+                failed = []
+                for position, result in zip(positions, generated):
+                    index = window[position]
+                    language, probability = languages[position]
+                    best = int(np.argmax(result.scores))
+                    tokens = result.sequences_ids[best]
+                    # The score is the summed log-probability divided by the length;
+                    # count the end token too, as faster-whisper does
+                    avg_logprob = result.scores[best] * len(tokens) / (len(tokens) + 1)
+                    text = tokenizers[language].decode(tokens)
+                    results[index] = transcript(text, language, probability, avg_logprob,
+                                                result.no_speech_prob, temperature)
+                    if needs_fallback(compression_ratio(text), avg_logprob, result.no_speech_prob):
+                        failed.append(position)
+                ladder.pending = failed
+            timings['transcription'] = timings.get('transcription', 0.0) + time.perf_counter() - started
+
+        for index, (audio, language) in enumerate(clips):
+            if results[index] is not None:
+                continue
+            started = time.perf_counter()
+            try:
+                probability = None
+                if not language:
+                    language, probability = self.detect_language(audio)
+                segments, _ = self.model.transcribe(
+                    audio, language=language, temperature=list(profile['temperatures']),
+                    beam_size=profile['beam_size'], best_of=profile['best_of'],
+                    condition_on_previous_text=profile['condition_on_previous_text'],
+                    max_new_tokens=caps[index], without_timestamps=True, vad_filter=False
+                )
+                segments = list(segments)
+                confidence = mean_confidence([(segment.avg_logprob, segment.no_speech_prob) for segment in segments])
+                temperature = max((segment.temperature or 0.0 for segment in segments), default=0.0)
+                results[index] = transcript(''.join(segment.text for segment in segments), language, probability,
+                                            *confidence, temperature)
+            except Exception as e:
+                results[index] = e
+            timings['transcription'] = timings.get('transcription', 0.0) + time.perf_counter() - started
+        return results
+
+    def describe(self) -> Dict:
+        return dict(super().describe(), compute_type=self.compute_type)
+
+
+class AdaptiveRouter(STTEngine):
+    """
+    A small model first, a larger one only when needed
+    Every clip goes to the small model unless it is long; a clip whose small-model
+    transcript Whisper itself is unsure of (low avg_logprob or high no_speech_prob)
+    is transcribed again by the large model. Each result says which way it went:
+        'route'          'small', 'escalated' or 'long_clip'
+        'escalation'     why it was escalated ('low_logprob', 'no_speech' or 'error'), else None
+        'latency_saved'  seconds the small model saved against the large model's recent
+                         per-clip latency, or (negative) the small pass wasted on escalation
+    """
+
+    name = 'router'
+
+    def __init__(self, small: STTEngine, large: STTEngine, min_avg_logprob: float = -1.0,
+                 max_no_speech_prob: float = 0.6, long_clip_seconds: float = 8.0):
+        """
+        Args:
+            small: Loaded engine tried first
+            large: Loaded engine for long clips and escalations
+            min_avg_logprob: Escalate below this mean token log-probability (Whisper's own fallback threshold)
+            max_no_speech_prob: Escalate above this no-speech probability (the VAD already found speech)
+            long_clip_seconds: Clips longer than this skip the small model
+        """
+        super().__init__(f'{small.model_name}->{large.model_name}', large.languages)
+        self.small = small
+        self.large = large
+        self.min_avg_logprob = min_avg_logprob
+        self.max_no_speech_prob = max_no_speech_prob
+        self.long_clip_samples = int(long_clip_seconds * SAMPLE_RATE)
+        # Moving average of the large model's seconds per clip, for latency_saved
+        self.large_clip_seconds: Optional[float] = None
+
+    @classmethod
+    def installed(cls) -> bool:
+        return True
+
+    def load(self) -> 'AdaptiveRouter':
+        return self
+
+    def warm(self):
+        self.small.warm()
+        self.large.warm()
+        # Time one warm large-model pass so latency_saved has a baseline before the first escalation
+        started = time.perf_counter()
+        silence = np.zeros(SAMPLE_RATE, dtype=np.float32)
+        self.large.transcribe_batch([(silence, 'en')], {}, decoding_profile('fast'))
+        self.large_clip_seconds = time.perf_counter() - started
+
+    def detect_language(self, audio: np.ndarray) -> Tuple[str, float]:
+        return self.small.detect_language(audio)
+
+    def _escalation(self, result: ClipResult) -> Optional[str]:
+        """Why the small model's result is not good enough, or None"""
+        if isinstance(result, Exception):
+            return 'error'
+        if result['avg_logprob'] is not None and result['avg_logprob'] < self.min_avg_logprob:
+            return 'low_logprob'
+        if result['no_speech_prob'] is not None and result['no_speech_prob'] > self.max_no_speech_prob:
+            return 'no_speech'
+        return None
+
+    def transcribe_batch(self, clips, timings, profile=None):
+        results: List[ClipResult] = [None] * len(clips)
+        routes = {}
+        small_seconds = 0.0
+
+        short = [index for index, (audio, _) in enumerate(clips) if len(audio) <= self.long_clip_samples]
+        if short:
+            started = time.perf_counter()
+            transcribed = self.small.transcribe_batch([clips[index] for index in short], timings, profile)
+            for index, result in zip(short, transcribed):
+                results[index] = result
+            small_seconds = (time.perf_counter() - started) / len(short)
+
+        for index in range(len(clips)):
+            if index not in short:
+                routes[index] = ('long_clip', None)
+            else:
+                reason = self._escalation(results[index])
+                routes[index] = ('escalated', reason) if reason else ('small', None)
+
+        large = [index for index, (route, _) in routes.items() if route != 'small']
+        if large:
+            started = time.perf_counter()
+            transcribed = self.large.transcribe_batch([clips[index] for index in large], timings, profile)
+            for index, result in zip(large, transcribed):
+                results[index] = result
+            clip_seconds = (time.perf_counter() - started) / len(large)
+            self.large_clip_seconds = (clip_seconds if self.large_clip_seconds is None
+                                       else 0.8 * self.large_clip_seconds + 0.2 * clip_seconds)
+
+        for index, (route, reason) in routes.items():
+            if isinstance(results[index], Exception):
+                continue
+            if route == 'small':
+                saved = self.large_clip_seconds - small_seconds if self.large_clip_seconds is not None else 0.0
+            elif route == 'escalated':
+                saved = -small_seconds
+            else:
+                saved = 0.0
+            model = self.small.model_name if route == 'small' else self.large.model_name
+            results[index].update(model=model, route=route, escalation=reason, latency_saved=saved)
+        return results
+
+    def describe(self) -> Dict:
+        return {'engine': self.small.name, 'small': self.small.describe(), 'large': self.large.describe()}
+
+
+# STT_ENGINE setting -> engine class
+ENGINES = {
+    OpenAIWhisperEngine.name: OpenAIWhisperEngine,
+    CTranslate2Engine.name: CTranslate2Engine,
+}
+
+
+def engine_class(name: str):
+    """
+    Engine class for a STT_ENGINE value
+    Raises:
+        ValueError: Unknown engine name
+    """
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown STT engine '{name}' (choose from {', '.join(ENGINES)})")
+
+
+def create_engine(name: str, model_name: str, languages: Iterable[str], **options) -> STTEngine:
+    """
+    Build and load an engine
+    Args:
+        name: STT_ENGINE value
+        model_name: Model size or local model directory
+        languages: Language codes detection may choose from
+        options: Engine-specific options; ones the engine does not take are ignored
+    Raises:
+        ValueError: Unknown engine name
+        ImportError: The engine's runtime is not installed
+    """
+    cls = engine_class(name)
+    if not cls.installed():
+        raise ImportError(f"STT engine '{name}' is not installed")
+    options = {key: value for key, value in options.items() if key in cls.options}
+    return cls(model_name, languages, **options).load()
@@ -0,0 +1,524 @@
+"""
+Speech recognition worker processes
+A fixed number of processes each hold one Whisper model. Web workers submit
+jobs through a bounded queue and are turned away at once when it is full,
+so a burst of voice uploads never piles up inference inside request threads.
+Jobs arriving close together are handed to a worker as one batch, which runs
+the encoder and greedy decoder over all of them at once.
+After idle_timeout without jobs the workers exit, freeing their models, and the
+next job starts them again (see model_registry for the cold-start policies).
+"""
+
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Future, TimeoutError as FutureTimeout
+from multiprocessing.connection import wait
+from typing import Dict, List, Optional
+
+from .metrics import metrics_registry
+from .model_registry import COLD_START_POLICIES, MODEL_EVICTIONS, MODEL_RELOAD_SECONDS, REJECT, WAIT
+
+logger = logging.getLogger(__name__)
+
+# Worker states reported by get_stats()
+STARTING = 'starting'
+IDLE = 'idle'
+BUSY = 'busy'
+FAILED = 'failed'
+
+STT_QUEUE_WAIT_SECONDS = metrics_registry.histogram(
+    'chatbot_stt_queue_wait_seconds', 'Time speech recognition jobs wait for a free worker'
+)
+STT_BATCH_SIZE = metrics_registry.histogram(
+    'chatbot_stt_batch_size', 'Speech recognition jobs per batch handed to a worker',
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32)
+)
+
+
+class STTQueueFull(Exception):
+    """Every worker is busy and the submission queue is full"""
+
+
+class STTUnavailable(Exception):
+    """No worker process could load the speech model"""
+
+
+class STTTimeout(Exception):
+    """A job did not finish within the job timeout"""
+
+
+class STTJobError(Exception):
+    """Transcription failed inside the worker"""
+
+
+def _worker_main(conn, settings_module: str):
+    """
+    Worker process: load and warm the model once, then transcribe batches until told to stop
+    Messages sent back: ('ready', None), ('failed', error) or ('done', [(job_id, result, error), ...])
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+    from .model_registry import model_registry
+    from .voice_processing import voice_processor
+
+    # The pool stops idle workers, which frees more than unloading the model inside one
+    model_registry.configure(idle_seconds=0)
+
+    if model_registry.get('whisper') is None:
+        conn.send(('failed', model_registry.readiness()['whisper']['error']))
+        return
+    conn.send(('ready', None))
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message is None:
+            return
+
+        try:
+            results = voice_processor.transcribe_batch_local(
+                [(audio, language, profile) for _, audio, language, profile in message]
+            )
+        except Exception as e:
+            results = [e] * len(message)
+        conn.send(('done', [
+            (job_id, None, str(result)) if isinstance(result, Exception) else (job_id, result, None)
+            for (job_id, _, _, _), result in zip(message, results)
+        ]))
+
+
+class _Worker:
+    def __init__(self, index: int, process, conn):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.state = STARTING
+        self.jobs: List['_Job'] = []
+        self.failed_at = None
+
+
+class _Job:
+    __slots__ = ('id', 'audio', 'language', 'profile', 'future', 'submitted_at', 'timeout', 'deadline',
+                 'cancel_requested')
+
+    def __init__(self, job_id: int, audio, language: Optional[str], profile: Optional[str], timeout: float):
+        self.id = job_id
+        self.audio = audio
+        self.language = language
+        self.profile = profile
+        self.future = Future()
+        self.submitted_at = time.monotonic()
+        self.timeout = timeout
+        self.deadline = self.submitted_at + timeout
+        self.cancel_requested = False
+
+
+class STTWorkerPool:
+    """Fixed-size pool of speech recognition processes behind a bounded job queue"""
+
+    def __init__(self, workers: int = 2, max_queue: int = 8, job_timeout: float = 60,
+                 batch_window: float = 0.03, max_batch: int = 8,
+                 restart_delay: float = 30, settings_module: Optional[str] = None,
+                 idle_timeout: float = 0, cold_start: str = WAIT):
+        """
+        Args:
+            workers: Worker processes (each loads its own model)
+            max_queue: Jobs allowed to wait for a free worker before submit() refuses more
+            job_timeout: Seconds from submission until a job fails (its worker is restarted)
+            batch_window: Seconds the oldest queued job waits for more to batch with it
+            max_batch: Most jobs handed to a worker at once (a full batch goes without waiting)
+            restart_delay: Seconds before a worker whose model failed to load is tried again
+            settings_module: Django settings for the workers (default: this process's)
+            idle_timeout: Seconds with no job arriving, running or finishing after which the workers exit (0 = never)
+            cold_start: For a job arriving while they are stopped: WAIT queues it until a worker
+                has loaded its model, REJECT refuses it like a full queue; both restart the workers
+        Raises:
+            ValueError: Unknown cold-start policy
+        """
+        if cold_start not in COLD_START_POLICIES:
+            raise ValueError(f"Unknown cold-start policy '{cold_start}' (choose from {', '.join(COLD_START_POLICIES)})")
+        self.size = workers
+        self.max_queue = max_queue
+        self.job_timeout = job_timeout
+        self.batch_window = batch_window
+        self.max_batch = max(1, max_batch)
+        self.restart_delay = restart_delay
+        self.idle_timeout = idle_timeout
+        self.cold_start = cold_start
+        self.settings_module = settings_module or os.environ.get('DJANGO_SETTINGS_MODULE', '')
+        # Workers start clean instead of inheriting a copy of the web process (and its threads)
+        self._context = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._workers: List[_Worker] = []
+        # Workers taken out of service under the lock, killed and replaced outside it
+        self._retired: List[_Worker] = []
+        self._ids = itertools.count(1)
+        self._dispatcher = None
+        self._pid = None
+        self._stopping = False
+        self._wake_reader = self._wake_writer = None
+        self._asleep = False
+        self._last_active_at = None
+        self._woken_at = None
+        self.last_error = None
+        self.counts = {'completed': 0, 'failed': 0, 'timeout': 0, 'rejected': 0, 'cancelled': 0}
+        self.restarts = 0
+
+    def start(self):
+        """Start the worker processes and dispatcher thread (no-op when already running in this process)"""
+        with self._lock:
+            if self._pid == os.getpid() and not self._stopping:
+                return
+            self._pid = os.getpid()
+            self._stopping = False
+            self._asleep = False
+            self._last_active_at = time.monotonic()
+            self._pending.clear()
+            self._retired = []
+            self._wake_reader, self._wake_writer = self._context.Pipe(duplex=False)
+            self._workers = [self._spawn(index) for index in range(self.size)]
+            self._dispatcher = threading.Thread(target=self._run, name='stt-dispatcher', daemon=True)
+            self._dispatcher.start()
+        logger.info(f"Started {self.size} speech recognition workers (queue {self.max_queue})")
+
+    def stop(self, timeout: float = 5):
+        """Ask the workers to exit, killing any that do not; queued jobs are cancelled"""
+        with self._lock:
+            if self._pid != os.getpid() or self._stopping:
+                return
+            self._stopping = True
+            while self._pending:
+                self._pending.popleft().future.cancel()
+        self._wake()
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout)
+        self._stop_workers(self._workers, timeout)
+
+    @staticmethod
+    def _stop_workers(workers: List[_Worker], timeout: float):
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join(1)
+            worker.conn.close()
+
+    def _wake_up(self):
+        """Start the workers again after they were stopped for idling (caller holds the lock)"""
+        logger.info(f"Restarting {self.size} speech recognition workers after idling")
+        self._asleep = False
+        self._woken_at = time.monotonic()
+        self._workers = [self._spawn(index) for index in range(self.size)]
+
+    def _sleep_if_idle(self):
+        """Stop every worker once nothing has happened for idle_timeout (dispatcher thread)"""
+        if not self.idle_timeout or self._asleep:
+            return
+        with self._lock:
+            if (self._pending or time.monotonic() - self._last_active_at < self.idle_timeout
+                    or any(worker.state in (STARTING, BUSY) for worker in self._workers)):
+                return
+            workers, self._workers = self._workers, []
+            self._asleep = True
+        logger.info(f"Stopping {len(workers)} idle speech recognition workers")
+        self._stop_workers(workers, 5)
+        MODEL_EVICTIONS.inc(model='whisper', reason='idle')
+
+    def _spawn(self, index: int) -> _Worker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, args=(child_conn, self.settings_module),
+            name=f'stt-worker-{index}', daemon=True
+        )
+        process.start()
+        child_conn.close()
+        return _Worker(index, process, parent_conn)
+
+    def _wake(self):
+        try:
+            self._wake_writer.send_bytes(b'')
+        except (AttributeError, OSError):
+            pass
+
+    def available(self) -> bool:
+        """Whether any worker is loading or has a model, or they are asleep (False once every worker failed to load)"""
+        return self._asleep or any(worker.state != FAILED for worker in self._workers)
+
+    def ready(self) -> bool:
+        """Whether at least one worker has its model loaded and warm, or they are asleep until the next job"""
+        return self._asleep or any(worker.state in (IDLE, BUSY) for worker in self._workers)
+
+    def _waiting(self) -> int:
+        """Queued jobs that no idle worker is about to pick up"""
+        idle = sum(1 for worker in self._workers if worker.state == IDLE)
+        return len(self._pending) - idle * self.max_batch
+
+    def is_full(self) -> bool:
+        """Whether submit() would be refused right now"""
+        return self._pid == os.getpid() and self._waiting() >= self.max_queue
+
+    def submit(self, audio, language: Optional[str] = None, profile: Optional[str] = None,
+               timeout: Optional[float] = None) -> Future:
+        """
+        Queue a transcription job
+        Args:
+            audio: Uploaded audio bytes, a file path, or 16 kHz mono float32 samples
+            language: Optional language code (skips detection)
+            profile: Decoding profile name (see stt_engines.DECODING_PROFILES)
+            timeout: Seconds until the job fails, if sooner than job_timeout (a request's time budget)
+        Returns:
+            Future resolving to the VoiceProcessor.transcribe_local() result
+        Raises:
+            STTQueueFull: Every worker is busy and max_queue jobs are already waiting,
+                or (REJECT cold-start policy) the workers were asleep and are starting
+            STTUnavailable: No worker could load the model
+        """
+        self.start()
+        with self._lock:
+            self._last_active_at = time.monotonic()
+            if self._asleep:
+                self._wake_up()
+                if self.cold_start == REJECT:
+                    self.counts['rejected'] += 1
+                    raise STTQueueFull('Speech recognition workers are starting')
+            if not self.available():
+                raise STTUnavailable(self.last_error or 'Speech recognition workers are not available')
+            if self._waiting() >= self.max_queue:
+                self.counts['rejected'] += 1
+                raise STTQueueFull(f"{len(self._pending)} speech recognition jobs already waiting")
+            job = _Job(next(self._ids), audio, language, profile, min(self.job_timeout, timeout or self.job_timeout))
+            self._pending.append(job)
+        self._wake()
+        return job.future
+
+    def cancel(self, future: Future) -> bool:
+        """
+        Cancel a job; a running job fails with CancelledError at once, and its
+        worker is killed and restarted when nothing else in the batch is still waiting on it
+        """
+        if future.cancel():
+            return True
+        with self._lock:
+            job = next((job for worker in self._workers for job in worker.jobs if job.future is future), None)
+            if job is None:
+                return False
+            job.cancel_requested = True
+        self._wake()
+        return True
+
+    def transcribe(self, audio, language: Optional[str] = None, profile: Optional[str] = None,
+                   timeout: Optional[float] = None) -> Dict:
+        """Submit a job and wait for its result (raises like submit(), plus STTTimeout / STTJobError)"""
+        future = self.submit(audio, language, profile, timeout)
+        timeout = min(self.job_timeout, timeout or self.job_timeout)
+        try:
+            return future.result(timeout=timeout + 1)
+        except FutureTimeout:
+            self.cancel(future)
+            raise STTTimeout(f"Speech recognition took longer than {timeout:g}s")
+
+    def _run(self):
+        """Dispatcher: hand queued jobs to idle workers and collect their results"""
+        while not self._stopping:
+            self._assign()
+            self._replace_retired()
+            conns = [self._wake_reader] + [worker.conn for worker in self._workers]
+            try:
+                ready = wait(conns, timeout=self._poll_timeout())
+            except OSError:
+                ready = []
+            for conn in ready:
+                if conn is self._wake_reader:
+                    while self._wake_reader.poll():
+                        self._wake_reader.recv_bytes()
+                    continue
+                worker = next((worker for worker in self._workers if worker.conn is conn), None)
+                if worker is None:
+                    continue
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    with self._lock:
+                        self._retire(worker, STTJobError('Speech recognition worker exited'), 'failed')
+                    continue
+                self._handle(worker, message)
+            self._expire()
+            self._replace_retired()
+            self._sleep_if_idle()
+
+    def _poll_timeout(self) -> float:
+        """Wake up when the oldest queued job's batch window closes, or every half second"""
+        with self._lock:
+            if self._pending and any(worker.state == IDLE for worker in self._workers):
+                closes = self._pending[0].submitted_at + self.batch_window
+                return min(0.5, max(0.0, closes - time.monotonic()))
+        return 0.5
+
+    def _assign(self):
+        """Hand each idle worker a batch once it is full or the oldest job's window has closed"""
+        with self._lock:
+            for worker in self._workers:
+                if worker.state != IDLE:
+                    continue
+                self._drop_cancelled()
+                if not self._pending:
+                    return
+                if (len(self._pending) < self.max_batch
+                        and time.monotonic() - self._pending[0].submitted_at < self.batch_window):
+                    return
+                batch = self._next_batch()
+                if not batch:
+                    return
+                try:
+                    worker.conn.send([(job.id, job.audio, job.language, job.profile) for job in batch])
+                except (OSError, ValueError):
+                    # Worker went away between polls: fail the batch and replace the worker
+                    worker.jobs = batch
+                    self._retire(worker, STTJobError('Speech recognition worker exited'), 'failed')
+                    continue
+                now = time.monotonic()
+                for job in batch:
+                    STT_QUEUE_WAIT_SECONDS.observe(now - job.submitted_at)
+                    job.audio = None
+                STT_BATCH_SIZE.observe(len(batch))
+                worker.jobs = batch
+                worker.state = BUSY
+
+    def _drop_cancelled(self):
+        while self._pending and self._pending[0].future.cancelled():
+            self._pending.popleft()
+            self.counts['cancelled'] += 1
+
+    def _next_batch(self) -> List[_Job]:
+        batch = []
+        while self._pending and len(batch) < self.max_batch:
+            job = self._pending.popleft()
+            if job.future.set_running_or_notify_cancel():
+                batch.append(job)
+            else:
+                self.counts['cancelled'] += 1
+        return batch
+
+    def _handle(self, worker: _Worker, message):
+        kind = message[0]
+        self._last_active_at = time.monotonic()
+        if kind == 'ready':
+            worker.state = IDLE
+            if self._woken_at is not None:
+                # Cold start after idling: the first worker back is when jobs can run again
+                MODEL_RELOAD_SECONDS.observe(time.monotonic() - self._woken_at, model='whisper')
+                self._woken_at = None
+        elif kind == 'failed':
+            worker.state = FAILED
+            worker.failed_at = time.monotonic()
+            self.last_error = message[1]
+            logger.error(f"Speech recognition worker {worker.index} could not load its model: {message[1]}")
+        elif kind == 'done':
+            jobs = {job.id: job for job in worker.jobs}
+            worker.jobs = []
+            worker.state = IDLE
+            for job_id, result, error in message[1]:
+                job = jobs.get(job_id)
+                if job is None or job.future.done():
+                    continue
+                if error is None:
+                    self.counts['completed'] += 1
+                    job.future.set_result(result)
+                else:
+                    self.counts['failed'] += 1
+                    job.future.set_exception(STTJobError(error))
+
+    def _expire(self):
+        """Time out overdue jobs, restart workers stuck on one, and retry workers that failed to load"""
+        now = time.monotonic()
+        with self._lock:
+            waiting = [job for job in self._pending if job.deadline <= now]
+            for job in waiting:
+                self._pending.remove(job)
+                if job.future.set_running_or_notify_cancel():
+                    job.future.set_exception(STTTimeout(f"No speech recognition worker free within {job.timeout:g}s"))
+                    self.counts['timeout'] += 1
+            for worker in list(self._workers):
+                if worker.state == BUSY:
+                    for job in worker.jobs:
+                        if job.future.done():
+                            continue
+                        if job.cancel_requested:
+                            job.future.set_exception(CancelledError())
+                            self.counts['cancelled'] += 1
+                        elif job.deadline <= now:
+                            logger.warning(f"Speech recognition job {job.id} timed out on worker {worker.index}")
+                            job.future.set_exception(
+                                STTTimeout(f"Speech recognition took longer than {job.timeout:g}s")
+                            )
+                            self.counts['timeout'] += 1
+                    if all(job.future.done() for job in worker.jobs):
+                        # Nobody is waiting on the batch any more: free the worker instead of letting it finish
+                        self._retire(worker)
+                elif worker.state == FAILED and now - worker.failed_at >= self.restart_delay:
+                    self._retire(worker)
+                elif worker.state != FAILED and worker not in self._retired and not worker.process.is_alive():
+                    self._retire(worker, STTJobError('Speech recognition worker exited'), 'failed')
+
+    def _retire(self, worker: _Worker, error: Optional[BaseException] = None, outcome: Optional[str] = None):
+        """
+        Fail a worker's running jobs with `error` and mark its slot as starting;
+        _replace_retired() swaps in the new process (caller holds the lock)
+        """
+        for job in worker.jobs:
+            if not job.future.done():
+                job.future.set_exception(error or STTJobError('Speech recognition worker restarted'))
+                self.counts[outcome or 'failed'] += 1
+        worker.jobs = []
+        worker.state = STARTING
+        self._retired.append(worker)
+
+    def _replace_retired(self):
+        """Kill retired workers and start fresh ones in their slots (dispatcher thread, without the lock)"""
+        while self._retired:
+            worker = self._retired.pop()
+            if worker.process.is_alive():
+                worker.process.kill()
+            worker.process.join(1)
+            worker.conn.close()
+            replacement = self._spawn(worker.index)
+            with self._lock:
+                self._workers[self._workers.index(worker)] = replacement
+                self.restarts += 1
+
+    def worker_pids(self) -> List[int]:
+        """Process ids of the current worker processes"""
+        return [worker.process.pid for worker in self._workers]
+
+    def get_stats(self) -> Dict:
+        """Get queue depth, worker states and job outcome counts"""
+        workers = {STARTING: 0, IDLE: 0, BUSY: 0, FAILED: 0}
+        for worker in self._workers:
+            workers[worker.state] += 1
+        return {
+            'running': self._pid == os.getpid() and not self._stopping,
+            'queue_depth': len(self._pending),
+            'max_queue': self.max_queue,
+            'batch_window': self.batch_window,
+            'max_batch': self.max_batch,
+            'workers': workers,
+            'jobs': dict(self.counts),
+            'restarts': self.restarts,
+            'asleep': self._asleep,
+            'last_error': self.last_error,
+        }
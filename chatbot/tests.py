@@ -1,3 +1,842 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from unittest import mock, skipUnless
+
+import numpy as np
+
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from django.urls import reverse
+
+import mongodb_adapter
+
+from .audio_store import AudioArtifactStore
+from .chat_log import DROP_OLDEST, ChatLogWriter
+from .chatbot_logic import GovernmentChatbot
+from .model_registry import EVICTED, READY, REJECT, ModelRegistry
+from .models import ChatMessage, ChatSession
+from .query_cache import QueryResultCache
+from .query_compiler import MAX_TERMS, SEARCH_TERMS_FIELD, CompiledQuery, build_search_terms, query_compiler
+from .query_matcher import query_matcher
+from .search_index import SchemeSearchIndex
+from .stt_engines import (
+    OPENAI_WHISPER_AVAILABLE, AdaptiveRouter, CTranslate2Engine, OpenAIWhisperEngine, STTEngine,
+    compression_ratio, decoding_profile, engine_class, needs_fallback, pick_language, token_cap, transcript
+)
+from .tts_cache import TTSCache
+from .vad import speech_bounds
+from .voice_stream import UtteranceSegmenter, VoiceStream
+
+
+class RequestContextIsolationTests(TestCase):
+    """One shared chatbot must keep concurrent requests' sessions and languages apart"""
+
+    THREADS = 16
+    QUERIES_PER_THREAD = 25
+
+    def setUp(self):
+        self.bot = GovernmentChatbot()
+        self.bot.query_cache = None
+
+    def test_concurrent_queries_log_to_their_own_session(self):
+        contexts = [
+            self.bot.get_context(f'stress-{index}', 'hi' if index % 2 else 'en')
+            for index in range(self.THREADS)
+        ]
+
+        recorded = []
+        recorded_lock = threading.Lock()
+        errors = []
+        barrier = threading.Barrier(self.THREADS)
+
+        def record_message(session_id, message_type, text_content, language, **fields):
+            time.sleep(0)  # let other threads run between the two log writes
+            with recorded_lock:
+                recorded.append({
+                    'session_id': session_id,
+                    'message_type': message_type,
+                    'text_content': text_content,
+                    'language': language,
+                })
+            return True
+
+        def slow_search(*args, **kwargs):
+            time.sleep(0.001)
+            return []
+
+        def worker(index):
+            context = contexts[index]
+            barrier.wait()
+            for number in range(self.QUERIES_PER_THREAD):
+                result = self.bot.process_query(
+                    f'thread {index} query {number}', context.language, context=context
+                )
+                if not result['success'] or result['language'] != context.language:
+                    errors.append((index, number, result))
+
+        with mock.patch('chatbot.chatbot_logic.chat_log_writer.log', side_effect=record_message), \
+                mock.patch.object(self.bot, '_search_schemes', side_effect=slow_search):
+            threads = [threading.Thread(target=worker, args=(index,)) for index in range(self.THREADS)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(recorded), self.THREADS * self.QUERIES_PER_THREAD * 2)
+
+        by_session = defaultdict(list)
+        for message in recorded:
+            by_session[message['session_id']].append(message)
+
+        for index, context in enumerate(contexts):
+            messages = by_session[context.session_id]
+            self.assertEqual(len(messages), self.QUERIES_PER_THREAD * 2)
+            self.assertTrue(all(message['language'] == context.language for message in messages))
+
+            user_texts = [m['text_content'] for m in messages if m['message_type'] == 'user']
+            self.assertEqual(
+                sorted(user_texts),
+                sorted(f'thread {index} query {number}' for number in range(self.QUERIES_PER_THREAD))
+            )
+
+
+class QueryPipelineRoutingTests(TestCase):
+    """Intents only run the stages they need"""
+
+    def setUp(self):
+        self.bot = GovernmentChatbot()
+        self.bot.query_cache = None
+
+    def test_greeting_and_help_skip_search(self):
+        with mock.patch.object(self.bot, '_search_schemes', return_value=[]) as search:
+            greeting = self.bot.process_query('hello', 'kn')
+            help_reply = self.bot.process_query('help', 'en')
+
+        search.assert_not_called()
+        self.assertEqual(greeting['stages'], ['static_reply'])
+        self.assertEqual(greeting['response']['text'], self.bot._get_greeting_response('kn'))
+        self.assertEqual(help_reply['response']['text'], self.bot._get_help_response('en'))
+
+    def test_search_intents_take_the_default_route(self):
+        with mock.patch.object(self.bot, '_search_schemes', return_value=[]) as search:
+            result = self.bot.process_query('schemes for farmers', 'en')
+
+        search.assert_called_once()
+        self.assertEqual(result['stages'], list(self.bot.pipeline.default_route))
+        self.assertEqual(self.bot.pipeline.describe()['routes']['greeting'], ['static_reply'])
+
+
+class QueryMatcherTests(TestCase):
+    """Intents and entities found in one pass over English, Kannada and Hindi queries"""
+
+    def test_baseline_phrasings(self):
+        self.assertEqual(query_matcher.analyze('hello').intent, 'greeting')
+        self.assertEqual(query_matcher.analyze('what is awas yojana').intent, 'get_info')
+        self.assertEqual(query_matcher.analyze('how to apply for scholarship').intent, 'application')
+        self.assertEqual(query_matcher.analyze('who can apply for pmay').keywords, ['pmay'])
+
+    def test_short_cues_match_whole_words_and_listed_inflections(self):
+        for query in ('job', 'shipping jobs'):
+            analysis = query_matcher.analyze(query)
+            self.assertEqual(analysis.intent, 'sector_specific')
+            self.assertEqual(analysis.sectors, ['employment'])
+        self.assertEqual(query_matcher.analyze('boys hostel').genders, ['male'])
+        # "hi" in "this" and "men" in "documents" are not cues
+        self.assertEqual(query_matcher.analyze('this scheme').intent, 'general_query')
+        self.assertEqual(query_matcher.analyze('documents required').genders, [])
+
+    def test_long_cues_match_plurals(self):
+        analysis = query_matcher.analyze('schemes for farmers and students')
+        self.assertEqual(analysis.intent, 'search_scheme')
+        self.assertEqual(analysis.sectors, ['agriculture', 'education', 'youth_development'])
+
+    def test_mixed_intents_are_scored(self):
+        analysis = query_matcher.analyze('eligible criteria and how to apply')
+        self.assertEqual(analysis.intent, 'application')
+        self.assertEqual([intent for intent, _ in analysis.intents], ['application', 'eligibility'])
+        self.assertAlmostEqual(sum(score for _, score in analysis.intents), 1)
+
+    def test_indic_cues(self):
+        kannada = query_matcher.analyze('ರೈತರಿಗೆ ಯೋಜನೆ')
+        self.assertEqual((kannada.intent, kannada.sectors), ('search_scheme', ['agriculture']))
+        hindi = query_matcher.analyze('किसान के लिए योजना')
+        self.assertEqual((hindi.intent, hindi.sectors), ('search_scheme', ['agriculture']))
+        self.assertNotIn('के', hindi.keywords)
+
+
+@skipUnless(mongodb_adapter.ASYNC_MONGO_AVAILABLE, 'pymongo has no AsyncMongoClient')
+class AsyncMongoClientTests(TestCase):
+    """Each event loop gets its own async client, closed when the loop shuts down"""
+
+    def test_client_per_loop_closed_with_the_loop(self):
+        adapters = []
+
+        async def use_adapter():
+            adapter = mongodb_adapter.get_async_adapter()
+            self.assertIs(mongodb_adapter.get_async_adapter(), adapter)
+            adapters.append(adapter)
+
+        asyncio.run(use_adapter())
+        asyncio.run(use_adapter())
+
+        self.assertIsNot(adapters[0].client, adapters[1].client)
+        self.assertTrue(all(adapter.client._closed for adapter in adapters))
+        self.assertEqual(len(mongodb_adapter._async_adapters), 0)
+
+
+class QueryResultCacheTests(TestCase):
+    """Bounded LRU + TTL entries, all dropped when the corpus version moves"""
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = QueryResultCache(max_entries=2)
+        for query in ('farmers', 'students'):
+            cache.set(cache.make_key(query, 'en', 'search_scheme'), {'query': query})
+
+        self.assertEqual(cache.get(cache.make_key('  Farmers!', 'en', 'search_scheme')), {'query': 'farmers'})
+        cache.set(cache.make_key('pension', 'en', 'search_scheme'), {'query': 'pension'})
+
+        self.assertIsNone(cache.get(cache.make_key('students', 'en', 'search_scheme')))
+        self.assertIsNotNone(cache.get(cache.make_key('farmers', 'en', 'search_scheme')))
+        self.assertIsNone(cache.get(cache.make_key('farmers', 'kn', 'search_scheme')))
+        self.assertEqual(cache.get_stats()['evictions'], 1)
+
+    def test_entries_expire_after_ttl(self):
+        cache = QueryResultCache(ttl_seconds=300)
+        with mock.patch('chatbot.query_cache.time.monotonic', return_value=1000.0):
+            cache.set(('farmers', 'en', 'search_scheme'), {})
+        with mock.patch('chatbot.query_cache.time.monotonic', return_value=1299.0):
+            self.assertEqual(cache.get(('farmers', 'en', 'search_scheme')), {})
+        with mock.patch('chatbot.query_cache.time.monotonic', return_value=1300.0):
+            self.assertIsNone(cache.get(('farmers', 'en', 'search_scheme')))
+        self.assertEqual(cache.get_stats()['expirations'], 1)
+
+    def test_corpus_version_change_clears_entries(self):
+        versions = [1]
+        cache = QueryResultCache(version_source=lambda: versions[0], version_check_seconds=0)
+        cache.get(('farmers', 'en', 'search_scheme'))
+        cache.set(('farmers', 'en', 'search_scheme'), {})
+
+        self.assertEqual(cache.get(('farmers', 'en', 'search_scheme')), {})
+        versions[0] = 2
+        self.assertIsNone(cache.get(('farmers', 'en', 'search_scheme')))
+        stats = cache.get_stats()
+        self.assertEqual((stats['corpus_version'], stats['invalidations']), (2, 1))
+
+
+class SchemeSearchIndexTests(TestCase):
+    """BM25F ranking over weighted scheme fields"""
+
+    def setUp(self):
+        self.index = SchemeSearchIndex()
+        self.index.build([
+            {'_id': 'described', 'title': 'Rural support', 'description': 'Loans for farmers buying seed'},
+            {'_id': 'titled', 'title': 'Farmers credit', 'description': 'Low interest loans in rural areas'},
+            {'_id': 'other', 'title': 'Student scholarship', 'description': 'Fees for college students'},
+        ] + [
+            {'_id': f'pension-{number}', 'title': f'Pension plan {number}', 'description': 'Monthly pension'}
+            for number in range(5)
+        ])
+
+    def test_title_hit_outranks_description_hit(self):
+        results = self.index.search(['farmers'])
+
+        self.assertEqual([scheme['_id'] for _, scheme in results], ['titled', 'described'])
+        self.assertGreater(results[0][0], results[1][0])
+
+    def test_limit_keeps_the_best_results(self):
+        self.assertEqual(len(self.index.search(['pension'])), 5)
+        self.assertEqual(len(self.index.search(['pension'], limit=2)), 2)
+
+    def test_empty_query_finds_nothing(self):
+        for terms in ([], [''], ['!!']):
+            self.assertEqual(self.index.search(terms), [])
+        self.assertEqual(SchemeSearchIndex().search(['farmers']), [])
+
+
+class QueryCompilerTests(TestCase):
+    """User text becomes bounded, escaped predicates on the search_terms index"""
+
+    def test_short_terms_exact_and_long_terms_prefix(self):
+        compiled = query_compiler.compile('PM  Kisan pm farmers x')
+
+        self.assertEqual(compiled.terms, ['pm', 'kisan', 'farmers'])
+        self.assertEqual(compiled.dropped, ['x'])
+        values = compiled.token_filter()[SEARCH_TERMS_FIELD]['$in']
+        self.assertEqual(values[0], 'pm')
+        self.assertEqual([value.pattern for value in values[1:]], ['^kisan', '^farmers'])
+
+    def test_user_input_is_escaped_and_bounded(self):
+        compiled = query_compiler.compile(['a.b* (c|d)', '$where'])
+        self.assertTrue(all(term.isalnum() for term in compiled.terms))
+
+        compiled = CompiledQuery(['c++', 'a.b*c'], [], False)
+        clause = compiled.regex_filter(['title'], ['keywords'])['$or']
+        self.assertEqual(clause[0], {'title': {'$regex': r'c\+\+|a\.b\*c', '$options': 'i'}})
+        self.assertEqual(clause[1], {'keywords': {'$elemMatch': {'$regex': r'c\+\+|a\.b\*c', '$options': 'i'}}})
+        self.assertEqual(compiled.token_filter()[SEARCH_TERMS_FIELD]['$in'][1].pattern, r'^a\.b\*c')
+
+        long_query = query_compiler.compile(' '.join(f'term{number}' for number in range(20)))
+        self.assertEqual(len(long_query.terms), MAX_TERMS)
+        self.assertTrue(long_query.truncated)
+
+    def test_scans_text_fields_only_while_documents_lack_search_terms(self):
+        compiled = query_compiler.compile('farmers')
+        adapter = mongodb_adapter.MongoDBAdapter(client=mock.MagicMock())
+        collection = adapter.schemes_collection = mock.MagicMock()
+        collection.find.return_value.limit.return_value = []
+
+        collection.find_one.return_value = None
+        adapter._find_compiled({'is_active': True}, compiled, ('title',), (), limit=10)
+        self.assertEqual(collection.find.call_count, 1)
+        self.assertIn(SEARCH_TERMS_FIELD, collection.find.call_args.args[0])
+
+        collection.find_one.return_value = {'_id': 'unmigrated'}
+        adapter._find_compiled({'is_active': True}, compiled, ('title',), (), limit=10)
+        scan_query = collection.find.call_args.args[0]
+        self.assertNotIn(SEARCH_TERMS_FIELD, scan_query)
+        self.assertEqual(scan_query['$and'], [compiled.regex_filter(('title',))])
+
+    def test_advanced_search_matches_benefits_once_every_document_has_search_terms(self):
+        scheme = {'_id': 1, 'is_active': True, 'title': 'Crop insurance', 'benefits': 'Premium subsidy up to 90%'}
+        scheme[SEARCH_TERMS_FIELD] = build_search_terms(scheme)
+        adapter = mongodb_adapter.MongoDBAdapter(client=mock.MagicMock())
+        collection = adapter.schemes_collection = mock.MagicMock()
+        collection.find_one.return_value = None  # fully backfilled: no scan fallback
+
+        def find(query):
+            values = query[SEARCH_TERMS_FIELD]['$in']
+            matched = any(value == term if isinstance(value, str) else value.match(term)
+                          for value in values for term in scheme[SEARCH_TERMS_FIELD])
+            cursor = mock.MagicMock()
+            cursor.limit.return_value = [dict(scheme)] if matched else []
+            return cursor
+
+        collection.find.side_effect = find
+        search = adapter._advanced_query(['subsidy'], '', '', '', 'relevance')
+        self.assertEqual([found['title'] for found in adapter._find_compiled(**search)], ['Crop insurance'])
+        self.assertEqual(collection.find.call_count, 1)
+
+
+class SchemeIndexRefreshTests(TestCase):
+    """The BM25 index follows corpus version bumps, incrementally when updated_at allows"""
+
+    class Collection:
+        """The few collection calls the index refresh makes, over a list of documents"""
+
+        def __init__(self, documents):
+            self.documents = documents
+
+        def find(self, query):
+            newer_than = query.get('updated_at', {}).get('$gt')
+            return [
+                dict(document) for document in self.documents
+                if (newer_than is None or document['updated_at'] > newer_than)
+                and (not query.get('is_active') or document['is_active'])
+            ]
+
+        def count_documents(self, query):
+            return len(self.find(query))
+
+    def make_adapter(self, documents):
+        adapter = mongodb_adapter.MongoDBAdapter(client=mock.MagicMock(), search_engine='bm25')
+        adapter.schemes_collection = self.Collection(documents)
+        self.version = 1
+        patcher = mock.patch.object(adapter, 'get_corpus_version', side_effect=lambda: self.version)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return adapter
+
+    def scheme(self, doc_id, title, hour):
+        return {'_id': doc_id, 'title': title, 'is_active': True, 'updated_at': datetime(2026, 1, 1, hour)}
+
+    @mock.patch.object(mongodb_adapter.MongoDBAdapter, '_start_index_refresher')
+    def test_refresh_follows_version_bumps(self, _):
+        documents = [self.scheme('1', 'crop insurance', 1), self.scheme('2', 'pension', 1)]
+        adapter = self.make_adapter(documents)
+        index = adapter.get_search_index()
+
+        documents[1]['title'] = 'widow pension'
+        self.assertFalse(adapter._refresh_search_index())
+        self.assertEqual(index.search(['widow']), [])
+
+        # Stamped with updated_at: applied to the same index
+        documents[1]['updated_at'] = datetime(2026, 1, 1, 2)
+        self.version = 2
+        self.assertTrue(adapter._refresh_search_index())
+        self.assertIs(adapter.get_search_index(), index)
+        self.assertEqual(index.search(['widow'])[0][1]['_id'], '2')
+
+        # Not stamped: only a rebuild can see it
+        documents[0]['title'] = 'crop loan'
+        self.version = 3
+        self.assertTrue(adapter._refresh_search_index())
+        self.assertIsNot(adapter.get_search_index(), index)
+        self.assertEqual(adapter.get_search_index().search(['loan'])[0][1]['_id'], '1')
+
+
+class VoiceBackpressureTests(TestCase):
+    """A full speech recognition queue turns voice uploads away at once"""
+
+    def test_busy_queue_returns_503_with_browser_speech_hint(self):
+        with mock.patch('chatbot.views.voice_processor.stt_busy', return_value=True), \
+                mock.patch('chatbot.views.chatbot.process_voice_query') as process:
+            response = self.client.post(reverse('voice_api'), {'language': 'en'})
+
+        process.assert_not_called()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertTrue(response.json()['use_browser_speech'])
+
+
+class MetricsAccessTests(TestCase):
+    """/metrics answers only allow-listed addresses or a bearer token"""
+
+    def test_allow_list_and_token(self):
+        url = reverse('metrics')
+        with self.settings(METRICS_ALLOWED_IPS=['127.0.0.1'], METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.7').status_code, 403)
+        with self.settings(METRICS_ALLOWED_IPS=[], METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get(url).status_code, 403)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+        with self.settings(METRICS_ALLOWED_IPS=['*'], METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.7').status_code, 200)
+
+
+class AudioFileAPITests(TestCase):
+    """Stored voice responses are served with ETags and single byte ranges"""
+
+    AUDIO = bytes(range(100))
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        store = AudioArtifactStore(directory.name)
+        patcher = mock.patch('chatbot.views.audio_store', store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.audio_id = store.save(self.AUDIO, 'mp3')
+        self.url = reverse('audio_file_api', args=[self.audio_id])
+
+    def test_full_file_and_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.AUDIO)
+        self.assertEqual(response['Content-Type'], 'audio/mpeg')
+        self.assertEqual(response['ETag'], f'"{self.audio_id}"')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, self.AUDIO[10:20])
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual((response.status_code, response.content), (206, self.AUDIO[95:]))
+
+        # A range for another version of the clip gets the whole current one
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_unsatisfiable_range_and_unknown_clip(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+        response = self.client.get(reverse('audio_file_api', args=['0' * 64]))
+        self.assertEqual(response.status_code, 404)
+
+
+class TTSCacheTests(TestCase):
+    """Speech for the same (text, language) is synthesized once and then read back"""
+
+    def test_repeated_text_reuses_the_clip_and_other_languages_do_not(self):
+        from .voice_processing import voice_processor
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with mock.patch.object(voice_processor, 'tts_cache', TTSCache(directory.name)), \
+                mock.patch.object(voice_processor, 'text_to_speech_pyttsx3',
+                                  side_effect=lambda text, language: f'{language}:{text}'.encode()) as render:
+            first = voice_processor.synthesize('Apply online', 'en', use_gtts=False)
+            again = voice_processor.synthesize('  Apply   online ', 'en', use_gtts=False)
+            # Another worker process shares the clips on disk
+            with mock.patch.object(voice_processor, 'tts_cache', TTSCache(directory.name)):
+                elsewhere = voice_processor.synthesize('Apply online', 'en', use_gtts=False)
+            hindi = voice_processor.synthesize('Apply online', 'hi', use_gtts=False)
+
+        self.assertEqual(render.call_count, 2)
+        self.assertEqual(first['cache_key'], again['cache_key'])
+        self.assertEqual((again['audio_bytes'], elsewhere['audio_bytes']), (b'en:Apply online', b'en:Apply online'))
+        self.assertNotEqual(hindi['cache_key'], first['cache_key'])
+        self.assertEqual(hindi['audio_bytes'], b'hi:Apply online')
+        self.assertEqual(sorted(os.listdir(directory.name)),
+                         sorted(f"{key}.wav" for key in (first['cache_key'], hindi['cache_key'])))
+
+
+class STTPoolProtocolTests(TestCase):
+    """Workers answer one (job id, result, error) per job, and are replaced under the pool lock"""
+
+    def test_worker_replies_once_per_job(self):
+        from multiprocessing import Pipe
+
+        from .model_registry import model_registry
+        from .stt_pool import _worker_main
+        from .voice_processing import voice_processor
+
+        def transcribe(items):
+            return [{'text': f'{language} {profile}'} if language else ValueError('unreadable clip')
+                    for _, language, profile in items]
+
+        parent, child = Pipe()
+        with mock.patch.object(model_registry, 'get', return_value=object()), \
+                mock.patch.object(model_registry, 'configure'), \
+                mock.patch.object(voice_processor, 'transcribe_batch_local', side_effect=transcribe):
+            worker = threading.Thread(target=_worker_main, args=(child, 'govt_voice_chatbot.settings'))
+            worker.start()
+            self.assertTrue(parent.poll(5))
+            self.assertEqual(parent.recv(), ('ready', None))
+            parent.send([(1, b'clip', 'en', 'fast'), (2, b'clip', None, 'balanced')])
+            self.assertTrue(parent.poll(5))
+            reply = parent.recv()
+            parent.send(None)
+            worker.join(5)
+
+        self.assertEqual(reply, ('done', [(1, {'text': 'en fast'}, None), (2, None, 'unreadable clip')]))
+
+    def test_workers_are_replaced_outside_the_pool_lock(self):
+        from .stt_pool import BUSY, FAILED, STARTING, STTTimeout, STTWorkerPool, _Job, _Worker
+
+        pool = STTWorkerPool(workers=2, restart_delay=0)
+        failed, busy = (_Worker(index, mock.Mock(), mock.Mock()) for index in range(2))
+        failed.state, failed.failed_at = FAILED, 0
+        job = _Job(1, None, 'en', None, 60)
+        job.deadline = 0  # overdue: nobody waits on the batch any more
+        busy.state, busy.jobs = BUSY, [job]
+        pool._workers = [failed, busy]
+        slots_while_spawning = []
+
+        def spawn(index):
+            # The lock is free, and the slot still holds the old worker, drained and marked starting
+            self.assertFalse(pool._lock.locked())
+            old = pool._workers[index]
+            slots_while_spawning.append((old.state, old.jobs))
+            return _Worker(index, mock.Mock(), mock.Mock())
+
+        with mock.patch.object(pool, '_spawn', side_effect=spawn):
+            pool._expire()
+            self.assertIsInstance(job.future.exception(), STTTimeout)
+            self.assertEqual(pool._workers, [failed, busy])
+            pool._replace_retired()
+
+        self.assertEqual(slots_while_spawning, [(STARTING, []), (STARTING, [])])
+        self.assertEqual([worker.index for worker in pool._workers], [0, 1])
+        self.assertNotIn(failed, pool._workers)
+        self.assertNotIn(busy, pool._workers)
+        self.assertEqual((pool.restarts, pool._retired), (2, []))
+        failed.process.kill.assert_called_once()
+        busy.conn.close.assert_called_once()
+
+
+SAMPLE_RATE = 16000
+
+
+def tone(seconds, amplitude):
+    """A 200 Hz tone: loud ones stand in for speech, very quiet ones for silence"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 200 * t)).astype(np.float32)
+
+
+class UtteranceSegmenterTests(TestCase):
+    """The streaming VAD cuts speech into utterances at pauses; bad client settings are refused"""
+
+    def test_pause_ends_utterance_with_partials_on_the_way(self):
+        segmenter = UtteranceSegmenter(end_silence_ms=600, partial_interval_ms=1000)
+        stream = np.concatenate([
+            tone(1, 0.001), tone(2.5, 0.3), tone(1, 0.001), tone(1, 0.3), tone(0.3, 0.001)
+        ])
+
+        events = []
+        for start in range(0, len(stream), 1600):
+            events.extend(kind for kind, _ in segmenter.feed(stream[start:start + 1600]))
+
+        self.assertEqual(events, ['partial', 'partial', 'final'])
+        self.assertTrue(segmenter.in_speech)
+        final = segmenter.flush()
+        # The second burst plus 240 ms of padding either side
+        self.assertAlmostEqual(len(final) / SAMPLE_RATE, 1.5, delta=0.1)
+        self.assertIsNone(segmenter.flush())
+
+    def test_bad_sample_rate_is_reported_and_the_current_rate_kept(self):
+        sent = []
+
+        async def send(message):
+            sent.append(json.loads(message['text']))
+
+        async def control_messages():
+            stream = VoiceStream(send, context=None)
+            await stream.control({'type': 'start', 'sample_rate': 48000})
+            for sample_rate in ('fast', 0, -16000, 10 ** 6, None):
+                await stream.control({'type': 'start', 'sample_rate': sample_rate})
+            stream.feed(np.zeros(480, dtype='<i2').tobytes())
+            stream.close()
+            return stream.sample_rate
+
+        self.assertEqual(asyncio.run(control_messages()), 48000)
+        self.assertEqual([message['type'] for message in sent], ['error'] * 5)
+
+
+class SilenceTrimmingTests(TestCase):
+    """Only the speech part of a clip reaches Whisper"""
+
+    def test_speech_bounds_cut_leading_and_trailing_silence(self):
+        clip = np.concatenate([tone(1, 0.001), tone(1, 0.3), tone(2, 0.001)])
+        start, end = speech_bounds(clip)
+
+        self.assertAlmostEqual(start / SAMPLE_RATE, 0.76, delta=0.05)
+        self.assertAlmostEqual(end / SAMPLE_RATE, 2.24, delta=0.05)
+        self.assertIsNone(speech_bounds(tone(3, 0.001)))
+        # A click is not speech
+        self.assertIsNone(speech_bounds(np.concatenate([tone(1, 0.001), tone(0.03, 0.5), tone(1, 0.001)])))
+
+    def test_speech_too_long_asks_for_a_shorter_question(self):
+        from .voice_processing import voice_processor
+
+        with self.settings(VOICE_MAX_SPEECH_SECONDS=2), \
+                mock.patch.object(voice_processor, 'stt_available', return_value=True), \
+                mock.patch.object(voice_processor, 'stt_pool', None), \
+                mock.patch.object(type(voice_processor), 'stt_engine', mock.Mock()), \
+                mock.patch.object(voice_processor, 'transcribe_local') as transcribe:
+            result = voice_processor.process_voice_input(tone(3, 0.3))
+            with mock.patch('chatbot.views.voice_processor.stt_busy', return_value=False), \
+                    mock.patch('chatbot.views.chatbot.process_voice_query',
+                               return_value=GovernmentChatbot()._voice_failure(result['error'], '', too_long=True)):
+                response = self.client.post(reverse('voice_api'), {'audio': SimpleUploadedFile('q.wav', b'clip')})
+
+        transcribe.assert_not_called()
+        self.assertTrue(result['too_long'])
+        self.assertIn('under 2 seconds', result['error'])
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json()['bot'], result['error'])
+
+
+class STTEngineTests(TestCase):
+    """Engine selection and the language choice shared by every engine"""
+
+    def test_unknown_engine_is_rejected(self):
+        self.assertIs(engine_class('ctranslate2'), CTranslate2Engine)
+        with self.assertRaises(ValueError):
+            engine_class('wav2vec')
+
+    def test_detection_only_picks_supported_languages(self):
+        probs = {'ha': 0.7, 'hi': 0.2, 'kn': 0.1}
+        self.assertEqual(pick_language(probs, ['en', 'hi', 'kn']), ('hi', 0.2))
+        self.assertEqual(pick_language({'ha': 1.0}, ['en', 'hi']), ('en', 0.0))
+
+
+@skipUnless(OPENAI_WHISPER_AVAILABLE, 'openai-whisper is not installed')
+class MappedWeightsTests(TestCase):
+    """A memory-mapped model holds the same weights as one loaded into private memory"""
+
+    def test_mapped_model_matches_private_copy(self):
+        import torch
+        from whisper.model import ModelDimensions, Whisper
+
+        dims = ModelDimensions(80, 1500, 64, 2, 1, 51865, 448, 64, 2, 1)
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = os.path.join(directory, 'small.pt')
+            torch.save({'dims': dims.__dict__, 'model_state_dict': Whisper(dims).half().state_dict()}, checkpoint)
+            private = OpenAIWhisperEngine(checkpoint, ['en']).load()
+            mapped = OpenAIWhisperEngine(checkpoint, ['en'], mmap_dir=os.path.join(directory, 'mmap')).load()
+
+            self.assertTrue(os.path.isfile(mapped.describe()['mapped_weights']))
+            expected = private.model.state_dict()
+            for name, tensor in mapped.model.state_dict().items():
+                self.assertTrue(torch.equal(tensor, expected[name]), name)
+            # Buffers outside the state dict are rebuilt too
+            self.assertTrue(torch.equal(private.model.decoder.mask, mapped.model.decoder.mask))
+            self.assertTrue(mapped.model.alignment_heads.is_sparse)
+
+
+class DecodingProfileTests(TestCase):
+    """Profiles bound how much decoding one clip can cost"""
+
+    def test_token_cap_follows_clip_length(self):
+        fast = decoding_profile('fast')
+        self.assertEqual(token_cap(fast, 3 * SAMPLE_RATE), 24 + 30)
+        self.assertEqual(token_cap(fast, 120 * SAMPLE_RATE), 224)
+        with self.assertRaises(ValueError):
+            decoding_profile('turbo')
+
+    def test_only_failed_decodes_fall_back(self):
+        looping = ' the scheme' * 40
+        self.assertTrue(needs_fallback(compression_ratio(looping), -0.3, 0.1))
+        self.assertTrue(needs_fallback(1.2, -1.6, 0.1))
+        # Silence: a retry would not find speech either
+        self.assertFalse(needs_fallback(1.2, -1.6, 0.9))
+        self.assertFalse(needs_fallback(compression_ratio('Which schemes help farmers in Karnataka?'), -0.3, 0.1))
+
+
+class AdaptiveRouterTests(TestCase):
+    """Short confident clips stay on the small model; the rest go to the large one"""
+
+    class ScriptedEngine(STTEngine):
+        """Answers every clip with the same confidence"""
+
+        def __init__(self, model_name, avg_logprob):
+            super().__init__(model_name, ['en'])
+            self.avg_logprob = avg_logprob
+            self.seen = 0
+
+        def transcribe_batch(self, clips, timings, profile=None):
+            self.seen += len(clips)
+            return [transcript(self.model_name, 'en', None, self.avg_logprob, 0.1) for _ in clips]
+
+    def test_escalates_unsure_and_long_clips(self):
+        unsure = self.ScriptedEngine('tiny', avg_logprob=-1.5)
+        large = self.ScriptedEngine('base', avg_logprob=-0.2)
+        router = AdaptiveRouter(unsure, large, long_clip_seconds=8)
+        router.large_clip_seconds = 2.0
+
+        results = router.transcribe_batch([(tone(3, 0.3), 'en'), (tone(12, 0.3), 'en')], {})
+
+        self.assertEqual([result['route'] for result in results], ['escalated', 'long_clip'])
+        self.assertEqual(results[0]['escalation'], 'low_logprob')
+        self.assertEqual([result['text'] for result in results], ['base', 'base'])
+        self.assertLessEqual(results[0]['latency_saved'], 0)
+        self.assertEqual((unsure.seen, large.seen), (1, 2))
+
+        confident = AdaptiveRouter(self.ScriptedEngine('tiny', avg_logprob=-0.3), large)
+        confident.large_clip_seconds = 2.0
+        result = confident.transcribe_batch([(tone(3, 0.3), 'en')], {})[0]
+        self.assertEqual((result['route'], result['text']), ('small', 'tiny'))
+        self.assertGreater(result['latency_saved'], 0)
+
+    def test_small_model_kept_only_within_the_model_memory_budget(self):
+        from . import voice_processing
+
+        large = self.ScriptedEngine('base', avg_logprob=-0.2)
+        for budget, routed in ((100, False), (200, True), (0, True)):
+            # 300 MB before loading, 400 MB with the large model, 460 MB with both
+            with mock.patch.object(voice_processing.model_registry, 'memory_budget_mb', budget), \
+                    mock.patch.object(voice_processing, 'resident_memory_mb', side_effect=[400, 460]), \
+                    mock.patch.object(voice_processing, 'create_engine',
+                                      return_value=self.ScriptedEngine('tiny', avg_logprob=-0.2)):
+                engine = voice_processing._add_small_model(large, 'tiny', {}, 300)
+            self.assertEqual(isinstance(engine, AdaptiveRouter), routed, budget)
+
+
+class ModelLifecycleTests(TestCase):
+    """Idle models are unloaded and come back on demand; the budget unloads the least recently used"""
+
+    def make_registry(self, **policy):
+        registry = ModelRegistry(**policy)
+        self.loads = defaultdict(int)
+        for name, size in (('whisper', 300), ('pyttsx3', 50)):
+            registry.register(name, lambda name=name: self.loads.update({name: self.loads[name] + 1}) or name,
+                              memory_mb=lambda model, size=size: size)
+        return registry
+
+    def test_idle_model_is_unloaded_and_reloaded(self):
+        registry = self.make_registry(idle_seconds=600)
+        self.assertEqual(registry.get('whisper'), 'whisper')
+        self.assertEqual(registry.evict_idle(time.monotonic() + 60), 0)
+        self.assertEqual(registry.evict_idle(time.monotonic() + 601), 1)
+        self.assertEqual(registry.readiness()['whisper']['state'], EVICTED)
+
+        self.assertEqual(registry.get('whisper'), 'whisper')
+        self.assertEqual(self.loads['whisper'], 2)
+
+    def test_reject_policy_reloads_in_background(self):
+        registry = self.make_registry(idle_seconds=600, cold_start=REJECT)
+        registry.get('whisper')
+        registry.evict_idle(time.monotonic() + 601)
+
+        self.assertIsNone(registry.get('whisper'))
+        registry._entries['whisper']['reloader'].join(5)
+        self.assertEqual(registry.readiness()['whisper']['state'], READY)
+        self.assertEqual(registry.get('whisper'), 'whisper')
+
+    def test_budget_unloads_least_recently_used(self):
+        registry = self.make_registry(memory_budget_mb=320)
+        registry.get('whisper')
+        registry.get('pyttsx3')
+        readiness = registry.readiness()
+        self.assertEqual(readiness['whisper']['state'], EVICTED)
+        self.assertEqual(readiness['pyttsx3']['resident_mb'], 50)
+
+    def test_unload_racing_get_does_not_hand_out_none(self):
+        registry = self.make_registry(idle_seconds=600)
+        registry.get('whisper')
+
+        class ReapedOnModelRead(dict):
+            """The reaper unloads the model the first time get() reaches for it"""
+            reaped = False
+
+            def __getitem__(self, key):
+                if key == 'model' and not self.reaped:
+                    self.reaped = True
+                    with self['lock']:
+                        registry._unload('whisper', self, 'idle')
+                return super().__getitem__(key)
+
+        registry._entries['whisper'] = ReapedOnModelRead(registry._entries['whisper'])
+
+        self.assertEqual(registry.get('whisper'), 'whisper')
+        self.assertEqual(self.loads['whisper'], 2)
+
+
+class ChatLogWriterTests(TestCase):
+    """Queued chat messages are written in batches; overflow is counted, not raised"""
+
+    def make_writer(self, **kwargs):
+        writer = ChatLogWriter(**kwargs)
+        # Flush on the test thread instead of the background writer
+        patcher = mock.patch.object(writer, '_ensure_started')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return writer
+
+    def test_flush_creates_sessions_and_keeps_order(self):
+        ChatSession.objects.create(session_id='existing', language='en')
+        writer = self.make_writer()
+
+        writer.log('existing', 'user', 'first', 'en')
+        writer.log('new-session', 'user', 'hello', 'kn')
+        writer.log('existing', 'bot', 'second', 'en', related_schemes=['1'], confidence_score=0.8)
+
+        self.assertEqual(ChatMessage.objects.count(), 0)
+        self.assertEqual(writer.flush(), 3)
+
+        self.assertEqual(ChatSession.objects.get(session_id='new-session').language, 'kn')
+        texts = list(
+            ChatMessage.objects.filter(session__session_id='existing')
+            .order_by('timestamp', 'id').values_list('text_content', flat=True)
+        )
+        self.assertEqual(texts, ['first', 'second'])
+
+        stats = writer.get_stats()
+        self.assertEqual((stats['enqueued'], stats['written'], stats['batches']), (3, 3, 1))
+
+    def test_overflow_policies(self):
+        newest = self.make_writer(max_queue_size=2)
+        oldest = self.make_writer(max_queue_size=2, overflow_policy=DROP_OLDEST)
+
+        for writer in (newest, oldest):
+            for text in ('a', 'b', 'c'):
+                writer.log('overflow', 'user', text, 'en')
+            self.assertEqual(writer.get_stats()['dropped'], 1)
 
-# Create your tests here.
+        self.assertEqual([m['text_content'] for m in newest._drain()], ['a', 'b'])
+        self.assertEqual([m['text_content'] for m in oldest._drain()], ['b', 'c'])
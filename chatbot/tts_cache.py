@@ -0,0 +1,246 @@
+"""
+Content-addressed cache for synthesized speech
+Keeps recent clips in memory, spills them to a size-bounded disk LRU and
+coalesces concurrent synthesis of the same text
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_tts_text(text: str) -> str:
+    """Normalize text before hashing (Unicode form and whitespace only, wording is kept)"""
+    return " ".join(unicodedata.normalize('NFC', text or '').split())
+
+
+class TTSCache:
+    """Thread-safe memory + disk LRU of synthesized audio, keyed by content hash"""
+
+    def __init__(self, directory: Optional[str] = None, max_memory_bytes: int = 32 * 1024 * 1024,
+                 max_disk_bytes: int = 256 * 1024 * 1024, wait_timeout: float = 30):
+        self.directory = str(directory) if directory else None
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        # How long a coalesced request waits for the synthesis it joined
+        self.wait_timeout = wait_timeout
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._in_flight: Dict[str, Future] = {}
+        self._disk_bytes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                self._disk_bytes = sum(size for _, _, size in self._disk_files())
+            except OSError as e:
+                logger.warning(f"TTS disk cache disabled ({self.directory}): {e}")
+                self.directory = None
+
+    @staticmethod
+    def make_key(text: str, language: str, engine: str, params: Optional[Dict] = None) -> str:
+        """Content address of a clip: hash of (normalized text, language, engine, voice params)"""
+        payload = json.dumps(
+            [normalize_tts_text(text), language, engine, params or {}],
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key: str, audio_format: str) -> str:
+        return os.path.join(self.directory, f"{key}.{audio_format}")
+
+    def _disk_files(self):
+        """(path, mtime, size) of every cached clip on disk"""
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                yield entry.path, stat.st_mtime, stat.st_size
+
+    def _remember(self, key: str, audio_data: bytes, audio_format: str):
+        """Put a clip in the memory tier (caller holds the lock)"""
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous[0])
+        self._memory[key] = (audio_data, audio_format)
+        self._memory_bytes += len(audio_data)
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.evictions += 1
+
+    def _read_disk(self, key: str) -> Optional[Tuple[bytes, str]]:
+        if not self.directory:
+            return None
+        for audio_format in ('mp3', 'wav'):
+            path = self._disk_path(key, audio_format)
+            try:
+                with open(path, 'rb') as f:
+                    audio_data = f.read()
+                os.utime(path)  # mtime doubles as the LRU clock shared by all workers
+                return audio_data, audio_format
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.warning(f"Could not read cached audio {path}: {e}")
+        return None
+
+    def _write_disk(self, key: str, audio_data: bytes, audio_format: str):
+        if not self.directory:
+            return
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.', suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(audio_data)
+            os.replace(temp_path, self._disk_path(key, audio_format))
+        except OSError as e:
+            logger.warning(f"Could not write cached audio for {key}: {e}")
+            return
+
+        with self._lock:
+            self._disk_bytes += len(audio_data)
+            over_budget = self._disk_bytes > self.max_disk_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Delete the least recently used clips until the directory fits its budget"""
+        try:
+            files = sorted(self._disk_files(), key=lambda item: item[1])
+        except OSError as e:
+            logger.warning(f"Could not scan TTS disk cache: {e}")
+            return
+
+        total = sum(size for _, _, size in files)
+        evicted = 0
+        for path, _, size in files:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass  # another worker got there first
+            total -= size
+            evicted += 1
+
+        with self._lock:
+            self._disk_bytes = total
+            self.disk_evictions += evicted
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """Get (audio bytes, format) from memory or disk, or None on a miss"""
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return cached
+
+        cached = self._read_disk(key)
+        with self._lock:
+            if cached is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, *cached)
+        return cached
+
+    def set(self, key: str, audio_data: bytes, audio_format: str):
+        """Store a clip in both tiers"""
+        with self._lock:
+            self._remember(key, audio_data, audio_format)
+        self._write_disk(key, audio_data, audio_format)
+
+    def get_or_create(self, key: str, audio_format: str,
+                      synthesize: Callable[[], Optional[bytes]]) -> Optional[Tuple[bytes, str]]:
+        """
+        Get a clip, synthesizing it on a miss. Concurrent callers asking for
+        the same key wait for a single synthesis instead of repeating it.
+        Args:
+            key: Key from make_key
+            audio_format: Format synthesize produces ('mp3' or 'wav')
+            synthesize: Callable returning audio bytes, or None on failure (not cached)
+        Returns:
+            (audio bytes, format) or None
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result(timeout=self.wait_timeout)
+
+        try:
+            audio_data = synthesize()
+            result = (audio_data, audio_format) if audio_data else None
+            if result is not None:
+                self.set(key, audio_data, audio_format)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def clear(self):
+        """Drop the memory tier and every clip on disk"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        if self.directory:
+            for path, _, _ in list(self._disk_files()):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            with self._lock:
+                self._disk_bytes = 0
+
+    def get_stats(self) -> Dict:
+        """Get cache counters"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'max_memory_bytes': self.max_memory_bytes,
+                'disk_directory': self.directory,
+                'disk_bytes': self._disk_bytes,
+                'max_disk_bytes': self.max_disk_bytes,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._in_flight),
+                'evictions': self.evictions,
+                'disk_evictions': self.disk_evictions,
+            }
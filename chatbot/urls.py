@@ -1,21 +1,31 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Chat, search and voice endpoints: native async views under ASGI, sync ones under WSGI
+if settings.ASYNC_VIEWS:
+    from . import async_views as chat_views
+else:
+    chat_views = views
+
 urlpatterns = [
     # Main interface
     path('', views.home, name='home'),
     
     # Voice and text chat endpoints
-    path('voice/', views.voice_api, name='voice_api'),
-    path('api/chat/text/', views.text_chat_api, name='text_chat_api'),
-    path('api/chat/voice/', views.voice_api, name='voice_chat_api'),
+    path('voice/', chat_views.voice_api, name='voice_api'),
+    path('api/chat/text/', chat_views.text_chat_api, name='text_chat_api'),
+    path('api/chat/voice/', chat_views.voice_api, name='voice_chat_api'),
+    path('api/health/voice/', views.voice_readiness_api, name='voice_readiness_api'),
+    path('metrics', views.metrics_api, name='metrics'),
+    path('api/audio/<str:audio_id>/', views.audio_file_api, name='audio_file_api'),
     
     # Chat history
     path('api/chat/history/<str:session_id>/', views.chat_history_api, name='chat_history_api'),
     
     # Scheme search and information
-    path('api/schemes/search/', views.scheme_search_api, name='scheme_search_api'),
-    path('api/chat/advanced-search/', views.advanced_search_api, name='advanced_search_api'),
+    path('api/schemes/search/', chat_views.scheme_search_api, name='scheme_search_api'),
+    path('api/chat/advanced-search/', chat_views.advanced_search_api, name='advanced_search_api'),
     path('api/schemes/languages/', views.supported_languages_api, name='supported_languages_api'),
     path('api/schemes/sectors/', views.available_sectors_api, name='available_sectors_api'),
 ]
\ No newline at end of file
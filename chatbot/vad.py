@@ -0,0 +1,104 @@
+"""
+Energy-based voice activity detection
+Splits 16 kHz mono float32 audio into short frames and marks each as speech
+or silence by comparing its level against an adaptive noise floor
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .audio_decoding import SAMPLE_RATE
+
+# Below this a frame is never speech, however quiet the background is
+DEFAULT_THRESHOLD_DB = -45.0
+# A frame must be this far above the background noise floor to count as speech
+DEFAULT_MARGIN_DB = 12.0
+
+
+def frame_levels(samples: np.ndarray, frame_samples: int) -> np.ndarray:
+    """RMS level in dBFS of each whole frame (a trailing partial frame is ignored)"""
+    count = len(samples) // frame_samples
+    if count == 0:
+        return np.empty(0, dtype=np.float32)
+    frames = samples[:count * frame_samples].reshape(count, frame_samples)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+class EnergyVAD:
+    """
+    Per-frame speech/silence decisions
+    The noise floor follows quiet frames down at once and creeps up slowly, so
+    steady background noise (fans, traffic) stops counting as speech after a
+    few seconds while the gaps between words keep it from rising during speech.
+    """
+
+    def __init__(self, threshold_db: float = DEFAULT_THRESHOLD_DB, margin_db: float = DEFAULT_MARGIN_DB,
+                 frame_ms: int = 30, sample_rate: int = SAMPLE_RATE, floor_rise: float = 0.01):
+        """
+        Args:
+            threshold_db: Absolute level a speech frame must exceed
+            margin_db: How far above the noise floor a speech frame must be
+            frame_ms: Frame length
+            sample_rate: Sample rate of the audio fed in
+            floor_rise: Fraction of the gap the noise floor closes per louder frame
+        """
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.frame_ms = frame_ms
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.floor_rise = floor_rise
+        self.noise_floor_db: Optional[float] = None
+
+    def reset(self):
+        self.noise_floor_db = None
+
+    def speech_frames(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Speech decision for each whole frame of `samples`
+        Consecutive calls continue the same stream (the noise floor carries over),
+        so callers feeding live audio should pass whole frames.
+        """
+        levels = frame_levels(samples, self.frame_samples)
+        decisions = np.empty(len(levels), dtype=bool)
+        floor = self.noise_floor_db
+        for index, level in enumerate(levels):
+            if floor is None:
+                # Until there is a background to measure, assume one just below the threshold
+                floor = min(level, self.threshold_db - self.margin_db)
+            elif level < floor:
+                floor = level
+            else:
+                floor += self.floor_rise * (level - floor)
+            decisions[index] = level > max(self.threshold_db, floor + self.margin_db)
+        self.noise_floor_db = floor
+        return decisions
+
+
+def speech_bounds(samples: np.ndarray, vad: Optional[EnergyVAD] = None, min_speech_ms: int = 90,
+                  padding_ms: int = 240) -> Optional[Tuple[int, int]]:
+    """
+    Sample range from the start of the first run of speech to the end of the last, padded
+    Pauses inside the range are kept; only leading and trailing silence falls outside it.
+    Args:
+        samples: A whole clip
+        vad: Frame classifier (default: a fresh EnergyVAD)
+        min_speech_ms: Shortest run of speech frames that counts (clicks and pops are shorter)
+        padding_ms: Audio kept around the speech so word edges are not clipped
+    Returns:
+        (start, end) sample indices, or None when the clip has no speech
+    """
+    vad = vad or EnergyVAD()
+    decisions = vad.speech_frames(samples).astype(np.int8)
+    edges = np.diff(np.concatenate(([0], decisions, [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    words = ends - starts >= max(1, min_speech_ms // vad.frame_ms)
+    if not words.any():
+        return None
+
+    padding = padding_ms // vad.frame_ms
+    first = max(0, starts[words][0] - padding)
+    last = ends[words][-1] + padding
+    return first * vad.frame_samples, min(len(samples), last * vad.frame_samples)
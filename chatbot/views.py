@@ -3,13 +3,15 @@ Views for the Government Voice Chatbot
 Integrates chatbot logic, voice processing, and MongoDB adapter
 """
 
+import hmac
 import json
+import re
 import uuid
-import tempfile
-import os
 import logging
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, JsonResponse
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.core.files.storage import default_storage
@@ -20,25 +22,65 @@ from rest_framework import status
 
 # Import our sophisticated backend modules
 from .chatbot_logic import chatbot
-from .voice_processing import VoiceProcessor
+from .audio_store import audio_store
+from .chat_log import chat_log_writer
+from .metrics import metrics_registry
+from .model_registry import model_registry
+from .voice_processing import BUSY_MESSAGE, MAX_AUDIO_BYTES, voice_processor
 from .models import ChatSession, ChatMessage
 
 logger = logging.getLogger(__name__)
 
-# Initialize voice processor
-try:
-    voice_processor = VoiceProcessor()
-    logger.info("Voice processor initialized successfully")
-except Exception as e:
-    logger.warning(f"Voice processor initialization failed: {e}")
-    voice_processor = None
-
 
 def home(request):
     """Render the main chatbot interface"""
     return render(request, 'home.html')
 
 
+def voice_readiness_api(request):
+    """
+    Readiness probe for voice traffic
+    Returns 200 only once the speech models are loaded and warm in this worker,
+    so the load balancer can keep voice requests away from cold workers; models
+    unloaded after idling still count, since the next voice request reloads them
+    """
+    models = model_registry.readiness()
+    ready = voice_processor.stt_ready()
+    return JsonResponse({
+        'ready': ready,
+        'models': models,
+        'stt_engine': settings.STT_ENGINE,
+        'stt_pool': voice_processor.stt_pool.get_stats() if voice_processor.stt_pool is not None else None
+    }, status=200 if ready else 503)
+
+
+@require_http_methods(["GET"])
+def metrics_api(request):
+    """
+    Prometheus scrape endpoint: stage latency histograms, cache, queue,
+    MongoDB and model metrics of this worker process
+    """
+    if not settings.METRICS_ENABLED:
+        return JsonResponse({'success': False, 'error': 'Metrics are disabled'}, status=404)
+    if not _metrics_client_allowed(request):
+        return JsonResponse({'success': False, 'error': 'Forbidden'}, status=403)
+    
+    # Make sure every module that registers collectors has been imported
+    import mongodb_adapter  # noqa: F401
+    
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _metrics_client_allowed(request) -> bool:
+    """Whether the scraper's address is in METRICS_ALLOWED_IPS or it sent METRICS_TOKEN"""
+    allowed_ips = settings.METRICS_ALLOWED_IPS
+    if '*' in allowed_ips or request.META.get('REMOTE_ADDR') in allowed_ips:
+        return True
+    token = settings.METRICS_TOKEN
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(credentials.strip().encode(), token.encode())
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def voice_api(request):
@@ -47,55 +89,48 @@ def voice_api(request):
     This endpoint processes voice input and returns both text and audio responses
     """
     try:
+        # Turn the upload away before parsing it when recognition cannot take another job
+        if voice_processor.stt_busy():
+            return _voice_busy_response()
+        
         # Generate or get session ID
         session_id = request.session.get('session_id')
         if not session_id:
             session_id = str(uuid.uuid4())
             request.session['session_id'] = session_id
         
-        # Set chatbot session
-        chatbot.set_session(session_id)
-        
         # Get language preference (default to English)
         language = request.POST.get('language', 'en')
-        chatbot.set_language(language)
+        
+        # Session and language for this request only
+        context = chatbot.get_context(session_id, language)
         
         # Handle voice input
         if 'audio' in request.FILES:
             # Process uploaded audio file
             audio_file = request.FILES['audio']
             
-            # Save audio file temporarily
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-                for chunk in audio_file.chunks():
-                    temp_file.write(chunk)
-                temp_file_path = temp_file.name
+            # Decode straight from the upload buffer, no temp file round-trip
+            if audio_file.size > MAX_AUDIO_BYTES:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Audio file too large (max 10MB)',
+                    'bot': 'Sorry, that recording is too long. Please try a shorter question.'
+                })
+            audio_bytes = audio_file.read()
             
-            try:
-                # Process voice query using our sophisticated voice processor
-                result = chatbot.process_voice_query(temp_file_path)
-                
-                if result['success']:
-                    return JsonResponse({
-                        'success': True,
-                        'you': result.get('text_response', ''),
-                        'bot': result.get('text_response', ''),
-                        'audio_response': result.get('audio_response', ''),
-                        'language': result.get('language', 'en'),
-                        'schemes': result.get('schemes', []),
-                        'confidence': result.get('confidence', 0.8)
-                    })
-                else:
-                    return JsonResponse({
-                        'success': False,
-                        'error': result.get('error', 'Voice processing failed'),
-                        'bot': 'Sorry, I could not process your voice input. Please try again.'
-                    })
+            # Old clients that expect the reply audio inline can still ask for base64
+            include_base64 = _flag(request.POST.get('audio_base64', request.GET.get('audio_base64')),
+                                   settings.VOICE_AUDIO_BASE64_DEFAULT)
             
-            finally:
-                # Clean up temporary file
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+            # Process voice query using our sophisticated voice processor
+            result = chatbot.process_voice_query(audio_bytes, include_audio_base64=include_base64, context=context)
+            if result.get('busy'):
+                return _voice_busy_response()
+            if result.get('too_long'):
+                return _voice_too_long_response(result['error'])
+            
+            return JsonResponse(_voice_response_data(result, include_base64))
         
         else:
             # Fallback: Use microphone input (for development/testing)
@@ -115,6 +150,160 @@ def voice_api(request):
         })
 
 
+def _voice_busy_response():
+    """503 telling the client to use browser speech recognition (sync and async voice views)"""
+    response = JsonResponse({
+        'success': False,
+        'busy': True,
+        'use_browser_speech': True,
+        'error': BUSY_MESSAGE,
+        'bot': BUSY_MESSAGE
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = '5'
+    return response
+
+
+def _voice_too_long_response(message):
+    """413 asking for a shorter question (sync and async voice views)"""
+    return JsonResponse({
+        'success': False,
+        'too_long': True,
+        'error': message,
+        'bot': message
+    }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+
+def _voice_response_data(result, include_base64):
+    """JSON body for a process_voice_query result (sync and async voice views)"""
+    if not result['success']:
+        return {
+            'success': False,
+            'error': result.get('error', 'Voice processing failed'),
+            'bot': 'Sorry, I could not process your voice input. Please try again.'
+        }
+    
+    audio_id = result.get('audio_id')
+    response_data = {
+        'success': True,
+        'you': result.get('text_response', ''),
+        'bot': result.get('text_response', ''),
+        'audio_id': audio_id,
+        'audio_url': reverse('audio_file_api', args=[audio_id]) if audio_id else None,
+        'audio_format': result.get('audio_format'),
+        'language': result.get('language', 'en'),
+        'schemes': result.get('schemes', []),
+        'confidence': result.get('confidence', 0.8)
+    }
+    if include_base64:
+        response_data['audio_response'] = result.get('audio_response', '')
+    return response_data
+
+
+def _flag(value, default=False):
+    """Interpret an optional true/false request parameter"""
+    if value is None:
+        return default
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def _parse_range(header, size):
+    """
+    Parse a single "bytes=start-end" Range header
+    Returns (start, end) inclusive, None to serve the whole file, or False if unsatisfiable
+    """
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', header.strip())
+    if not match or match.groups() == ('', ''):
+        return None  # malformed or multiple ranges: ignore the header
+    
+    start, end = match.groups()
+    if start == '':
+        suffix_length = int(end)
+        if suffix_length == 0:
+            return False
+        return max(0, size - suffix_length), size - 1
+    
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+@require_http_methods(["GET", "HEAD"])
+def audio_file_api(request, audio_id):
+    """
+    Stream a synthesized voice response by ID
+    Supports conditional requests (ETag) and single byte ranges
+    """
+    artifact = audio_store.get(audio_id)
+    if artifact is None:
+        return JsonResponse({
+            'success': False,
+            'error': 'Audio not found or expired'
+        }, status=404)
+    
+    headers = {
+        'ETag': artifact['etag'],
+        # IDs are content hashes, so a cached copy never goes stale while the clip exists
+        'Cache-Control': f"public, max-age={artifact['max_age']}, immutable",
+        'Accept-Ranges': 'bytes',
+    }
+    
+    if_none_match = request.headers.get('If-None-Match', '')
+    if artifact['etag'] in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+        return HttpResponseNotModified(headers=headers)
+    
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and request.headers.get('If-Range', artifact['etag']) == artifact['etag']:
+        byte_range = _parse_range(range_header, artifact['size'])
+    
+    try:
+        if byte_range is False:
+            headers['Content-Range'] = f"bytes */{artifact['size']}"
+            return HttpResponse(status=416, headers=headers)
+        
+        if byte_range:
+            start, end = byte_range
+            with open(artifact['path'], 'rb') as f:
+                f.seek(start)
+                data = f.read(end - start + 1)
+            headers['Content-Range'] = f"bytes {start}-{end}/{artifact['size']}"
+            return HttpResponse(data, status=206, content_type=artifact['content_type'], headers=headers)
+        
+        response = FileResponse(open(artifact['path'], 'rb'), content_type=artifact['content_type'])
+        for name, value in headers.items():
+            response[name] = value
+        return response
+    except FileNotFoundError:
+        # Expired and removed between the lookup and the read
+        return JsonResponse({
+            'success': False,
+            'error': 'Audio not found or expired'
+        }, status=404)
+
+
+def _text_chat_response_data(result):
+    """(JSON body, status) for a process_query result (sync and async text chat views)"""
+    if not result['success']:
+        return {
+            'success': False,
+            'error': result.get('error', 'Query processing failed'),
+            'response': result['response']['text']
+        }, status.HTTP_500_INTERNAL_SERVER_ERROR
+    
+    return {
+        'success': True,
+        'response': result['response']['text'],
+        'schemes': result['schemes'],
+        'intent': result['intent'],
+        'keywords': result['keywords'],
+        'language': result['language'],
+        'confidence': result['response'].get('confidence', 0.8),
+        'scheme_count': len(result['schemes'])
+    }, status.HTTP_200_OK
+
+
 @api_view(['POST'])
 def text_chat_api(request):
     """
@@ -138,30 +327,13 @@ def text_chat_api(request):
             session_id = str(uuid.uuid4())
             request.session['session_id'] = session_id
         
-        # Set chatbot session and language
-        chatbot.set_session(session_id)
-        chatbot.set_language(language)
+        # Session and language for this request only
+        context = chatbot.get_context(session_id, language)
         
         # Process the query using our sophisticated chatbot logic
-        result = chatbot.process_query(query, language)
+        result = chatbot.process_query(query, language, context=context)
         
-        if result['success']:
-            return Response({
-                'success': True,
-                'response': result['response']['text'],
-                'schemes': result['schemes'],
-                'intent': result['intent'],
-                'keywords': result['keywords'],
-                'language': result['language'],
-                'confidence': result['response'].get('confidence', 0.8),
-                'scheme_count': len(result['schemes'])
-            })
-        else:
-            return Response({
-                'success': False,
-                'error': result.get('error', 'Query processing failed'),
-                'response': result['response']['text']
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(*_text_chat_response_data(result))
     
     except Exception as e:
         logger.error(f"Text chat API error: {e}")
@@ -179,7 +351,7 @@ def chat_history_api(request, session_id):
     """
     try:
         session = ChatSession.objects.get(session_id=session_id)
-        messages = ChatMessage.objects.filter(session=session).order_by('timestamp')
+        messages = ChatMessage.objects.filter(session=session).order_by('timestamp', 'id')
         
         history = []
         for message in messages:
@@ -214,6 +386,25 @@ def chat_history_api(request, session_id):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _scheme_search_response_data(result, query, language, limit):
+    """JSON body for a scheme search (sync and async views)"""
+    if not result['success']:
+        return {
+            'success': False,
+            'error': 'Search failed',
+            'schemes': []
+        }
+    
+    schemes = result['schemes'][:limit]
+    return {
+        'success': True,
+        'query': query,
+        'scheme_count': len(schemes),
+        'schemes': schemes,
+        'language': language
+    }
+
+
 @api_view(['GET'])
 def scheme_search_api(request):
     """
@@ -231,25 +422,10 @@ def scheme_search_api(request):
                 'error': 'Query parameter "q" is required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Use chatbot logic to search schemes
-        chatbot.set_language(language)
+        # Use chatbot logic to search schemes (not logged to any session)
         result = chatbot.process_query(query, language)
         
-        if result['success']:
-            schemes = result['schemes'][:limit]
-            return Response({
-                'success': True,
-                'query': query,
-                'scheme_count': len(schemes),
-                'schemes': schemes,
-                'language': language
-            })
-        else:
-            return Response({
-                'success': False,
-                'error': 'Search failed',
-                'schemes': []
-            })
+        return Response(_scheme_search_response_data(result, query, language, limit))
     
     except Exception as e:
         logger.error(f"Scheme search API error: {e}")
@@ -309,6 +485,87 @@ def available_sectors_api(request):
     })
 
 
+def _advanced_search_params(data):
+    """advanced_search() arguments from the request filters"""
+    sector = data.get('sector', '')
+    ministry = data.get('ministry', '')
+    eligibility = data.get('eligibility', '')
+    
+    # Build advanced search query
+    search_query = "Show me government schemes"
+    keywords = []
+    entities = {}
+    
+    if sector:
+        search_query += f" in {sector} sector"
+        keywords.append(sector)
+        entities['sectors'] = [sector]
+    
+    if ministry:
+        search_query += f" from {ministry} ministry"
+        keywords.append(ministry)
+        entities['ministry'] = ministry
+    
+    if eligibility:
+        search_query += f" for {eligibility}"
+        keywords.extend(eligibility.split())
+        entities['eligibility'] = eligibility
+    
+    return {
+        'query': search_query,
+        'keywords': keywords,
+        'entities': entities,
+        'sector': sector,
+        'ministry': ministry,
+        'eligibility': eligibility,
+        'sort_by': data.get('sortBy', 'relevance')
+    }
+
+
+def _advanced_search_message(schemes, search):
+    """Reply text summarizing an advanced search"""
+    if not schemes:
+        return "No schemes found matching your search criteria. Try adjusting your filters or using different keywords."
+    
+    response_msg = f"Found {len(schemes)} government schemes"
+    if search['sector']:
+        response_msg += f" in {search['sector']} sector"
+    if search['ministry']:
+        response_msg += f" from {search['ministry']} ministry"
+    if search['eligibility']:
+        response_msg += f" for {search['eligibility']}"
+    response_msg += f", sorted by {search['sort_by']}."
+    return response_msg
+
+
+def _log_advanced_search(context, search_query, response_msg, schemes, language):
+    """Save search to chat history (written in the background)"""
+    try:
+        related_schemes = [str(scheme.get('_id', '')) for scheme in schemes[:5]]  # Store up to 5 scheme IDs
+        chat_log_writer.log(context.session_id, 'user', search_query, language,
+                            related_schemes=related_schemes)
+        chat_log_writer.log(context.session_id, 'bot', response_msg, language,
+                            related_schemes=related_schemes)
+    except Exception as e:
+        logger.warning(f"Failed to save advanced search to chat history: {e}")
+
+
+def _advanced_search_response_data(response_msg, schemes, search, language):
+    return {
+        'success': True,
+        'response': response_msg,
+        'schemes': schemes,
+        'search_params': {
+            'sector': search['sector'],
+            'ministry': search['ministry'],
+            'eligibility': search['eligibility'],
+            'sort_by': search['sort_by'],
+            'language': language
+        },
+        'total_results': len(schemes)
+    }
+
+
 @api_view(['POST'])
 def advanced_search_api(request):
     """
@@ -317,10 +574,6 @@ def advanced_search_api(request):
     try:
         # Get search parameters
         data = json.loads(request.body)
-        sector = data.get('sector', '')
-        ministry = data.get('ministry', '')
-        eligibility = data.get('eligibility', '')
-        sort_by = data.get('sortBy', 'relevance')
         language = data.get('language', 'en')
         
         # Generate session ID
@@ -329,91 +582,23 @@ def advanced_search_api(request):
             session_id = str(uuid.uuid4())
             request.session['session_id'] = session_id
         
-        # Set chatbot language and session
-        chatbot.set_language(language)
-        chatbot.set_session(session_id)
+        # Session and language for this request only
+        context = chatbot.get_context(session_id, language)
         
         # Build advanced search query
-        search_query = "Show me government schemes"
-        keywords = []
-        entities = {}
-        
-        if sector:
-            search_query += f" in {sector} sector"
-            keywords.append(sector)
-            entities['sectors'] = [sector]
-        
-        if ministry:
-            search_query += f" from {ministry} ministry"
-            keywords.append(ministry)
-            entities['ministry'] = ministry
-        
-        if eligibility:
-            search_query += f" for {eligibility}"
-            keywords.extend(eligibility.split())
-            entities['eligibility'] = eligibility
+        search = _advanced_search_params(data)
         
-        # Perform advanced search using MongoDB adapter
-        from mongodb_adapter import MongoDBAdapter
-        mongodb_adapter = MongoDBAdapter()
+        # Perform advanced search using the shared MongoDB adapter
+        from mongodb_adapter import get_adapter
+        mongodb_adapter = get_adapter()
         
         # Enhanced search with additional filters
-        schemes = mongodb_adapter.advanced_search(
-            query=search_query,
-            keywords=keywords,
-            entities=entities,
-            sector=sector,
-            ministry=ministry,
-            eligibility=eligibility,
-            sort_by=sort_by
-        )
+        schemes = mongodb_adapter.advanced_search(**search)
+        response_msg = _advanced_search_message(schemes, search)
         
-        # Generate response message
-        if schemes:
-            response_msg = f"Found {len(schemes)} government schemes"
-            if sector:
-                response_msg += f" in {sector} sector"
-            if ministry:
-                response_msg += f" from {ministry} ministry"
-            if eligibility:
-                response_msg += f" for {eligibility}"
-            response_msg += f", sorted by {sort_by}."
-        else:
-            response_msg = "No schemes found matching your search criteria. Try adjusting your filters or using different keywords."
-        
-        # Save search to chat history
-        try:
-            ChatMessage.objects.create(
-                session=chatbot.session,
-                message_type='user',
-                text_content=search_query,
-                language=language,
-                related_schemes=[str(scheme.get('_id', '')) for scheme in schemes[:5]]  # Store up to 5 scheme IDs
-            )
-            
-            ChatMessage.objects.create(
-                session=chatbot.session,
-                message_type='bot',
-                text_content=response_msg,
-                language=language,
-                related_schemes=[str(scheme.get('_id', '')) for scheme in schemes[:5]]
-            )
-        except Exception as e:
-            logger.warning(f"Failed to save advanced search to chat history: {e}")
+        _log_advanced_search(context, search['query'], response_msg, schemes, language)
         
-        return Response({
-            'success': True,
-            'response': response_msg,
-            'schemes': schemes,
-            'search_params': {
-                'sector': sector,
-                'ministry': ministry,
-                'eligibility': eligibility,
-                'sort_by': sort_by,
-                'language': language
-            },
-            'total_results': len(schemes)
-        })
+        return Response(_advanced_search_response_data(response_msg, schemes, search, language))
     
     except json.JSONDecodeError:
         return Response({
@@ -4,19 +4,24 @@ Supports multiple Indian languages including Kannada, Hindi, and English
 """
 
 import os
-import tempfile
+import atexit
 import logging
 import io
+import time
 import base64
 from django.conf import settings
+from .model_registry import EVICTED, READY, model_registry, resident_memory_mb, warmup_models_in_background
+from .audio_decoding import SAMPLE_RATE, decode_audio, memory_temp_file
+from .tts_cache import TTSCache
+from .metrics import MODEL_INFERENCE_SECONDS, metrics_registry, record_span
+from .stt_engines import AdaptiveRouter, create_engine, decoding_profile, engine_class
+from .stt_pool import STTQueueFull, STTTimeout, STTWorkerPool
+from .vad import EnergyVAD, speech_bounds
 
-# Try to import optional dependencies with fallbacks
-try:
-    import whisper
-    WHISPER_AVAILABLE = True
-except ImportError as e:
-    print(f"Whisper not available: {e}")
-    WHISPER_AVAILABLE = False
+# Speech recognition runs on whichever Whisper runtime STT_ENGINE selects
+WHISPER_AVAILABLE = engine_class(settings.STT_ENGINE).installed()
+if not WHISPER_AVAILABLE:
+    print(f"Whisper not available: STT engine '{settings.STT_ENGINE}' is not installed")
 
 try:
     import pyttsx3
@@ -34,133 +39,460 @@ except ImportError as e:
 
 logger = logging.getLogger(__name__)
 
+# Languages the language-detection head may choose from
+SUPPORTED_LANGUAGES = getattr(
+    settings, 'VOICE_SUPPORTED_LANGUAGES',
+    ['en', 'hi', 'kn', 'ta', 'te', 'ml', 'mr', 'bn', 'gu', 'pa']
+)
+
+# Largest upload accepted by the voice endpoints (speech length is limited by VOICE_MAX_SPEECH_SECONDS)
+MAX_AUDIO_BYTES = 10 * 1024 * 1024
+
+# Shown when speech recognition is unavailable or too busy to take another job
+BROWSER_SPEECH_MESSAGE = ('Server-side voice processing is not available. Please use the "CLICK & SPEAK" '
+                          'button which uses your browser\'s built-in speech recognition.')
+NO_SPEECH_MESSAGE = 'I could not hear any speech. Please speak closer to the microphone and try again.'
+BUSY_MESSAGE = ('Voice recognition is busy right now. Please use the "CLICK & SPEAK" button which uses '
+                'your browser\'s built-in speech recognition, or try again in a moment.')
+TOO_LONG_MESSAGE = 'That question was too long. Please keep it under {seconds:g} seconds and try again.'
+
+
+class SpeechTooLong(ValueError):
+    """The speech in a clip is longer than VOICE_MAX_SPEECH_SECONDS"""
+
+# Voice parameters for each TTS engine (part of the audio cache key)
+GTTS_VOICE_PARAMS = {'slow': False}
+PYTTSX3_VOICE_PARAMS = {'rate': 150, 'volume': 0.9}
+
+# Map Whisper language codes to our language codes
+LANGUAGE_MAPPING = {
+    'en': 'en',  # English
+    'hi': 'hi',  # Hindi
+    'kn': 'kn',  # Kannada
+    'ta': 'ta',  # Tamil
+    'te': 'te',  # Telugu
+    'ml': 'ml',  # Malayalam
+    'mr': 'mr',  # Marathi
+    'bn': 'bn',
+    'gu': 'gu',
+    'pa': 'pa',
+    'kannada': 'kn',  # Alternative name
+    'hindi': 'hi',    # Alternative name
+    'tamil': 'ta',    # Alternative name
+    'telugu': 'te',   # Alternative name
+    'bengali': 'bn',  # Alternative name
+    'gujarati': 'gu', # Alternative name
+    'marathi': 'mr',  # Alternative name
+    'punjabi': 'pa',  # Alternative name
+}
+
+
+def load_whisper_model():
+    """Load the Whisper model on the configured STT engine (registry loader)"""
+    if not WHISPER_AVAILABLE:
+        logger.warning("Whisper not available - voice recognition disabled")
+        return None
+    
+    model_name = getattr(settings, 'WHISPER_MODEL', None)
+    if not model_name:
+        # Check if we're on Windows and adjust model loading
+        import platform
+        # Use smaller model for Windows compatibility
+        model_name = "tiny" if platform.system() == "Windows" else "base"
+    
+    options = {'compute_type': settings.STT_COMPUTE_TYPE, 'cpu_threads': settings.STT_CPU_THREADS,
+               'mmap_dir': settings.STT_MMAP_DIR if settings.STT_MMAP_WEIGHTS else None}
+    before = resident_memory_mb()
+    try:
+        engine = create_engine(settings.STT_ENGINE, model_name, SUPPORTED_LANGUAGES, **options)
+        logger.info(f"Whisper {model_name} model loaded successfully ({settings.STT_ENGINE} engine)")
+    except Exception as e:
+        logger.error(f"Failed to load Whisper model: {e}")
+        # Try to load tiny model as fallback
+        engine = create_engine(settings.STT_ENGINE, "tiny", SUPPORTED_LANGUAGES, **options)
+        logger.info("Whisper tiny model loaded as fallback")
+    
+    small_name = settings.STT_ROUTER_SMALL_MODEL
+    if not settings.STT_ROUTER_ENABLED or not small_name or small_name == engine.model_name:
+        return engine
+    return _add_small_model(engine, small_name, options, before)
+
+
+def _add_small_model(large, small_name, options, before):
+    """
+    Put a small model in front of the loaded one (adaptive routing), if both fit the memory budget
+    Returns the router, or the large engine alone when the small model cannot be added
+    """
+    loaded = resident_memory_mb()
+    try:
+        small = create_engine(settings.STT_ENGINE, small_name, SUPPORTED_LANGUAGES, **options)
+    except Exception as e:
+        logger.warning(f"Whisper {small_name} model for adaptive routing failed to load, "
+                       f"using {large.model_name} only: {e}")
+        return large
+    
+    # The budget all registered models share (MODEL_MEMORY_BUDGET_MB)
+    budget = model_registry.memory_budget_mb
+    if budget and before is not None:
+        used = resident_memory_mb() - before
+        logger.info(f"Whisper models resident: {used:.0f} MB of {budget} MB "
+                    f"({large.model_name} {loaded - before:.0f} MB)")
+        if used > budget:
+            logger.warning(f"Whisper {small_name} and {large.model_name} together exceed the "
+                           f"{budget} MB budget, using {large.model_name} only")
+            return large
+    
+    return AdaptiveRouter(
+        small, large,
+        min_avg_logprob=settings.STT_ROUTER_MIN_AVG_LOGPROB,
+        max_no_speech_prob=settings.STT_ROUTER_MAX_NO_SPEECH_PROB,
+        long_clip_seconds=settings.STT_ROUTER_LONG_CLIP_SECONDS
+    )
+
+
+def warm_whisper_model(engine):
+    """Run a dummy inference so the first real request doesn't pay for kernel setup"""
+    engine.warm()
+
+
+def load_tts_engine():
+    """Create and configure the offline pyttsx3 engine (registry loader)"""
+    engine = pyttsx3.init()
+    # Configure voice properties
+    voices = engine.getProperty('voices')
+    if voices:
+        # Try to find a suitable voice for Indian languages
+        for voice in voices:
+            if 'hindi' in voice.name.lower() or 'indian' in voice.name.lower():
+                engine.setProperty('voice', voice.id)
+                break
+    
+    # Set speech rate and volume
+    engine.setProperty('rate', PYTTSX3_VOICE_PARAMS['rate'])  # Speed of speech
+    engine.setProperty('volume', PYTTSX3_VOICE_PARAMS['volume'])  # Volume level
+    logger.info("TTS engine initialized successfully")
+    return engine
+
+
+model_registry.register('whisper', load_whisper_model, warm_whisper_model)
+if PYTTSX3_AVAILABLE:
+    model_registry.register('pyttsx3', load_tts_engine)
+# Unload models left idle (quiet hours) and reload them on demand; pool workers are stopped instead
+model_registry.configure(
+    idle_seconds=settings.MODEL_IDLE_SECONDS,
+    memory_budget_mb=settings.MODEL_MEMORY_BUDGET_MB,
+    cold_start=settings.MODEL_COLD_START
+)
+
+STT_INPUT_SECONDS = metrics_registry.counter(
+    'chatbot_stt_input_audio_seconds_total', 'Seconds of audio received for speech recognition'
+)
+STT_TRIMMED_SECONDS = metrics_registry.counter(
+    'chatbot_stt_trimmed_audio_seconds_total', 'Seconds of silence cut by the VAD before speech recognition'
+)
+STT_DROPPED_CLIPS = metrics_registry.counter(
+    'chatbot_stt_dropped_clips_total', 'Clips rejected before speech recognition', ('reason',)
+)
+STT_ROUTED_CLIPS = metrics_registry.counter(
+    'chatbot_stt_router_clips_total', 'Clips by adaptive routing outcome (small, escalated, long_clip)', ('route',)
+)
+STT_ESCALATIONS = metrics_registry.counter(
+    'chatbot_stt_router_escalations_total', 'Clips re-transcribed by the large model, by reason', ('reason',)
+)
+STT_LATENCY_SAVED = metrics_registry.counter(
+    'chatbot_stt_router_latency_saved_seconds_total',
+    'Estimated large-model seconds saved by answering from the small model'
+)
+STT_PROFILE_CLIPS = metrics_registry.counter(
+    'chatbot_stt_profile_clips_total', 'Clips by decoding profile and whether temperature fallback ran',
+    ('profile', 'fallback')
+)
+STT_LATENCY_WASTED = metrics_registry.counter(
+    'chatbot_stt_router_latency_wasted_seconds_total',
+    'Small-model seconds spent on clips that were escalated anyway'
+)
+
 
 class VoiceProcessor:
     """Handles voice processing operations"""
     
     def __init__(self):
-        self.whisper_model = None
-        self.tts_engine = None
-        self._load_models()
+        # Synthesized clips, shared by all requests in this process (and on disk by all workers)
+        self.tts_cache = None
+        if settings.TTS_CACHE_ENABLED:
+            self.tts_cache = TTSCache(
+                directory=settings.TTS_CACHE_DIR,
+                max_memory_bytes=settings.TTS_CACHE_MAX_MEMORY_BYTES,
+                max_disk_bytes=settings.TTS_CACHE_MAX_DISK_BYTES
+            )
+        
+        # Whisper runs in worker processes instead of request threads (started on first use)
+        self.stt_pool = None
+        if WHISPER_AVAILABLE and settings.STT_POOL_ENABLED:
+            self.stt_pool = STTWorkerPool(
+                workers=settings.STT_POOL_WORKERS,
+                max_queue=settings.STT_POOL_MAX_QUEUE,
+                job_timeout=settings.STT_JOB_TIMEOUT_SECONDS,
+                batch_window=settings.STT_BATCH_WINDOW_MS / 1000,
+                max_batch=settings.STT_BATCH_MAX_SIZE,
+                idle_timeout=settings.MODEL_IDLE_SECONDS,
+                cold_start=settings.MODEL_COLD_START
+            )
     
-    def _load_models(self):
-        """Load Whisper model for speech recognition"""
+    @property
+    def stt_engine(self):
+        """Shared speech recognition engine, loaded on first use (see model_registry)"""
         if not WHISPER_AVAILABLE:
-            logger.warning("Whisper not available - voice recognition disabled")
-            self.whisper_model = None
-            return
-            
-        try:
-            # Check if we're on Windows and adjust model loading
-            import platform
-            if platform.system() == "Windows":
-                # Use smaller model for Windows compatibility
-                self.whisper_model = whisper.load_model("tiny")
-            else:
-                self.whisper_model = whisper.load_model("base")
-            logger.info("Whisper model loaded successfully")
-        except Exception as e:
-            logger.error(f"Failed to load Whisper model: {e}")
-            # Try to load tiny model as fallback
-            try:
-                self.whisper_model = whisper.load_model("tiny")
-                logger.info("Whisper tiny model loaded as fallback")
-            except Exception as e2:
-                logger.error(f"Failed to load even tiny model: {e2}")
-                self.whisper_model = None
+            return None
+        return model_registry.get('whisper')
+    
+    def stt_available(self):
+        """Whether speech recognition can run (in the worker pool, or loading the model here)"""
+        if self.stt_pool is not None:
+            self.stt_pool.start()
+            return self.stt_pool.available()
+        return self.stt_engine is not None
+    
+    def stt_ready(self):
+        """
+        Whether a warm model is waiting for voice requests, or was unloaded after idling
+        and comes back on the next one (never triggers a load)
+        """
+        if self.stt_pool is not None:
+            return self.stt_pool.ready()
+        return model_registry.readiness()['whisper']['state'] in (READY, EVICTED)
+    
+    def stt_busy(self):
+        """Whether a voice request would be turned away because the recognition queue is full"""
+        return self.stt_pool is not None and self.stt_pool.is_full()
+    
+    def _load_models(self):
+        """Reload the Whisper model for speech recognition"""
+        if WHISPER_AVAILABLE:
+            model_registry.reload('whisper')
     
     def _get_tts_engine(self):
-        """Initialize text-to-speech engine"""
+        """Offline text-to-speech engine, created on first use (see model_registry)"""
         if not PYTTSX3_AVAILABLE:
             logger.warning("pyttsx3 not available - offline TTS disabled")
             return None
+        return model_registry.get('pyttsx3')
+    
+    def _load_audio(self, audio):
+        """
+        Decode audio to 16 kHz mono float32 samples
+        Args:
+            audio: Raw uploaded bytes (decoded in memory), a file path, or samples
+        """
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            audio = decode_audio(bytes(audio))
+        elif isinstance(audio, str):
+            if not os.path.exists(audio):
+                raise FileNotFoundError(f"Audio file not found: {audio}")
             
-        if self.tts_engine is None:
+            if os.path.getsize(audio) == 0:
+                raise ValueError("Audio file is empty")
+            
+            with open(audio, 'rb') as audio_file:
+                audio = decode_audio(audio_file.read())
+        
+        if len(audio) == 0:
+            raise ValueError("Audio file is empty")
+        return audio
+    
+    def _trim_silence(self, audio):
+        """
+        Cut leading and trailing silence with the VAD so Whisper only decodes speech
+        Returns:
+            The speech part of the clip, or None when there is no speech at all
+        Raises:
+            SpeechTooLong: The speech is longer than VOICE_MAX_SPEECH_SECONDS
+        """
+        received = len(audio) / SAMPLE_RATE
+        STT_INPUT_SECONDS.inc(received)
+        
+        if settings.VOICE_VAD_ENABLED:
+            bounds = speech_bounds(audio, EnergyVAD(threshold_db=settings.VOICE_VAD_THRESHOLD_DB),
+                                   padding_ms=settings.VOICE_VAD_PADDING_MS)
+            if bounds is None:
+                STT_TRIMMED_SECONDS.inc(received)
+                STT_DROPPED_CLIPS.inc(reason='no_speech')
+                return None
+            audio = audio[bounds[0]:bounds[1]]
+            STT_TRIMMED_SECONDS.inc(received - len(audio) / SAMPLE_RATE)
+        
+        if len(audio) / SAMPLE_RATE > settings.VOICE_MAX_SPEECH_SECONDS:
+            STT_DROPPED_CLIPS.inc(reason='too_long')
+            raise SpeechTooLong(TOO_LONG_MESSAGE.format(seconds=settings.VOICE_MAX_SPEECH_SECONDS))
+        return audio
+    
+    def transcribe(self, audio, language=None, profile=None):
+        """
+        Speech recognition: decode and trim the clip here, then run Whisper
+        on the speech, in the worker pool when it is enabled
+        Args:
+            audio: Uploaded audio bytes, a file path, or 16 kHz mono float32 samples
+            language: Optional language code (skips detection)
+            profile: Decoding profile name (see stt_engines.DECODING_PROFILES); its time
+                budget bounds the wait for the worker pool
+        Returns:
+            dict with 'text', 'language', 'language_probability', 'batch_size', 'timings' (seconds per stage),
+            Whisper's 'avg_logprob' and 'no_speech_prob', the routing keys of stt_engines.AdaptiveRouter
+            when it is in use, and 'no_speech' when the VAD found nothing to decode
+        Raises:
+            STTQueueFull: The worker pool cannot take another job
+            STTTimeout: The pool did not answer within the profile's time budget
+            SpeechTooLong: The speech is longer than VOICE_MAX_SPEECH_SECONDS
+            ValueError: Unreadable audio or unknown profile
+        """
+        budget = decoding_profile(profile)['time_budget']
+        started = time.perf_counter()
+        audio = self._load_audio(audio)
+        timings = {'load_audio': time.perf_counter() - started}
+        
+        started = time.perf_counter()
+        speech = self._trim_silence(audio)
+        timings['vad'] = time.perf_counter() - started
+        
+        if speech is None:
+            result = {
+                'text': '',
+                'language': LANGUAGE_MAPPING.get(language, 'en'),
+                'language_probability': None,
+                'no_speech': True,
+                'batch_size': 0
+            }
+        else:
+            if self.stt_pool is not None:
+                result = self.stt_pool.transcribe(speech, language, profile, timeout=budget)
+            else:
+                result = self.transcribe_local(speech, language, profile)
+            # The samples were already decoded here, so the inner load_audio is negligible
+            timings.update((stage, seconds) for stage, seconds in result['timings'].items()
+                           if stage not in ('load_audio', 'total'))
+        timings['total'] = sum(timings.values())
+        result['timings'] = timings
+        
+        for stage, seconds in timings.items():
+            if stage != 'total':
+                record_span(f'stt_{stage}', seconds)
+        for operation in ('encoding', 'language_detection', 'transcription'):
+            if operation in timings:
+                MODEL_INFERENCE_SECONDS.observe(timings[operation], model='whisper', operation=operation)
+        
+        # Decoding and routing happen wherever the model runs (often a pool worker), so they are counted here
+        if 'profile' in result:
+            STT_PROFILE_CLIPS.inc(profile=result['profile'], fallback=str(result['temperature'] > 0).lower())
+        if result.get('route'):
+            STT_ROUTED_CLIPS.inc(route=result['route'])
+            if result['escalation']:
+                STT_ESCALATIONS.inc(reason=result['escalation'])
+            if result['latency_saved'] > 0:
+                STT_LATENCY_SAVED.inc(result['latency_saved'])
+            else:
+                STT_LATENCY_WASTED.inc(-result['latency_saved'])
+        return result
+    
+    def transcribe_local(self, audio, language=None, profile=None):
+        """
+        Speech recognition of one clip in this process (see transcribe_batch_local)
+        Args:
+            audio: Uploaded audio bytes, a file path, or 16 kHz mono float32 samples
+            language: Optional language code (skips detection)
+            profile: Decoding profile name (default: stt_engines.DEFAULT_PROFILE)
+        Returns:
+            dict with 'text', 'language', 'language_probability', 'batch_size', 'timings' (seconds per stage),
+            plus the engine's confidence (and routing) keys
+        """
+        result = self.transcribe_batch_local([(audio, language, profile)])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+    
+    def transcribe_batch_local(self, items):
+        """
+        Batched speech recognition in this process on the configured STT engine
+        Each clip is decoded once; the engine then encodes the batch in one pass and
+        reuses the encoder output for language detection and decoding (see stt_engines).
+        Args:
+            items: (audio, language, profile) triples, as for transcribe_local(); clips
+                with different decoding profiles are decoded as separate batches
+        Returns:
+            A result dict (as transcribe_local) or the exception raised, per item in order.
+            Stage timings cover the whole batch, which is what each caller waited for.
+        """
+        results = [None] * len(items)
+        timings = {}
+        
+        started = time.perf_counter()
+        by_profile = {}
+        for index, (audio, language, profile) in enumerate(items):
             try:
-                self.tts_engine = pyttsx3.init()
-                # Configure voice properties
-                voices = self.tts_engine.getProperty('voices')
-                if voices:
-                    # Try to find a suitable voice for Indian languages
-                    for voice in voices:
-                        if 'hindi' in voice.name.lower() or 'indian' in voice.name.lower():
-                            self.tts_engine.setProperty('voice', voice.id)
-                            break
-                
-                # Set speech rate and volume
-                self.tts_engine.setProperty('rate', 150)  # Speed of speech
-                self.tts_engine.setProperty('volume', 0.9)  # Volume level
-                logger.info("TTS engine initialized successfully")
+                profile = decoding_profile(profile)
+                by_profile.setdefault(profile['name'], (profile, []))[1].append(
+                    (index, self._load_audio(audio), language)
+                )
             except Exception as e:
-                logger.error(f"Failed to initialize TTS engine: {e}")
-                self.tts_engine = None
-        return self.tts_engine
+                results[index] = e
+        timings['load_audio'] = time.perf_counter() - started
+        
+        engine = self.stt_engine
+        transcribed = []
+        for profile, clips in by_profile.values():
+            outcomes = engine.transcribe_batch([(audio, language) for _, audio, language in clips], timings, profile)
+            transcribed.extend((index, profile['name'], outcome) for (index, _, _), outcome in zip(clips, outcomes))
+        timings['total'] = sum(timings.values())
+        
+        seconds_of_audio = sum(len(audio) for _, clips in by_profile.values() for _, audio, _ in clips) / SAMPLE_RATE
+        logger.info(f"Transcribed {len(transcribed)} clip(s), {seconds_of_audio:.1f}s of audio ({engine.name}, "
+                    f"{'/'.join(by_profile)}): "
+                    + ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in timings.items()))
+        
+        for index, profile, result in transcribed:
+            if isinstance(result, Exception):
+                results[index] = result
+                continue
+            results[index] = dict(
+                result,
+                text=result['text'].strip() if result['text'] else '',
+                language=LANGUAGE_MAPPING.get(result['language'], 'en'),
+                profile=profile,
+                batch_size=len(items),
+                timings=dict(timings)
+            )
+        return results
     
     def detect_language(self, audio_file_path):
         """
-        Detect the language of the audio using Whisper
+        Detect the language of the audio using Whisper's language head
         Returns language code (en, hi, kn, etc.)
         """
-        if not WHISPER_AVAILABLE or not self.whisper_model:
+        if not WHISPER_AVAILABLE or not self.stt_engine:
             logger.warning("Whisper model not available, defaulting to English")
             return 'en'  # Default to English if model not loaded
         
         try:
-            # Check if file exists
-            if not os.path.exists(audio_file_path):
-                logger.error(f"Audio file not found for language detection: {audio_file_path}")
-                return 'en'
-            
-            # Load and transcribe audio to detect language
-            result = self.whisper_model.transcribe(
-                audio_file_path, 
-                language=None,
-                fp16=False,
-                verbose=False
-            )
-            detected_language = result.get('language', 'en')
-            
-            # Map Whisper language codes to our language codes
-            language_mapping = {
-                'en': 'en',  # English
-                'hi': 'hi',  # Hindi
-                'kn': 'kn',  # Kannada
-                'ta': 'ta',  # Tamil
-                'te': 'te',  # Telugu
-                'ml': 'ml',  # Malayalam
-                'mr': 'mr',  # Marathi
-                'te': 'te',
-                'bn': 'bn',
-                'gu': 'gu',
-                'mr': 'mr',
-                'pa': 'pa',
-                'kannada': 'kn',  # Alternative name
-                'hindi': 'hi',    # Alternative name
-                'tamil': 'ta',    # Alternative name
-                'telugu': 'te',   # Alternative name
-                'bengali': 'bn',  # Alternative name
-                'gujarati': 'gu', # Alternative name
-                'marathi': 'mr',  # Alternative name
-                'punjabi': 'pa',  # Alternative name
-            }
+            audio = self._load_audio(audio_file_path)
+            detected_language, probability = self.stt_engine.detect_language(audio)
             
-            mapped_language = language_mapping.get(detected_language, 'en')
-            logger.info(f"Detected language: {detected_language} -> {mapped_language}")
+            mapped_language = LANGUAGE_MAPPING.get(detected_language, 'en')
+            logger.info(f"Detected language: {detected_language} ({probability:.2f}) -> {mapped_language}")
             return mapped_language
         except Exception as e:
             logger.error(f"Language detection failed: {e}")
             return 'en'
     
-    def speech_to_text(self, audio_file_path, language=None):
+    def speech_to_text(self, audio_file_path, language=None, profile=None):
         """
         Convert speech to text using Whisper
         Args:
-            audio_file_path: Path to the audio file
+            audio_file_path: Path to the audio file (or uploaded audio bytes)
             language: Optional language code for better accuracy
+            profile: Decoding profile name for this endpoint (see stt_engines.DECODING_PROFILES)
         Returns:
             dict with 'text', 'language', and 'confidence'
         """
-        if not self.whisper_model:
+        if not self.stt_available():
             logger.warning("Whisper model not available, using fallback")
             return {
                 'text': 'Voice input received (Whisper not available)',
@@ -170,99 +502,66 @@ class VoiceProcessor:
             }
             
         try:
-            # Validate audio file
-            if not os.path.exists(audio_file_path):
-                raise FileNotFoundError(f"Audio file not found: {audio_file_path}")
-            
-            # Check file size
-            file_size = os.path.getsize(audio_file_path)
-            if file_size == 0:
-                raise ValueError("Audio file is empty")
-            if file_size > 10 * 1024 * 1024:  # 10MB limit
-                raise ValueError("Audio file too large (max 10MB)")
-            
             # Validate whisper model
-            if not hasattr(self.whisper_model, 'transcribe'):
+            if self.stt_pool is None and not hasattr(self.stt_engine, 'transcribe_batch'):
                 logger.error("Whisper model not properly initialized")
                 self._load_models()  # Try reloading the model
-                
-            # If language is not specified, detect it first
-            if not language:
-                language = self.detect_language(audio_file_path)
             
-            # Transcribe audio with better error handling
-            result = self.whisper_model.transcribe(
-                audio_file_path,
-                language=language,
-                fp16=False,  # Use fp32 for better compatibility
-                verbose=False  # Reduce output verbosity
-            )
+            # Language detection (when needed) and transcription share one audio decode
+            result = self.transcribe(audio_file_path, language, profile)
             
-            # Clean up the text
-            text = result['text'].strip() if result.get('text') else ''
+            if result.get('no_speech'):
+                return {
+                    'text': '',
+                    'language': result['language'],
+                    'confidence': 0.0,
+                    'no_speech': True,
+                    'timings': result['timings'],
+                    'error': NO_SPEECH_MESSAGE
+                }
             
             return {
-                'text': text,
-                'language': language,
+                'text': result['text'],
+                'language': result['language'],
                 'confidence': 0.9,  # Whisper doesn't provide confidence scores directly
+                'timings': result['timings'],
                 'error': None
             }
-        except FileNotFoundError as e:
-            logger.error(f"Audio file not found: {e}")
+        except (STTQueueFull, STTTimeout) as e:
+            # Full queue, or no answer within the time budget: the client should fall back, not wait
+            logger.warning(f"Speech recognition busy: {e}")
             return {
                 'text': '',
                 'language': language or 'en',
                 'confidence': 0.0,
+                'busy': True,
                 'error': str(e)
             }
-        except ValueError as e:
-            logger.error(f"Invalid audio input: {e}")
+        except SpeechTooLong as e:
+            # The user should be asked to speak for less time, not sent to another recognizer
+            logger.info(f"Speech too long: {e}")
             return {
                 'text': '',
                 'language': language or 'en',
                 'confidence': 0.0,
+                'too_long': True,
                 'error': str(e)
             }
-        except Exception as e:
-            logger.error(f"Speech to text conversion failed: {e}")
+        except FileNotFoundError as e:
+            logger.error(f"Audio file not found: {e}")
             return {
                 'text': '',
                 'language': language or 'en',
                 'confidence': 0.0,
                 'error': str(e)
             }
-        
-        try:
-            # Check if file exists
-            if not os.path.exists(audio_file_path):
-                logger.error(f"Audio file not found: {audio_file_path}")
-                return {
-                    'text': '',
-                    'language': 'en',
-                    'confidence': 0.0,
-                    'error': f'Audio file not found: {audio_file_path}'
-                }
-            
-            # If language is not specified, detect it first
-            if not language:
-                language = self.detect_language(audio_file_path)
-            
-            # Transcribe audio with better error handling
-            result = self.whisper_model.transcribe(
-                audio_file_path,
-                language=language,
-                fp16=False,  # Use fp32 for better compatibility
-                verbose=False  # Reduce output verbosity
-            )
-            
-            # Clean up the text
-            text = result['text'].strip() if result.get('text') else ''
-            
+        except ValueError as e:
+            logger.error(f"Invalid audio input: {e}")
             return {
-                'text': text,
-                'language': language,
-                'confidence': 0.9,  # Whisper doesn't provide confidence scores directly
-                'error': None
+                'text': '',
+                'language': language or 'en',
+                'confidence': 0.0,
+                'error': str(e)
             }
         except Exception as e:
             logger.error(f"Speech to text conversion failed: {e}")
@@ -326,60 +625,98 @@ class VoiceProcessor:
             if not engine:
                 return None
             
-            # Save to temporary file
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
+            # pyttsx3 can only render to a path, so use a tmpfs-backed file when available
+            with memory_temp_file('.wav') as temp_file:
                 temp_path = temp_file.name
             
-            # Configure engine for the specific file
-            engine.save_to_file(text, temp_path)
-            engine.runAndWait()
-            
-            # Read the generated audio file
-            with open(temp_path, 'rb') as f:
-                audio_data = f.read()
-            
-            # Clean up temporary file
-            os.unlink(temp_path)
+            try:
+                # Configure engine for the specific file
+                engine.save_to_file(text, temp_path)
+                engine.runAndWait()
+                
+                # Read the generated audio file
+                with open(temp_path, 'rb') as f:
+                    audio_data = f.read()
+            finally:
+                # Clean up temporary file
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
             
             return audio_data
         except Exception as e:
             logger.error(f"pyttsx3 conversion failed: {e}")
             return None
     
-    def text_to_speech(self, text, language='en', use_gtts=True):
+    @staticmethod
+    def _timed_render(engine, render):
+        """Wrap a TTS call so actual syntheses (cache misses) are timed"""
+        def timed():
+            started = time.perf_counter()
+            try:
+                return render()
+            finally:
+                MODEL_INFERENCE_SECONDS.observe(time.perf_counter() - started, model=engine, operation='synthesis')
+        return timed
+    
+    def synthesize(self, text, language='en', use_gtts=True):
         """
-        Convert text to speech using the preferred method
+        Get speech audio for text, from the TTS cache when it was synthesized before
         Args:
             text: Text to convert to speech
             language: Language code
             use_gtts: Whether to use gTTS (requires internet) or pyttsx3 (offline)
         Returns:
-            dict with 'audio_data', 'format', and 'error'
+            dict with 'audio_bytes', 'format', 'cache_key' and 'error'
         """
-        try:
-            if use_gtts:
-                # Try gTTS first (better quality, requires internet)
-                audio_data = self.text_to_speech_gtts(text, language)
-                if audio_data:
-                    return {
-                        'audio_data': base64.b64encode(audio_data).decode('utf-8'),
-                        'format': 'mp3',
-                        'error': None
-                    }
+        engines = []
+        if use_gtts and GTTS_AVAILABLE:
+            # Try gTTS first (better quality, requires internet)
+            engines.append(('gtts', 'mp3', GTTS_VOICE_PARAMS,
+                            lambda: self.text_to_speech_gtts(text, language, GTTS_VOICE_PARAMS['slow'])))
+        # Fallback to pyttsx3 (offline, lower quality)
+        engines.append(('pyttsx3', 'wav', PYTTSX3_VOICE_PARAMS,
+                        lambda: self.text_to_speech_pyttsx3(text, language)))
+        
+        for engine, audio_format, params, render in engines:
+            render = self._timed_render(engine, render)
+            cache_key = TTSCache.make_key(text, language, engine, params)
+            if self.tts_cache is not None:
+                result = self.tts_cache.get_or_create(cache_key, audio_format, render)
+            else:
+                audio_data = render()
+                result = (audio_data, audio_format) if audio_data else None
             
-            # Fallback to pyttsx3 (offline, lower quality)
-            audio_data = self.text_to_speech_pyttsx3(text, language)
-            if audio_data:
+            if result:
                 return {
-                    'audio_data': base64.b64encode(audio_data).decode('utf-8'),
-                    'format': 'wav',
+                    'audio_bytes': result[0],
+                    'format': result[1],
+                    'cache_key': cache_key,
                     'error': None
                 }
-            
+        
+        return {
+            'audio_bytes': None,
+            'format': None,
+            'cache_key': None,
+            'error': 'Failed to generate speech'
+        }
+    
+    def text_to_speech(self, text, language='en', use_gtts=True):
+        """
+        Convert text to speech using the preferred method
+        Args:
+            text: Text to convert to speech
+            language: Language code
+            use_gtts: Whether to use gTTS (requires internet) or pyttsx3 (offline)
+        Returns:
+            dict with 'audio_data', 'format', and 'error'
+        """
+        try:
+            result = self.synthesize(text, language, use_gtts)
             return {
-                'audio_data': None,
-                'format': None,
-                'error': 'Failed to generate speech'
+                'audio_data': base64.b64encode(result['audio_bytes']).decode('utf-8') if result['audio_bytes'] else None,
+                'format': result['format'],
+                'error': result['error']
             }
         except Exception as e:
             logger.error(f"Text to speech conversion failed: {e}")
@@ -389,25 +726,53 @@ class VoiceProcessor:
                 'error': str(e)
             }
     
-    def process_voice_input(self, audio_file_path):
+    def process_voice_input(self, audio_file_path, profile=None):
         """
         Process voice input: convert speech to text and detect language
         Args:
-            audio_file_path: Path to the audio file
+            audio_file_path: Path to the audio file (or uploaded audio bytes)
+            profile: Decoding profile name for this endpoint
         Returns:
             dict with transcription results
         """
         try:
             # Check if Whisper model is available
-            if not self.whisper_model:
+            if not self.stt_available():
                 logger.warning("Whisper model not available, using fallback")
                 return self._fallback_voice_processing(audio_file_path)
             
-            # First detect language
-            detected_language = self.detect_language(audio_file_path)
+            # Detect language and convert speech to text in a single pass
+            result = self.speech_to_text(audio_file_path, profile=profile)
             
-            # Convert speech to text
-            result = self.speech_to_text(audio_file_path, detected_language)
+            if result.get('busy'):
+                return {
+                    'success': False,
+                    'text': '',
+                    'language': 'en',
+                    'confidence': 0.0,
+                    'busy': True,
+                    'error': BUSY_MESSAGE
+                }
+            
+            if result.get('no_speech'):
+                # Nothing to decode, and nothing the browser fallback would do better
+                return {
+                    'success': False,
+                    'text': '',
+                    'language': result['language'],
+                    'confidence': 0.0,
+                    'error': NO_SPEECH_MESSAGE
+                }
+            
+            if result.get('too_long'):
+                return {
+                    'success': False,
+                    'text': '',
+                    'language': result['language'],
+                    'confidence': 0.0,
+                    'too_long': True,
+                    'error': result['error']
+                }
             
             if result.get('error'):
                 logger.warning(f"Whisper failed: {result['error']}, using fallback")
@@ -418,6 +783,7 @@ class VoiceProcessor:
                 'text': result['text'],
                 'language': result['language'],
                 'confidence': result['confidence'],
+                'timings': result.get('timings', {}),
                 'error': result.get('error')
             }
         except Exception as e:
@@ -436,7 +802,7 @@ class VoiceProcessor:
                 'text': '',
                 'language': 'en',
                 'confidence': 0.0,
-                'error': 'Server-side voice processing is not available. Please use the "CLICK & SPEAK" button which uses your browser\'s built-in speech recognition.'
+                'error': BROWSER_SPEECH_MESSAGE
             }
         except Exception as e:
             logger.error(f"Fallback voice processing failed: {e}")
@@ -479,3 +845,63 @@ class VoiceProcessor:
 
 # Global instance
 voice_processor = VoiceProcessor()
+if voice_processor.stt_pool is not None:
+    atexit.register(voice_processor.stt_pool.stop)
+
+
+def _collect_tts_cache_metrics():
+    """TTS cache counters for /metrics"""
+    if voice_processor.tts_cache is None:
+        return []
+    stats = voice_processor.tts_cache.get_stats()
+    return [
+        ('chatbot_tts_cache_lookups_total', 'counter', 'TTS cache lookups',
+         [({'result': 'memory_hit'}, stats['memory_hits']), ({'result': 'disk_hit'}, stats['disk_hits']),
+          ({'result': 'miss'}, stats['misses'])]),
+        ('chatbot_tts_cache_hit_ratio', 'gauge', 'TTS cache hit ratio (memory and disk)',
+         [({}, stats['hit_rate'])]),
+        ('chatbot_tts_cache_coalesced_total', 'counter', 'TTS requests that waited on an identical synthesis',
+         [({}, stats['coalesced'])]),
+        ('chatbot_tts_cache_bytes', 'gauge', 'Bytes held by the TTS cache',
+         [({'tier': 'memory'}, stats['memory_bytes']), ({'tier': 'disk'}, stats['disk_bytes'])]),
+    ]
+
+
+metrics_registry.register_collector(_collect_tts_cache_metrics)
+
+
+def _collect_stt_pool_metrics():
+    """Speech recognition queue depth, worker states and job outcomes for /metrics"""
+    if voice_processor.stt_pool is None:
+        return []
+    stats = voice_processor.stt_pool.get_stats()
+    return [
+        ('chatbot_stt_queue_depth', 'gauge', 'Speech recognition jobs waiting for a free worker',
+         [({}, stats['queue_depth'])]),
+        ('chatbot_stt_queue_capacity', 'gauge', 'Speech recognition jobs allowed to wait',
+         [({}, stats['max_queue'])]),
+        ('chatbot_stt_batch_max_size', 'gauge', 'Most speech recognition jobs batched together',
+         [({}, stats['max_batch'])]),
+        ('chatbot_stt_workers', 'gauge', 'Speech recognition worker processes by state',
+         [({'state': state}, count) for state, count in stats['workers'].items()]),
+        ('chatbot_stt_workers_asleep', 'gauge', 'Whether the workers were stopped after idling (restart on the next job)',
+         [({}, int(stats['asleep']))]),
+        ('chatbot_stt_jobs_total', 'counter', 'Speech recognition jobs by outcome',
+         [({'outcome': outcome}, count) for outcome, count in stats['jobs'].items()]),
+        ('chatbot_stt_worker_restarts_total', 'counter', 'Speech recognition workers killed and replaced',
+         [({}, stats['restarts'])]),
+    ]
+
+
+metrics_registry.register_collector(_collect_stt_pool_metrics)
+
+
+def warmup_speech_in_background():
+    """
+    Server startup hook: start the recognition workers (each loads and warms its
+    own model) or, without the pool, warm the models in this process
+    """
+    if voice_processor.stt_pool is not None:
+        voice_processor.stt_pool.start()
+        return None
+    return warmup_models_in_background(['whisper'])
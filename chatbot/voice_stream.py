@@ -0,0 +1,358 @@
+"""
+Streaming speech recognition over WebSocket (ASGI only)
+The browser sends 16-bit PCM frames while the user speaks. The VAD cuts the
+stream into utterances; while one is in progress it is decoded again every
+partial interval and the partial transcript pushed back, and as soon as the
+speaker pauses the utterance is decoded once more, the final transcript sent
+and the chatbot answer (search, reply, spoken reply) follows straight away.
+
+Protocol on /ws/voice/?language=<code>:
+    client -> server  binary: PCM16 little-endian mono frames (16 kHz unless
+                      the start message says otherwise)
+                      text: {"type": "start", "language": "kn", "sample_rate": 48000}
+                            {"type": "stop"}  (end of input: finish the utterance in progress)
+    server -> client  {"type": "ready", "sample_rate": 16000}
+                      {"type": "partial", "utterance": n, "text": ...}
+                      {"type": "final", "utterance": n, "text": ..., "language": ...}
+                      {"type": "response", "utterance": n, ...voice API response fields}
+                      {"type": "error", "utterance": n, "error": ..., "busy": ..., "too_long": ...,
+                       "use_browser_speech": ...}
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from collections import deque
+from importlib import import_module
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+from django.conf import settings
+from django.http.cookie import parse_cookie
+from django.http.request import split_domain_port, validate_host
+
+from .audio_decoding import SAMPLE_RATE
+from .chatbot_logic import chatbot
+from .metrics import finish_request, start_request
+from .offload import run_blocking
+from .vad import EnergyVAD
+from .views import _voice_response_data
+from .voice_processing import BROWSER_SPEECH_MESSAGE, BUSY_MESSAGE, voice_processor
+
+logger = logging.getLogger(__name__)
+
+VOICE_STREAM_PATH = '/ws/voice/'
+# Client sample rates accepted in the start message (telephone to studio audio)
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 96000
+
+
+class UtteranceSegmenter:
+    """Cuts a live audio stream into utterances and says when a partial decode is due"""
+
+    def __init__(self, vad: Optional[EnergyVAD] = None, start_ms: int = 90, end_silence_ms: int = 600,
+                 padding_ms: int = 240, partial_interval_ms: int = 1000, max_utterance_seconds: float = 30):
+        """
+        Args:
+            vad: Frame classifier (default: EnergyVAD at 16 kHz)
+            start_ms: Speech needed before an utterance starts
+            end_silence_ms: Silence that ends an utterance
+            padding_ms: Audio kept before the speech onset and after its end
+            partial_interval_ms: Speech between partial transcripts
+            max_utterance_seconds: Longest utterance; longer speech is cut here (Whisper's window is 30 s)
+        """
+        self.vad = vad or EnergyVAD()
+        frame_ms = self.vad.frame_ms
+        self.frame_samples = self.vad.frame_samples
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.end_frames = max(1, end_silence_ms // frame_ms)
+        self.padding_frames = padding_ms // frame_ms
+        self.partial_frames = max(1, partial_interval_ms // frame_ms)
+        self.max_frames = max(1, int(max_utterance_seconds * 1000) // frame_ms)
+        self._remainder = np.empty(0, dtype=np.float32)
+        self._preroll = deque(maxlen=self.padding_frames + self.start_frames)
+        self._frames: List[np.ndarray] = []
+        self._speech_run = 0
+        self._silence_run = 0
+        self._since_partial = 0
+        self.in_speech = False
+
+    def feed(self, samples: np.ndarray) -> List[Tuple[str, np.ndarray]]:
+        """
+        Add audio
+        Returns:
+            ('partial', utterance so far) and ('final', finished utterance) events, in order
+        """
+        samples = np.concatenate([self._remainder, samples])
+        whole = len(samples) // self.frame_samples * self.frame_samples
+        self._remainder = samples[whole:]
+        frames = samples[:whole].reshape(-1, self.frame_samples)
+        events = []
+        for frame, speech in zip(frames, self.vad.speech_frames(samples[:whole])):
+            if not self.in_speech:
+                self._preroll.append(frame)
+                self._speech_run = self._speech_run + 1 if speech else 0
+                if self._speech_run >= self.start_frames:
+                    self.in_speech = True
+                    self._frames = list(self._preroll)
+                    self._preroll.clear()
+                continue
+
+            self._frames.append(frame)
+            self._since_partial += 1
+            self._silence_run = 0 if speech else self._silence_run + 1
+            if self._silence_run >= self.end_frames or len(self._frames) >= self.max_frames:
+                events.append(('final', self._finish()))
+            elif speech and self._since_partial >= self.partial_frames:
+                # Not during a pause: that audio would only repeat the last partial
+                self._since_partial = 0
+                events.append(('partial', np.concatenate(self._frames)))
+        return events
+
+    def flush(self) -> Optional[np.ndarray]:
+        """End of input: the utterance in progress, if any"""
+        return self._finish() if self.in_speech else None
+
+    def _finish(self) -> np.ndarray:
+        # Keep only `padding` of the silence that ended the utterance
+        keep = len(self._frames) - max(0, self._silence_run - self.padding_frames)
+        audio = np.concatenate(self._frames[:keep])
+        self._frames = []
+        self._speech_run = self._silence_run = self._since_partial = 0
+        self.in_speech = False
+        return audio
+
+
+def pcm16_to_float(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype='<i2').astype(np.float32) / 32768.0
+
+
+def _sample_rate(value) -> Optional[int]:
+    """A client-supplied sample rate as an int, or None when it is not a number in the accepted range"""
+    try:
+        sample_rate = int(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return sample_rate if MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE else None
+
+
+def resample(samples: np.ndarray, sample_rate: int) -> np.ndarray:
+    """Linear resampling to 16 kHz (enough for speech recognition)"""
+    if sample_rate == SAMPLE_RATE or len(samples) == 0:
+        return samples
+    count = int(round(len(samples) * SAMPLE_RATE / sample_rate))
+    positions = np.linspace(0, len(samples) - 1, count)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+class VoiceStream:
+    """One WebSocket connection: segments the audio and answers each utterance in turn"""
+
+    def __init__(self, send, context, language: Optional[str] = None):
+        """
+        Args:
+            send: ASGI send callable
+            context: Chat context the exchanges are logged to
+            language: Language code, or None to detect it per utterance
+        """
+        self._send = send
+        self._send_lock = asyncio.Lock()
+        self.context = context
+        self.language = language
+        self.sample_rate = SAMPLE_RATE
+        self.segmenter = UtteranceSegmenter(
+            vad=EnergyVAD(threshold_db=settings.VOICE_VAD_THRESHOLD_DB),
+            end_silence_ms=settings.VOICE_STREAM_END_SILENCE_MS,
+            partial_interval_ms=settings.VOICE_STREAM_PARTIAL_INTERVAL_MS,
+            max_utterance_seconds=settings.VOICE_STREAM_MAX_UTTERANCE_SECONDS
+        )
+        self._pcm_remainder = b''
+        # Utterance being spoken; earlier ones are finished
+        self._utterance = 1
+        self._partial_task: Optional[asyncio.Task] = None
+        self._finals: asyncio.Queue = asyncio.Queue()
+        self._answerer = asyncio.create_task(self._answer_utterances())
+
+    async def send_json(self, data: Dict):
+        async with self._send_lock:
+            await self._send({'type': 'websocket.send', 'text': json.dumps(data)})
+
+    async def control(self, message: Dict):
+        """Handle a client text message"""
+        if message.get('type') == 'start':
+            self.language = message.get('language') or self.language
+            sample_rate = _sample_rate(message.get('sample_rate', SAMPLE_RATE))
+            if sample_rate is None:
+                # Keep the current rate: a bad value must not break resampling of the frames that follow
+                await self.send_json({
+                    'type': 'error',
+                    'error': f"Unsupported sample rate (expected {MIN_SAMPLE_RATE}-{MAX_SAMPLE_RATE} Hz)"
+                })
+            else:
+                self.sample_rate = sample_rate
+        elif message.get('type') == 'stop':
+            audio = self.segmenter.flush()
+            if audio is not None:
+                self._finish_utterance(audio)
+
+    def feed(self, data: bytes):
+        """Handle a binary audio frame"""
+        data = self._pcm_remainder + data
+        whole = len(data) - len(data) % 2
+        self._pcm_remainder = data[whole:]
+        samples = resample(pcm16_to_float(data[:whole]), self.sample_rate)
+        for kind, audio in self.segmenter.feed(samples):
+            if kind == 'final':
+                self._finish_utterance(audio)
+            elif self._partial_task is None or self._partial_task.done():
+                # One partial decode at a time; partials due meanwhile are skipped
+                self._partial_task = asyncio.create_task(self._send_partial(self._utterance, audio))
+
+    def _finish_utterance(self, audio: np.ndarray):
+        self._finals.put_nowait((self._utterance, audio))
+        self._utterance += 1
+
+    async def _send_partial(self, utterance: int, audio: np.ndarray):
+        try:
+            result = await run_blocking(voice_processor.transcribe, audio, self.language,
+                                        settings.STT_DECODING_PROFILES['voice_stream_partial'])
+        except Exception as e:
+            # Busy or failed: the final transcript still comes
+            logger.debug(f"Partial transcript skipped: {e}")
+            return
+        if utterance == self._utterance and result['text']:
+            await self.send_json({'type': 'partial', 'utterance': utterance, 'text': result['text']})
+
+    async def _answer_utterances(self):
+        while True:
+            utterance, audio = await self._finals.get()
+            timings, token = start_request()
+            status = 200
+            try:
+                status = await self._answer(utterance, audio)
+            except Exception as e:
+                status = 500
+                logger.error(f"Voice stream error: {e}")
+                await self.send_json({'type': 'error', 'utterance': utterance, 'error': str(e)})
+            finally:
+                finish_request(timings, token, 'voice_stream', 'WS', status)
+
+    async def _answer(self, utterance: int, audio: np.ndarray) -> int:
+        stt_result = await run_blocking(voice_processor.speech_to_text, audio, self.language,
+                                        settings.STT_DECODING_PROFILES['voice_stream'])
+        if stt_result.get('too_long'):
+            await self.send_json({
+                'type': 'error',
+                'utterance': utterance,
+                'error': stt_result['error'],
+                'too_long': True,
+                'busy': False,
+                'use_browser_speech': False
+            })
+            return 413
+        if stt_result.get('error') and not stt_result.get('no_speech'):
+            busy = stt_result.get('busy', False)
+            logger.warning(f"Voice stream recognition failed: {stt_result['error']}")
+            await self.send_json({
+                'type': 'error',
+                'utterance': utterance,
+                'error': BUSY_MESSAGE if busy else BROWSER_SPEECH_MESSAGE,
+                'busy': busy,
+                'use_browser_speech': True
+            })
+            return 503 if busy else 500
+
+        await self.send_json({
+            'type': 'final',
+            'utterance': utterance,
+            'text': stt_result['text'],
+            'language': stt_result['language'],
+            'stt_timings': stt_result.get('timings', {})
+        })
+        if not stt_result['text']:
+            return 200
+
+        result = await chatbot.arespond_to_speech(stt_result, context=self.context)
+        await self.send_json({'type': 'response', 'utterance': utterance, **_voice_response_data(result, False)})
+        return 200
+
+    def close(self):
+        """Stop answering (the client has gone)"""
+        self._answerer.cancel()
+        if self._partial_task is not None:
+            self._partial_task.cancel()
+
+
+def _host_allowed(headers: Dict[str, str]) -> bool:
+    """Django's ALLOWED_HOSTS check (the HTTP handler does it for ordinary requests)"""
+    allowed_hosts = settings.ALLOWED_HOSTS
+    if settings.DEBUG and not allowed_hosts:
+        allowed_hosts = ['.localhost', '127.0.0.1', '[::1]']
+    domain, _ = split_domain_port(headers.get('host', ''))
+    if not domain or not validate_host(domain, allowed_hosts):
+        return False
+    # Browsers always send Origin on WebSocket handshakes; only same-host pages may stream unless CORS allows all
+    origin = headers.get('origin')
+    if origin and not getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False):
+        return split_domain_port(urlsplit(origin).netloc)[0] == domain
+    return True
+
+
+async def _session_id(headers: Dict[str, str]) -> str:
+    """Chat session ID from the Django session cookie, as the HTTP voice views use it"""
+    session_key = parse_cookie(headers.get('cookie', '')).get(settings.SESSION_COOKIE_NAME)
+    if session_key:
+        store = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+        session_id = await store.aget('session_id')
+        if session_id:
+            return session_id
+    return str(uuid.uuid4())
+
+
+async def voice_stream_application(scope, receive, send):
+    """ASGI application for WebSocket connections (asgi.py routes them here)"""
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+    if not settings.VOICE_STREAM_ENABLED or scope['path'] != VOICE_STREAM_PATH:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    if not _host_allowed(headers):
+        await send({'type': 'websocket.close', 'code': 4403})
+        return
+
+    await send({'type': 'websocket.accept'})
+    if not await run_blocking(voice_processor.stt_available):
+        # Tell the client to switch to browser speech recognition instead of streaming into the void
+        await send({'type': 'websocket.send', 'text': json.dumps({
+            'type': 'error', 'error': BROWSER_SPEECH_MESSAGE, 'use_browser_speech': True
+        })})
+        await send({'type': 'websocket.close', 'code': 1013})
+        return
+
+    language = parse_qs(scope.get('query_string', b'').decode()).get('language', [None])[0]
+    context = chatbot.get_context(await _session_id(headers), language or 'en')
+    stream = VoiceStream(send, context, language)
+    await stream.send_json({'type': 'ready', 'sample_rate': SAMPLE_RATE})
+
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            if message.get('bytes') is not None:
+                stream.feed(message['bytes'])
+            elif message.get('text'):
+                try:
+                    control = json.loads(message['text'])
+                except json.JSONDecodeError:
+                    control = None
+                if not isinstance(control, dict):
+                    await stream.send_json({'type': 'error', 'error': 'Invalid JSON message'})
+                    continue
+                await stream.control(control)
+    finally:
+        stream.close()
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 import pymongo
 from datetime import datetime
+from mongodb_adapter import bump_corpus_version, prepare_scheme_document
 
 # Connect to MongoDB
 client = pymongo.MongoClient('mongodb://localhost:27017/')
@@ -125,11 +126,16 @@ kannada_schemes = [
 # Add correct Kannada schemes
 added = 0
 for scheme in kannada_schemes:
+    prepare_scheme_document(scheme)
     if not schemes.find_one({"title": scheme["title"]}):
         schemes.insert_one(scheme)
         added += 1
         print(f"✅ Added: {scheme['title']}")
 
+if added:
+    # Invalidate cached query results in running servers
+    bump_corpus_version(db)
+
 print(f"\n🎉 Successfully added {added} correct Kannada schemes!")
 print(f"📊 Total schemes in database: {schemes.count_documents({})}")
 
@@ -15,11 +15,11 @@ try:
     print(f"Language: {language}")
     print(f"Session ID: {session_id}")
     
-    # Set chatbot session
-    chatbot.set_session(session_id)
+    # Session for this query
+    context = chatbot.get_context(session_id, language)
     
     # Process query
-    result = chatbot.process_query(query, language)
+    result = chatbot.process_query(query, language, context=context)
     
     print(f"Result success: {result['success']}")
     print(f"Result keys: {result.keys()}")
@@ -17,7 +17,6 @@ print(f'Response: {result["response"]["text"]}')
 
 # Debug the search process
 print('\nDebugging search process:')
-chatbot.set_language('en')
 intent = chatbot._analyze_intent(query)
 keywords = chatbot._extract_keywords(query)
 entities = chatbot._extract_entities(query)
@@ -11,8 +11,7 @@ print(f'Testing query: "{query}"')
 print('=' * 50)
 
 # Set up chatbot
-chatbot.set_language('en')
-chatbot.set_session('test-session-123')
+context = chatbot.get_context('test-session-123', 'en')
 
 # Process query step by step
 intent = chatbot._analyze_intent(query)
@@ -35,7 +34,7 @@ print(f'Scheme count: {response["scheme_count"]}')
 
 # Test full process
 print(f'\nFull process result:')
-result = chatbot.process_query(query, 'en')
+result = chatbot.process_query(query, 'en', context=context)
 print(f'Success: {result["success"]}')
 print(f'Response type: {type(result["response"])}')
 print(f'Response text: {result["response"]["text"]}')
@@ -7,7 +7,6 @@ from chatbot.models import GovernmentScheme
 
 # Test the search function step by step
 query = 'What employment schemes are there?'
-chatbot.set_language('en')
 intent = chatbot._analyze_intent(query)
 keywords = chatbot._extract_keywords(query)
 entities = chatbot._extract_entities(query)
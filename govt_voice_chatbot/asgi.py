@@ -12,5 +12,32 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'govt_voice_chatbot.settings')
+# Under ASGI the chat, search and voice endpoints use the native async views
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from chatbot.voice_stream import voice_stream_application
+
+
+async def application(scope, receive, send):
+    # WebSockets (streaming speech recognition) bypass Django's HTTP handler
+    if scope['type'] == 'websocket':
+        await voice_stream_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
+
+
+# Warm the speech models in the background (or start the recognition worker
+# processes) so this worker reports ready (see /api/health/voice/) without the
+# first voice request paying for the load
+from django.conf import settings
+
+if settings.VOICE_WARMUP_ON_STARTUP:
+    from chatbot.voice_processing import warmup_speech_in_background
+    warmup_speech_in_background()
+
+# Synthesize the fixed replies once so greeting/help/error audio never waits on TTS
+if settings.TTS_CACHE_ENABLED and settings.TTS_CACHE_PREWARM:
+    from chatbot.chatbot_logic import prewarm_voice_responses_in_background
+    prewarm_voice_responses_in_background()
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'chatbot.middleware.RequestTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -93,7 +94,32 @@ DATABASES = {
 
 # MongoDB connection for direct access
 MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
-MONGODB_DATABASE = 'Govt_schemes'  # Keep case consistent with existing database
+MONGODB_DATABASE = os.getenv('MONGODB_DATABASE', 'Govt_schemes')  # Keep case consistent with existing database
+
+# Shared MongoClient pool (one client per worker process, see mongodb_adapter.get_mongo_client)
+MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', '50'))
+MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', '0'))
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', '60000'))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', '5000'))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv('MONGODB_SOCKET_TIMEOUT_MS', '10000'))
+
+# Scheme search engine: 'regex' (MongoDB regex scan), 'bm25' (in-memory inverted index)
+# or 'text' (MongoDB $text index; run setup_mongodb.py to create it)
+SCHEME_SEARCH_ENGINE = os.getenv('SCHEME_SEARCH_ENGINE', 'regex')
+# Build the BM25 index when the app starts instead of on the first query
+SCHEME_SEARCH_INDEX_PRELOAD = os.getenv('SCHEME_SEARCH_INDEX_PRELOAD', 'True') == 'True'
+# How often a background thread checks the corpus version and applies changed schemes to
+# the index (0 = never)
+SCHEME_SEARCH_INDEX_REFRESH_SECONDS = int(os.getenv('SCHEME_SEARCH_INDEX_REFRESH_SECONDS', '60'))
+
+# Query result cache in front of GovernmentChatbot.process_query
+QUERY_CACHE_ENABLED = os.getenv('QUERY_CACHE_ENABLED', 'True') == 'True'
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv('QUERY_CACHE_MAX_ENTRIES', '2048'))
+QUERY_CACHE_TTL_SECONDS = int(os.getenv('QUERY_CACHE_TTL_SECONDS', '300'))
+# How often the cache polls MongoDB for a new scheme corpus version
+QUERY_CACHE_VERSION_CHECK_SECONDS = float(os.getenv('QUERY_CACHE_VERSION_CHECK_SECONDS', '5'))
 
 
 # Password validation
@@ -138,6 +164,120 @@ LOCALE_PATHS = [
     BASE_DIR / 'locale',
 ]
 
+# Languages Whisper's language detection may pick for voice queries
+VOICE_SUPPORTED_LANGUAGES = ['en', 'hi', 'kn', 'ta', 'te', 'ml', 'mr', 'bn', 'gu', 'pa']
+
+# Whisper model size; empty picks 'tiny' on Windows and 'base' elsewhere
+WHISPER_MODEL = os.getenv('WHISPER_MODEL', '')
+# Runtime for Whisper: 'whisper' (openai-whisper, PyTorch fp32) or 'ctranslate2' (faster-whisper);
+# with 'ctranslate2', WHISPER_MODEL may also be a directory holding a converted model
+STT_ENGINE = os.getenv('STT_ENGINE', 'whisper')
+# CTranslate2 weight type; int8 is the fast choice on CPU-only hosts
+STT_COMPUTE_TYPE = os.getenv('STT_COMPUTE_TYPE', 'int8')
+# CTranslate2 threads per model (0 = its default); keep workers x threads within the cores
+STT_CPU_THREADS = int(os.getenv('STT_CPU_THREADS', '0'))
+# openai-whisper engine: keep an fp32 copy of each checkpoint in STT_MMAP_DIR and memory-map it,
+# so pool workers (and web workers) share one copy of the weights instead of one each.
+# The copy is written on first load; run `manage.py warmup_models` at deploy time to do it once
+STT_MMAP_WEIGHTS = os.getenv('STT_MMAP_WEIGHTS', 'True') == 'True'
+STT_MMAP_DIR = os.getenv('STT_MMAP_DIR', os.path.join(
+    os.getenv('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'whisper', 'mmap'
+))
+# Whisper decoding profile per endpoint: fast, balanced or accurate (beam size, temperature
+# fallback, token cap and time budget; see chatbot/stt_engines.py)
+STT_DECODING_PROFILES = {
+    'voice': os.getenv('STT_PROFILE_VOICE', 'balanced'),
+    'voice_stream': os.getenv('STT_PROFILE_VOICE_STREAM', 'fast'),
+    'voice_stream_partial': os.getenv('STT_PROFILE_VOICE_STREAM_PARTIAL', 'fast'),
+}
+# Adaptive routing: transcribe with this small model first and only re-run WHISPER_MODEL on
+# clips Whisper is unsure of (or long ones); empty or equal to WHISPER_MODEL turns it off, and
+# only WHISPER_MODEL is kept if both do not fit MODEL_MEMORY_BUDGET_MB
+STT_ROUTER_ENABLED = os.getenv('STT_ROUTER_ENABLED', 'True') == 'True'
+STT_ROUTER_SMALL_MODEL = os.getenv('STT_ROUTER_SMALL_MODEL', 'tiny')
+# Escalate when the small model's mean token log-probability is below this...
+STT_ROUTER_MIN_AVG_LOGPROB = float(os.getenv('STT_ROUTER_MIN_AVG_LOGPROB', '-1.0'))
+# ...or its no-speech probability above this
+STT_ROUTER_MAX_NO_SPEECH_PROB = float(os.getenv('STT_ROUTER_MAX_NO_SPEECH_PROB', '0.6'))
+# Clips longer than this go straight to the large model
+STT_ROUTER_LONG_CLIP_SECONDS = float(os.getenv('STT_ROUTER_LONG_CLIP_SECONDS', '8'))
+# Trim leading/trailing silence before speech recognition and skip clips with no speech
+VOICE_VAD_ENABLED = os.getenv('VOICE_VAD_ENABLED', 'True') == 'True'
+# Frames quieter than this (dBFS) are never speech; raise it for noisy kiosks
+VOICE_VAD_THRESHOLD_DB = float(os.getenv('VOICE_VAD_THRESHOLD_DB', '-45'))
+VOICE_VAD_PADDING_MS = int(os.getenv('VOICE_VAD_PADDING_MS', '240'))
+# Longest speech (after trimming) accepted for recognition; one Whisper window
+VOICE_MAX_SPEECH_SECONDS = float(os.getenv('VOICE_MAX_SPEECH_SECONDS', '30'))
+# Load and warm the speech models when a WSGI/ASGI worker starts (management commands never load them)
+VOICE_WARMUP_ON_STARTUP = os.getenv('VOICE_WARMUP_ON_STARTUP', 'True') == 'True'
+# Prometheus text endpoint at /metrics and per-stage Server-Timing headers on responses
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+# Clients allowed to scrape /metrics (comma-separated REMOTE_ADDRs, '*' for any)...
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()]
+# ...or any client sending "Authorization: Bearer <token>" when a token is set
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', 'True') == 'True'
+
+# Chat messages are queued and written in batches by a background thread
+CHAT_LOG_ASYNC = os.getenv('CHAT_LOG_ASYNC', 'True') == 'True'
+CHAT_LOG_MAX_QUEUE_SIZE = int(os.getenv('CHAT_LOG_MAX_QUEUE_SIZE', '10000'))
+CHAT_LOG_BATCH_SIZE = int(os.getenv('CHAT_LOG_BATCH_SIZE', '200'))
+CHAT_LOG_FLUSH_INTERVAL_SECONDS = float(os.getenv('CHAT_LOG_FLUSH_INTERVAL_SECONDS', '1.0'))
+# 'drop_newest' or 'drop_oldest' when the queue is full
+CHAT_LOG_OVERFLOW_POLICY = os.getenv('CHAT_LOG_OVERFLOW_POLICY', 'drop_newest')
+
+# Synthesized speech cache: in-memory LRU backed by a size-bounded directory shared by workers
+TTS_CACHE_ENABLED = os.getenv('TTS_CACHE_ENABLED', 'True') == 'True'
+TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', str(BASE_DIR / 'tts_cache'))
+TTS_CACHE_MAX_MEMORY_BYTES = int(os.getenv('TTS_CACHE_MAX_MEMORY_BYTES', str(32 * 1024 * 1024)))
+TTS_CACHE_MAX_DISK_BYTES = int(os.getenv('TTS_CACHE_MAX_DISK_BYTES', str(256 * 1024 * 1024)))
+# Synthesize the fixed replies (greeting, help, no results, error) in every language at startup
+TTS_CACHE_PREWARM = os.getenv('TTS_CACHE_PREWARM', 'True') == 'True'
+# Voice responses are served by URL from this directory and deleted after the TTL
+VOICE_AUDIO_DIR = os.getenv('VOICE_AUDIO_DIR', str(BASE_DIR / 'voice_audio'))
+VOICE_AUDIO_TTL_SECONDS = int(os.getenv('VOICE_AUDIO_TTL_SECONDS', '3600'))
+VOICE_AUDIO_CLEANUP_INTERVAL_SECONDS = int(os.getenv('VOICE_AUDIO_CLEANUP_INTERVAL_SECONDS', '300'))
+# Also embed the audio as base64 in voice API responses (old clients); clients can ask per request
+VOICE_AUDIO_BASE64_DEFAULT = os.getenv('VOICE_AUDIO_BASE64_DEFAULT', 'False') == 'True'
+# Keep voice uploads (max 10MB) in memory so they are decoded without a disk round-trip
+FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
+
+# Serve chat, search and voice from native async views (set by asgi.py; sync views under WSGI)
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+# Threads that run speech recognition and synthesis for the async views
+VOICE_OFFLOAD_WORKERS = int(os.getenv('VOICE_OFFLOAD_WORKERS', '4'))
+
+# Run Whisper in a fixed pool of worker processes (one model each) instead of request threads
+STT_POOL_ENABLED = os.getenv('STT_POOL_ENABLED', 'True') == 'True'
+STT_POOL_WORKERS = int(os.getenv('STT_POOL_WORKERS', '2'))
+# Jobs that may wait for a free worker; beyond that voice requests get a 503 (use browser speech)
+STT_POOL_MAX_QUEUE = int(os.getenv('STT_POOL_MAX_QUEUE', '8'))
+# A job not finished this long after submission fails and its worker is restarted
+STT_JOB_TIMEOUT_SECONDS = float(os.getenv('STT_JOB_TIMEOUT_SECONDS', '60'))
+# Jobs arriving within this window of the oldest queued one go to a worker as one batch
+STT_BATCH_WINDOW_MS = float(os.getenv('STT_BATCH_WINDOW_MS', '30'))
+STT_BATCH_MAX_SIZE = int(os.getenv('STT_BATCH_MAX_SIZE', '8'))
+
+# Model lifecycle: after this many seconds without a request, stop the recognition workers (or
+# unload Whisper from this process without the pool) and the pyttsx3 engine; 0 keeps them loaded
+MODEL_IDLE_SECONDS = float(os.getenv('MODEL_IDLE_SECONDS', '1800'))
+# The first request after an unload: 'wait' (it waits for the reload, within its time budget) or
+# 'reject' (turned away at once while the reload runs: voice falls back to browser speech and
+# offline TTS is skipped)
+MODEL_COLD_START = os.getenv('MODEL_COLD_START', 'wait')
+# Memory the models loaded in one process may hold together (resident, so shared mapped weights
+# count in every worker): loading one past it unloads the least recently used others first, and
+# adaptive routing keeps only WHISPER_MODEL if both Whisper models do not fit. 0 = no limit.
+# STT_MODEL_MEMORY_BUDGET_MB is the older name, read when this one is not set
+MODEL_MEMORY_BUDGET_MB = int(os.getenv('MODEL_MEMORY_BUDGET_MB', os.getenv('STT_MODEL_MEMORY_BUDGET_MB', '0')))
+
+# Streaming speech recognition over WebSocket at /ws/voice/ (ASGI only)
+VOICE_STREAM_ENABLED = os.getenv('VOICE_STREAM_ENABLED', 'True') == 'True'
+# Pause that ends an utterance and triggers the final transcript and the answer
+VOICE_STREAM_END_SILENCE_MS = int(os.getenv('VOICE_STREAM_END_SILENCE_MS', '600'))
+VOICE_STREAM_PARTIAL_INTERVAL_MS = int(os.getenv('VOICE_STREAM_PARTIAL_INTERVAL_MS', '1000'))
+VOICE_STREAM_MAX_UTTERANCE_SECONDS = float(os.getenv('VOICE_STREAM_MAX_UTTERANCE_SECONDS', '30'))
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
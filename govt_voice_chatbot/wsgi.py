@@ -14,3 +14,17 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'govt_voice_chatbot.settings')
 
 application = get_wsgi_application()
+
+# Warm the speech models in the background (or start the recognition worker
+# processes) so this worker reports ready (see /api/health/voice/) without the
+# first voice request paying for the load
+from django.conf import settings
+
+if settings.VOICE_WARMUP_ON_STARTUP:
+    from chatbot.voice_processing import warmup_speech_in_background
+    warmup_speech_in_background()
+
+# Synthesize the fixed replies once so greeting/help/error audio never waits on TTS
+if settings.TTS_CACHE_ENABLED and settings.TTS_CACHE_PREWARM:
+    from chatbot.chatbot_logic import prewarm_voice_responses_in_background
+    prewarm_voice_responses_in_background()
@@ -0,0 +1,106 @@
+"""
+Per-process memory of the speech recognition workers, split into unique and shared pages
+
+Starts a speech recognition worker pool the way the web process does, waits until every
+worker has loaded and warmed its model, and reads /proc/<pid>/smaps of each (Linux only):
+    python measure_stt_memory.py --workers 4
+    python measure_stt_memory.py --workers 4 --no-mmap      (private weights, to compare)
+    python measure_stt_memory.py --pids 1234 1235           (running processes, e.g. gunicorn workers)
+Reported per process, in MB:
+    RSS       resident memory (what `ps` and the memory budget see)
+    unique    pages no other process maps; stopping the process frees this much
+    shared    resident pages other processes map too
+    PSS       RSS with each shared page divided between the processes sharing it
+    weights   resident pages of memory-mapped model weights (STT_MMAP_DIR)
+The PSS total is what the processes cost together.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+
+def smaps(pid: int, weights_dir: str) -> dict:
+    """Resident, unique, shared, proportional and mapped-weights memory of one process, in MB"""
+    totals = {'rss': 0, 'unique': 0, 'shared': 0, 'pss': 0, 'weights': 0}
+    in_weights = False
+    with open(f'/proc/{pid}/smaps') as lines:
+        for line in lines:
+            key, _, value = line.partition(':')
+            if ' ' in key:
+                # Mapping header: address perms offset device inode [path]
+                fields = line.split(maxsplit=5)
+                in_weights = len(fields) == 6 and fields[5].strip().startswith(weights_dir)
+                continue
+            if key == 'Rss':
+                totals['rss'] += int(value.split()[0])
+                if in_weights:
+                    totals['weights'] += int(value.split()[0])
+            elif key == 'Pss':
+                totals['pss'] += int(value.split()[0])
+            elif key in ('Private_Clean', 'Private_Dirty'):
+                totals['unique'] += int(value.split()[0])
+            elif key in ('Shared_Clean', 'Shared_Dirty'):
+                totals['shared'] += int(value.split()[0])
+    return {key: kilobytes / 1024 for key, kilobytes in totals.items()}
+
+
+def start_workers(workers: int, timeout: float):
+    """Start a worker pool and wait until no worker is still loading"""
+    from chatbot.stt_pool import STARTING, STTWorkerPool
+
+    pool = STTWorkerPool(workers=workers)
+    pool.start()
+    deadline = time.monotonic() + timeout
+    while pool.get_stats()['workers'][STARTING] and time.monotonic() < deadline:
+        time.sleep(0.5)
+    return pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: STT_POOL_WORKERS)')
+    parser.add_argument('--no-mmap', action='store_true', help='Load private weights (STT_MMAP_WEIGHTS=False)')
+    parser.add_argument('--pids', type=int, nargs='+', help='Measure these processes instead of starting workers')
+    parser.add_argument('--timeout', type=float, default=600, help='Seconds to wait for the workers to load')
+    args = parser.parse_args()
+
+    if args.no_mmap:
+        # Read by the settings of this process and of the workers it spawns
+        os.environ['STT_MMAP_WEIGHTS'] = 'False'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'govt_voice_chatbot.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+
+    pool = None
+    pids = args.pids
+    if not pids:
+        pool = start_workers(args.workers or settings.STT_POOL_WORKERS, args.timeout)
+        stats = pool.get_stats()
+        if not stats['workers']['idle']:
+            print(f"No worker loaded its model: {stats['last_error']}", file=sys.stderr)
+            pool.stop()
+            sys.exit(1)
+        pids = pool.worker_pids()
+
+    try:
+        rows = [(pid, smaps(pid, settings.STT_MMAP_DIR)) for pid in pids]
+    finally:
+        if pool is not None:
+            pool.stop()
+
+    mapped = settings.STT_MMAP_WEIGHTS and not args.pids
+    print(f"{len(rows)} process(es), weights {'memory-mapped' if mapped else 'private' if pool else 'as loaded'}")
+    print(f"{'pid':>8} {'RSS':>8} {'unique':>8} {'shared':>8} {'PSS':>8} {'weights':>8}")
+    for pid, usage in rows:
+        print(f"{pid:>8} {usage['rss']:>8.0f} {usage['unique']:>8.0f} {usage['shared']:>8.0f} "
+              f"{usage['pss']:>8.0f} {usage['weights']:>8.0f}")
+    totals = {key: sum(usage[key] for _, usage in rows) for key in ('rss', 'unique', 'shared', 'pss', 'weights')}
+    print(f"{'total':>8} {totals['rss']:>8.0f} {totals['unique']:>8.0f} {totals['shared']:>8.0f} "
+          f"{totals['pss']:>8.0f} {totals['weights']:>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
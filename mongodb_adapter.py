@@ -1,74 +1,746 @@
+import asyncio
 import os
+import re
+import threading
+import time
+import weakref
 import pymongo
+from pymongo import monitoring
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+
+# Native asyncio client (pymongo 4.10+) used by the async views
+try:
+    from pymongo import AsyncMongoClient
+    ASYNC_MONGO_AVAILABLE = True
+except ImportError:
+    AsyncMongoClient = None
+    ASYNC_MONGO_AVAILABLE = False
+
+from chatbot.metrics import metrics_registry
+from chatbot.query_compiler import (
+    MAX_QUERY_LENGTH, SEARCH_TERMS_FIELD, SEARCH_TERMS_SOURCE_FIELDS, build_search_terms, query_compiler
+)
+
+# Connection defaults, overridable through Django settings or environment variables
+DEFAULT_MONGODB_URI = 'mongodb://localhost:27017/'
+DEFAULT_MONGODB_DATABASE = 'Govt_schemes'  # Match case with existing database
+DEFAULT_POOL_OPTIONS = {
+    'MONGODB_MAX_POOL_SIZE': 50,
+    'MONGODB_MIN_POOL_SIZE': 0,
+    'MONGODB_MAX_IDLE_TIME_MS': 60000,
+    'MONGODB_WAIT_QUEUE_TIMEOUT_MS': 2000,
+    'MONGODB_SERVER_SELECTION_TIMEOUT_MS': 5000,
+    'MONGODB_CONNECT_TIMEOUT_MS': 5000,
+    'MONGODB_SOCKET_TIMEOUT_MS': 10000,
+}
+
+
+def _get_setting(name: str, default=None):
+    """Read a setting from Django when configured, otherwise from the environment"""
+    try:
+        from django.conf import settings
+        if settings.configured:
+            return getattr(settings, name, os.getenv(name, default))
+    except ImportError:
+        pass
+    return os.getenv(name, default)
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Counts connection pool events so pool usage can be reported"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.connections_created = 0
+            self.connections_closed = 0
+            self.checked_out = 0
+            self.max_checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.pool_clears = 0
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+    
+    def connection_ready(self, event):
+        pass
+    
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+    
+    def connection_check_out_started(self, event):
+        pass
+    
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+    
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+    
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+    
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'connections_open': self.connections_created - self.connections_closed,
+                'connections_created': self.connections_created,
+                'connections_closed': self.connections_closed,
+                'checked_out': self.checked_out,
+                'max_checked_out': self.max_checked_out,
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'pool_clears': self.pool_clears,
+            }
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """Counts MongoDB commands (find, aggregate, ...) and their server time"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.commands = {}
+    
+    def _record(self, event, failed: bool):
+        with self._lock:
+            stats = self.commands.setdefault(event.command_name, {'count': 0, 'failures': 0, 'seconds': 0.0})
+            stats['count'] += 1
+            stats['seconds'] += event.duration_micros / 1e6
+            if failed:
+                stats['failures'] += 1
+    
+    def started(self, event):
+        pass
+    
+    def succeeded(self, event):
+        self._record(event, failed=False)
+    
+    def failed(self, event):
+        self._record(event, failed=True)
+    
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {name: dict(stats) for name, stats in self.commands.items()}
+
+
+# Process-wide client registry. A MongoClient is thread-safe and owns the
+# connection pool, so one instance per process is shared by every request.
+_registry_lock = threading.Lock()
+_registry = {'pid': None, 'client': None, 'adapter': None}
+_pool_monitor = PoolMonitor()
+_command_monitor = CommandMonitor()
+
+
+def get_pool_options() -> Dict:
+    """Get the pool and timeout options used for the shared client"""
+    return {name: int(_get_setting(name, default)) for name, default in DEFAULT_POOL_OPTIONS.items()}
+
+
+def get_mongo_client() -> pymongo.MongoClient:
+    """Get the shared MongoClient, creating it on first use in this process"""
+    client = _registry['client']
+    if client is not None and _registry['pid'] == os.getpid():
+        return client
+    
+    with _registry_lock:
+        if _registry['client'] is None or _registry['pid'] != os.getpid():
+            options = get_pool_options()
+            # Clients inherited across fork() must not be reused, so start fresh
+            _pool_monitor.reset()
+            _command_monitor.reset()
+            _registry['adapter'] = None
+            _registry['client'] = pymongo.MongoClient(
+                _get_setting('MONGODB_URI', DEFAULT_MONGODB_URI),
+                maxPoolSize=options['MONGODB_MAX_POOL_SIZE'],
+                minPoolSize=options['MONGODB_MIN_POOL_SIZE'],
+                maxIdleTimeMS=options['MONGODB_MAX_IDLE_TIME_MS'],
+                waitQueueTimeoutMS=options['MONGODB_WAIT_QUEUE_TIMEOUT_MS'],
+                serverSelectionTimeoutMS=options['MONGODB_SERVER_SELECTION_TIMEOUT_MS'],
+                connectTimeoutMS=options['MONGODB_CONNECT_TIMEOUT_MS'],
+                socketTimeoutMS=options['MONGODB_SOCKET_TIMEOUT_MS'],
+                event_listeners=[_pool_monitor, _command_monitor],
+                connect=False,
+            )
+            _registry['pid'] = os.getpid()
+        return _registry['client']
+
+
+# Async clients belong to the event loop they were created on, so each loop
+# gets its own (one loop per ASGI worker, one per call for async views under WSGI)
+_async_adapters = weakref.WeakKeyDictionary()
+_async_lock = threading.Lock()
+
+
+def get_async_adapter() -> Optional['AsyncMongoDBAdapter']:
+    """
+    Get the shared AsyncMongoDBAdapter for the running event loop
+    Returns None when this pymongo has no AsyncMongoClient (callers fall back
+    to the sync adapter on a worker thread)
+    """
+    if not ASYNC_MONGO_AVAILABLE:
+        return None
+    
+    loop = asyncio.get_running_loop()
+    adapter = _async_adapters.get(loop)
+    if adapter is not None:
+        return adapter
+    
+    with _async_lock:
+        adapter = _async_adapters.get(loop)
+        if adapter is None:
+            options = get_pool_options()
+            client = AsyncMongoClient(
+                _get_setting('MONGODB_URI', DEFAULT_MONGODB_URI),
+                maxPoolSize=options['MONGODB_MAX_POOL_SIZE'],
+                minPoolSize=options['MONGODB_MIN_POOL_SIZE'],
+                maxIdleTimeMS=options['MONGODB_MAX_IDLE_TIME_MS'],
+                waitQueueTimeoutMS=options['MONGODB_WAIT_QUEUE_TIMEOUT_MS'],
+                serverSelectionTimeoutMS=options['MONGODB_SERVER_SELECTION_TIMEOUT_MS'],
+                connectTimeoutMS=options['MONGODB_CONNECT_TIMEOUT_MS'],
+                socketTimeoutMS=options['MONGODB_SOCKET_TIMEOUT_MS'],
+                event_listeners=[_pool_monitor, _command_monitor],
+                connect=False,
+            )
+            adapter = AsyncMongoDBAdapter(client=client)
+            # Held by the adapter: the loop only keeps a weak reference to it
+            adapter._closer = _close_with_loop(loop, client)
+            loop.create_task(adapter._closer.__anext__())
+            _async_adapters[loop] = adapter
+        return adapter
+
+
+async def _close_with_loop(loop, client):
+    """
+    Close an async client on its own loop when that loop shuts down
+    Parked at its yield; asyncio.run() finalizes open async generators
+    (shutdown_asyncgens) before closing the loop, which runs the cleanup
+    """
+    try:
+        yield
+    finally:
+        with _async_lock:
+            _async_adapters.pop(loop, None)
+        await client.close()
+
+
+def get_adapter() -> 'MongoDBAdapter':
+    """Get the shared MongoDBAdapter bound to the process-wide client"""
+    adapter = _registry['adapter']
+    if adapter is not None and _registry['pid'] == os.getpid():
+        return adapter
+    
+    client = get_mongo_client()
+    with _registry_lock:
+        if _registry['adapter'] is None:
+            _registry['adapter'] = MongoDBAdapter(client=client)
+        return _registry['adapter']
+
+
+def close_mongo_client():
+    """Close the shared client (e.g. on shutdown); it is recreated on next use"""
+    with _registry_lock:
+        client = _registry['client']
+        if client is not None and _registry['pid'] == os.getpid():
+            client.close()
+        _registry.update({'pid': None, 'client': None, 'adapter': None})
+
+
+def _reset_after_fork():
+    """Drop the parent's client in a forked child without closing its sockets"""
+    _registry.update({'pid': None, 'client': None, 'adapter': None})
+    _async_adapters.clear()
+    _pool_monitor.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_pool_stats() -> Dict:
+    """Get connection pool usage for the shared client in this process"""
+    options = get_pool_options()
+    return {
+        'pid': os.getpid(),
+        'client_initialized': _registry['client'] is not None and _registry['pid'] == os.getpid(),
+        'database': _get_setting('MONGODB_DATABASE', DEFAULT_MONGODB_DATABASE),
+        'max_pool_size': options['MONGODB_MAX_POOL_SIZE'],
+        'min_pool_size': options['MONGODB_MIN_POOL_SIZE'],
+        'timeouts_ms': {
+            'max_idle_time': options['MONGODB_MAX_IDLE_TIME_MS'],
+            'wait_queue': options['MONGODB_WAIT_QUEUE_TIMEOUT_MS'],
+            'server_selection': options['MONGODB_SERVER_SELECTION_TIMEOUT_MS'],
+            'connect': options['MONGODB_CONNECT_TIMEOUT_MS'],
+            'socket': options['MONGODB_SOCKET_TIMEOUT_MS'],
+        },
+        'pool': _pool_monitor.snapshot(),
+        'commands': _command_monitor.snapshot(),
+    }
+
+
+def _collect_mongodb_metrics():
+    """MongoDB command counts and connection pool usage for /metrics"""
+    commands = _command_monitor.snapshot()
+    pool = _pool_monitor.snapshot()
+    return [
+        ('mongodb_commands_total', 'counter', 'MongoDB commands sent by this process',
+         [({'command': name}, stats['count']) for name, stats in commands.items()]),
+        ('mongodb_command_failures_total', 'counter', 'MongoDB commands that failed',
+         [({'command': name}, stats['failures']) for name, stats in commands.items()]),
+        ('mongodb_command_duration_seconds_total', 'counter', 'Time spent in MongoDB commands',
+         [({'command': name}, stats['seconds']) for name, stats in commands.items()]),
+        ('mongodb_pool_connections', 'gauge', 'MongoDB pool connections',
+         [({'state': 'open'}, pool['connections_open']), ({'state': 'checked_out'}, pool['checked_out'])]),
+        ('mongodb_pool_checkout_failures_total', 'counter', 'Failed MongoDB connection checkouts',
+         [({}, pool['checkout_failures'])]),
+    ]
+
+
+metrics_registry.register_collector(_collect_mongodb_metrics)
+
+
+# Weighted $text index over the searchable scheme fields
+TEXT_INDEX_NAME = 'scheme_text_search'
+TEXT_INDEX_WEIGHTS = {
+    'title': 10,
+    'keywords': 5,
+    'search_tags': 5,
+    'short_description': 3,
+    'description': 1,
+}
+# Per-document field naming the stemming language. MongoDB has no Kannada/Hindi
+# support, so those documents use 'none' (no stemming or stop words) rather than
+# being run through the English stemmer (or rejected by the default 'language' field)
+TEXT_LANGUAGE_FIELD = 'text_language'
+TEXT_SEARCH_LANGUAGES = {'en': 'english'}
+
+
+def text_search_language(scheme: Dict) -> str:
+    """Get the $text stemming language for a scheme document"""
+    language = scheme.get('language')
+    if not language:
+        # Untagged documents: treat anything written in a non-Latin script as unstemmed
+        title = scheme.get('title') or ''
+        language = 'en' if all(ord(char) < 0x0900 for char in title) else 'kn'
+    return TEXT_SEARCH_LANGUAGES.get(language, 'none')
+
+
+# Collection holding the scheme corpus version; every script that writes
+# government_schemes bumps it after writing, so caches and search indexes in all
+# worker processes know to drop what they hold. (Django's GovernmentScheme table
+# is a separate store that chat answers never read, so its edits do not bump it.)
+CORPUS_META_COLLECTION = 'corpus_meta'
+CORPUS_VERSION_ID = 'government_schemes'
+
+
+def bump_corpus_version(db) -> int:
+    """Record that the scheme corpus changed, returning the new version"""
+    meta = db[CORPUS_META_COLLECTION].find_one_and_update(
+        {"_id": CORPUS_VERSION_ID},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now()}},
+        upsert=True,
+        return_document=pymongo.ReturnDocument.AFTER
+    )
+    return meta['version']
+
+
+def get_corpus_version(db) -> int:
+    """Get the current scheme corpus version (0 if it was never bumped)"""
+    meta = db[CORPUS_META_COLLECTION].find_one({"_id": CORPUS_VERSION_ID}, {"version": 1})
+    return meta['version'] if meta else 0
+
+
+def prepare_scheme_document(scheme: Dict) -> Dict:
+    """Fill in the derived search fields of a scheme document before it is written"""
+    scheme[TEXT_LANGUAGE_FIELD] = text_search_language(scheme)
+    scheme[SEARCH_TERMS_FIELD] = build_search_terms(scheme)
+    return scheme
+
+
+def ensure_search_terms(collection) -> str:
+    """Backfill (or re-derive stale) search_terms token arrays and index them"""
+    projection = dict.fromkeys(SEARCH_TERMS_SOURCE_FIELDS + (SEARCH_TERMS_FIELD,), 1)
+    for scheme in collection.find({}, projection):
+        search_terms = build_search_terms(scheme)
+        if scheme.get(SEARCH_TERMS_FIELD) != search_terms:
+            collection.update_one({"_id": scheme['_id']}, {"$set": {SEARCH_TERMS_FIELD: search_terms}})
+    return collection.create_index(SEARCH_TERMS_FIELD)
+
+
+def ensure_text_index(collection) -> str:
+    """Create the weighted text index, replacing any older text index on the collection"""
+    for name, info in collection.index_information().items():
+        is_text_index = any(kind == 'text' for _, kind in info.get('key', []))
+        is_current = (
+            name == TEXT_INDEX_NAME
+            and info.get('weights') == TEXT_INDEX_WEIGHTS
+            and info.get('language_override') == TEXT_LANGUAGE_FIELD
+        )
+        if is_text_index and not is_current:
+            collection.drop_index(name)
+    
+    # Tag documents with their stemming language before the index sees them
+    for scheme in collection.find({TEXT_LANGUAGE_FIELD: {"$exists": False}}, {"language": 1, "title": 1}):
+        collection.update_one(
+            {"_id": scheme['_id']},
+            {"$set": {TEXT_LANGUAGE_FIELD: text_search_language(scheme)}}
+        )
+    
+    return collection.create_index(
+        [(field, pymongo.TEXT) for field in TEXT_INDEX_WEIGHTS],
+        name=TEXT_INDEX_NAME,
+        weights=TEXT_INDEX_WEIGHTS,
+        default_language='english',
+        language_override=TEXT_LANGUAGE_FIELD,
+    )
+
+
+def warm_search_index():
+    """Build the in-memory search index of the shared adapter (startup hook)"""
+    try:
+        adapter = get_adapter()
+        index = adapter.get_search_index()
+        print(f"Scheme search index ready: {index.get_stats()['documents']} schemes")
+    except Exception as e:
+        print(f"Scheme search index warmup failed: {e}")
+
 
 class MongoDBAdapter:
     """MongoDB adapter for government schemes"""
     
-    def __init__(self):
-        self.client = pymongo.MongoClient('mongodb://localhost:27017/')
-        self.db = self.client['Govt_schemes']  # Match case with existing database
+    # Available implementations behind search_schemes()
+    SEARCH_ENGINES = ('regex', 'bm25', 'text')
+    
+    # Fields a scheme must have filled in for intent-specific answers
+    INTENT_REQUIRED_FIELDS = {
+        'eligibility': 'eligibility_criteria',
+        'application': 'application_process',
+        'benefits': 'benefits',
+    }
+    
+    # Fields the compiled term predicates scan, and result limits, per search
+    SEARCH_FIELDS = {'text_fields': ("title", "description"), 'array_fields': ("keywords", "search_tags")}
+    ADVANCED_SEARCH_FIELDS = {'text_fields': ("title", "description", "short_description", "benefits"),
+                              'array_fields': ("keywords", "search_tags")}
+    SEARCH_LIMIT = 10
+    ADVANCED_SEARCH_LIMIT = 50  # Limit results to prevent overwhelming response
+    
+    def __init__(self, client: Optional[pymongo.MongoClient] = None, database_name: Optional[str] = None,
+                 search_engine: Optional[str] = None):
+        self.client = client or get_mongo_client()
+        self.db = self.client[database_name or _get_setting('MONGODB_DATABASE', DEFAULT_MONGODB_DATABASE)]
         self.schemes_collection = self.db['government_schemes']
+        
+        self.search_engine = search_engine or _get_setting('SCHEME_SEARCH_ENGINE', 'regex')
+        if self.search_engine not in self.SEARCH_ENGINES:
+            print(f"Unknown search engine '{self.search_engine}', using regex")
+            self.search_engine = 'regex'
+        
+        # In-memory BM25 index, built on first use (or by warm_search_index) and kept
+        # in step with the corpus version by a background thread
+        self._search_index = None
+        self._index_lock = threading.Lock()
+        self._index_version = None
+        self._index_watermark = None
+        self._index_refresher = None
     
     def search_schemes(self, query: str, keywords: List[str], entities: Dict, intent: str) -> List[Dict]:
-        """Search schemes in MongoDB"""
+        """Search schemes using the configured search engine"""
+        if self.search_engine == 'bm25':
+            return self._index_search(query, keywords, entities, intent)
+        if self.search_engine == 'text':
+            return self._text_search(query, keywords, entities, intent)
+        return self._regex_search(query, keywords, entities, intent)
+    
+    @classmethod
+    def _search_filter(cls, entities: Dict, intent: str) -> Dict:
+        """Filter shared by the search engines: active schemes, sector and intent-required field"""
+        # Start with active schemes
+        filter_query = {"is_active": True}
+        
+        # Apply sector filter
+        if entities.get('sectors'):
+            filter_query["sector"] = {"$in": entities['sectors']}
+        
+        # Additional filtering based on intent
+        required_field = cls.INTENT_REQUIRED_FIELDS.get(intent)
+        if required_field:
+            filter_query[required_field] = {"$exists": True, "$ne": ""}
+        
+        return filter_query
+    
+    @staticmethod
+    def _advanced_filter(sector: str, ministry: str, eligibility: str) -> Dict:
+        """Filter for advanced_search"""
+        # Start with active schemes
+        filter_query = {"is_active": True}
+        
+        # Sector filter (sector codes are stored lowercase, so match exactly)
+        if sector:
+            filter_query["sector"] = sector.strip().lower()
+        
+        # Ministry filter (escaped substring of a short field)
+        if ministry:
+            filter_query["ministry"] = {"$regex": re.escape(ministry.strip()[:MAX_QUERY_LENGTH]), "$options": "i"}
+        
+        # Eligibility filter
+        if eligibility:
+            eligibility_terms = query_compiler.compile(eligibility)
+            if eligibility_terms:
+                filter_query["eligibility_criteria"] = {
+                    "$regex": "|".join(re.escape(term) for term in eligibility_terms.terms),
+                    "$options": "i"
+                }
+        
+        return filter_query
+    
+    @staticmethod
+    def _advanced_sort(sort_by: str) -> Optional[List]:
+        """Sort order for advanced_search ('relevance' keeps the original order)"""
+        if sort_by == 'alphabetical':
+            return [("title", 1)]  # Ascending
+        if sort_by == 'newest':
+            return [("created_date", -1)]  # Descending
+        if sort_by == 'oldest':
+            return [("created_date", 1)]  # Ascending
+        return None
+    
+    @classmethod
+    def _text_query(cls, query: str, keywords: List[str], entities: Dict, intent: str) -> Tuple[Dict, Dict, List]:
+        """Filter, projection and sort of a $text search ranked by textScore"""
+        search_text = " ".join(keywords) if keywords else query
+        filter_query = {"$text": {"$search": search_text}, **cls._search_filter(entities, intent)}
+        text_score = {"$meta": "textScore"}
+        return filter_query, {"score": text_score}, [("score", text_score)]
+    
+    @classmethod
+    def _regex_query(cls, query: str, keywords: List[str], entities: Dict, intent: str) -> Optional[Dict]:
+        """_find_compiled arguments of a regex search (None when the query has no terms)"""
+        # Keywords when we have them, otherwise the words of the query itself
+        compiled = query_compiler.compile(keywords or query)
+        if not compiled:
+            return None
+        return {'filter_query': cls._search_filter(entities, intent), 'compiled': compiled,
+                'limit': cls.SEARCH_LIMIT, **cls.SEARCH_FIELDS}
+    
+    @classmethod
+    def _advanced_query(cls, keywords: List[str], sector: str, ministry: str, eligibility: str,
+                        sort_by: str) -> Dict:
+        """_find_compiled arguments of advanced_search (compiled is None without keywords)"""
+        return {'filter_query': cls._advanced_filter(sector, ministry, eligibility),
+                'compiled': query_compiler.compile(keywords) if keywords else None,
+                'limit': cls.ADVANCED_SEARCH_LIMIT, 'sort': cls._advanced_sort(sort_by),
+                **cls.ADVANCED_SEARCH_FIELDS}
+    
+    @staticmethod
+    def _compiled_queries(filter_query: Dict, compiled, text_fields, array_fields) -> Tuple[Dict, Dict]:
+        """
+        Queries of a compiled search: the one served by the search_terms index,
+        and the scan of the text fields used while documents lack search_terms
+        """
+        scan_filter = compiled.regex_filter(text_fields, array_fields)
+        scan_query = {**filter_query, "$and": filter_query.get("$and", []) + [scan_filter]}
+        return {**filter_query, **compiled.token_filter()}, scan_query
+    
+    @staticmethod
+    def _with_string_ids(schemes: List[Dict]) -> List[Dict]:
+        """Convert ObjectId to string for JSON serialization"""
+        for scheme in schemes:
+            scheme['_id'] = str(scheme['_id'])
+        return schemes
+    
+    def get_corpus_version(self) -> int:
+        """Get the current scheme corpus version"""
+        return get_corpus_version(self.db)
+    
+    def bump_corpus_version(self) -> int:
+        """Mark the scheme corpus as changed"""
+        return bump_corpus_version(self.db)
+    
+    def ensure_text_index(self) -> str:
+        """Create the weighted $text index used by the 'text' search engine"""
+        return ensure_text_index(self.schemes_collection)
+    
+    def _text_search(self, query: str, keywords: List[str], entities: Dict, intent: str) -> List[Dict]:
+        """Search schemes with the MongoDB $text index, ranked by textScore"""
         try:
-            # Start with active schemes
-            filter_query = {"is_active": True}
-            
-            # Apply sector filter
-            if entities.get('sectors'):
-                filter_query["sector"] = {"$in": entities['sectors']}
-            
-            # Break query into words for more flexible matching
-            query_words = query.lower().split()
-            
-            # Apply keyword search with more flexible matching
-            if keywords:
-                keyword_regex = "|".join(keywords)
-                filter_query["$or"] = [
-                    {"title": {"$regex": keyword_regex, "$options": "i"}},
-                    {"description": {"$regex": keyword_regex, "$options": "i"}},
-                    {"keywords": {"$elemMatch": {"$regex": keyword_regex, "$options": "i"}}},
-                    {"search_tags": {"$elemMatch": {"$regex": keyword_regex, "$options": "i"}}}
-                ]
-            else:
-                # If no keywords, use more flexible query matching
-                # Create regex patterns for each word in the query
-                word_patterns = [f".*{word}.*" for word in query_words]
-                combined_pattern = "|".join(word_patterns)
+            filter_query, projection, sort = self._text_query(query, keywords, entities, intent)
+            schemes = list(self.schemes_collection.find(filter_query, projection).sort(sort).limit(self.SEARCH_LIMIT))
+            if schemes:
+                return self._with_string_ids(schemes)
+            
+        except Exception as e:
+            print(f"MongoDB text search error: {e}")
+        
+        # Nothing matched the text index (or it is missing), so try the regex path
+        return self._regex_search(query, keywords, entities, intent)
+    
+    def get_search_index(self):
+        """Get the in-memory search index, building it on first use"""
+        if self._search_index is None:
+            with self._index_lock:
+                if self._search_index is None:
+                    # Version first: a write landing during the build bumps it again
+                    self._index_version = self.get_corpus_version()
+                    self._search_index = self._build_search_index()
+            self._start_index_refresher()
+        return self._search_index
+    
+    def _build_search_index(self):
+        """Build a new index from the active schemes and reset the incremental sync watermark"""
+        from chatbot.search_index import SchemeSearchIndex
+        index = SchemeSearchIndex()
+        schemes = list(self.schemes_collection.find({"is_active": True}))
+        index.build(schemes)
+        self._index_watermark = self._latest_update(schemes, None)
+        return index
+    
+    def _start_index_refresher(self):
+        """Refresh the index every SCHEME_SEARCH_INDEX_REFRESH_SECONDS off the request path"""
+        interval = float(_get_setting('SCHEME_SEARCH_INDEX_REFRESH_SECONDS', 60))
+        if interval <= 0:
+            return
+        with self._index_lock:
+            if self._index_refresher is not None:
+                return
+            
+            def refresh_forever():
+                while True:
+                    time.sleep(interval)
+                    self._refresh_search_index()
+            
+            self._index_refresher = threading.Thread(
+                target=refresh_forever, name='scheme-index-refresh', daemon=True
+            )
+            self._index_refresher.start()
+    
+    def _refresh_search_index(self) -> bool:
+        """
+        Bring the index up to date if the corpus version moved since the last sync
+        Schemes whose updated_at is past the watermark are applied one at a time;
+        deletions and edits that left updated_at alone cannot be followed that
+        way, so those rebuild the index (off to the side, then swapped in)
+        Returns:
+            True if the index changed
+        """
+        with self._index_lock:
+            try:
+                version = self.get_corpus_version()
+                if self._search_index is None or version == self._index_version:
+                    return False
                 
-                filter_query["$or"] = [
-                    {"title": {"$regex": combined_pattern, "$options": "i"}},
-                    {"description": {"$regex": combined_pattern, "$options": "i"}},
-                    {"keywords": {"$elemMatch": {"$regex": combined_pattern, "$options": "i"}}},
-                    {"search_tags": {"$elemMatch": {"$regex": combined_pattern, "$options": "i"}}}
-                ]
-            
-            # Additional filtering based on intent
-            if intent == 'eligibility':
-                filter_query["eligibility_criteria"] = {"$exists": True, "$ne": ""}
-            elif intent == 'application':
-                filter_query["application_process"] = {"$exists": True, "$ne": ""}
-            elif intent == 'benefits':
-                filter_query["benefits"] = {"$exists": True, "$ne": ""}
-            
-            # Execute query without text score
-            schemes = list(self.schemes_collection.find(
-                filter_query
-            ).limit(10))
-            
-            # Convert ObjectId to string for JSON serialization
-            for scheme in schemes:
-                scheme['_id'] = str(scheme['_id'])
+                index = self._search_index
+                changed = []
+                if self._index_watermark is not None:
+                    changed = list(self.schemes_collection.find({"updated_at": {"$gt": self._index_watermark}}))
+                for scheme in changed:
+                    if scheme.get('is_active'):
+                        index.add_document(scheme)
+                    else:
+                        index.remove_document(scheme['_id'])
+                self._index_watermark = self._latest_update(changed, self._index_watermark)
+                
+                if not changed or self.schemes_collection.count_documents({"is_active": True}) != len(index):
+                    self._search_index = self._build_search_index()
+                self._index_version = version
+                return True
+            except Exception as e:
+                print(f"Search index refresh error: {e}")
+                return False
+    
+    @staticmethod
+    def _latest_update(schemes: List[Dict], current):
+        """Get the newest updated_at among schemes (the incremental sync watermark)"""
+        for scheme in schemes:
+            updated_at = scheme.get('updated_at')
+            if isinstance(updated_at, datetime) and (current is None or updated_at > current):
+                current = updated_at
+        return current
+    
+    def _index_search(self, query: str, keywords: List[str], entities: Dict, intent: str) -> List[Dict]:
+        """Search schemes with the in-memory BM25 index, ranked by relevance"""
+        try:
+            index = self.get_search_index()
             
-            return schemes
+            sectors = set(entities.get('sectors') or [])
+            required_field = self.INTENT_REQUIRED_FIELDS.get(intent)
+            
+            def matches_filters(scheme: Dict) -> bool:
+                if sectors and scheme.get('sector') not in sectors:
+                    return False
+                if required_field and not scheme.get(required_field):
+                    return False
+                return True
+            
+            terms = keywords or query.lower().split()
+            results = index.search(terms, limit=10, filter_fn=matches_filters)
+            return [scheme for score, scheme in results]
+            
+        except Exception as e:
+            print(f"Search index error: {e}")
+            return self._regex_search(query, keywords, entities, intent)
+    
+    def _regex_search(self, query: str, keywords: List[str], entities: Dict, intent: str) -> List[Dict]:
+        """Search schemes in MongoDB with compiled, escaped term predicates"""
+        try:
+            search = self._regex_query(query, keywords, entities, intent)
+            return self._find_compiled(**search) if search else []
             
         except Exception as e:
             print(f"MongoDB search error: {e}")
             return []
     
+    def _find_compiled(self, filter_query: Dict, compiled, text_fields, array_fields,
+                       limit: int, sort: Optional[List] = None) -> List[Dict]:
+        """
+        Run a compiled query against the search_terms token index, scanning the
+        text fields only while some documents have not been given search_terms
+        """
+        indexed_query, scan_query = self._compiled_queries(filter_query, compiled, text_fields, array_fields)
+        cursor = self.schemes_collection.find(indexed_query)
+        if sort:
+            cursor = cursor.sort(sort)
+        schemes = list(cursor.limit(limit))
+        shape = query_compiler.INDEXED_SHAPE
+        
+        if not schemes and self.schemes_collection.find_one({SEARCH_TERMS_FIELD: {"$exists": False}}, {"_id": 1}):
+            cursor = self.schemes_collection.find(scan_query)
+            if sort:
+                cursor = cursor.sort(sort)
+            schemes = list(cursor.limit(limit))
+            shape = query_compiler.SCAN_SHAPE
+        
+        query_compiler.report(compiled, shape, len(schemes))
+        return self._with_string_ids(schemes)
+    
     def advanced_search(self, query: str, keywords: List[str], entities: Dict, 
                        sector: str = '', ministry: str = '', eligibility: str = '', 
                        sort_by: str = 'relevance') -> List[Dict]:
@@ -76,56 +748,16 @@ class MongoDBAdapter:
         Advanced search with enhanced filtering and sorting
         """
         try:
-            # Start with active schemes
-            filter_query = {"is_active": True}
-            
-            # Sector filter
-            if sector:
-                filter_query["sector"] = {"$regex": sector, "$options": "i"}
-            
-            # Ministry filter
-            if ministry:
-                filter_query["ministry"] = {"$regex": ministry, "$options": "i"}
-            
-            # Eligibility filter
-            if eligibility:
-                eligibility_words = eligibility.lower().split()
-                eligibility_patterns = [f".*{word}.*" for word in eligibility_words]
-                eligibility_regex = "|".join(eligibility_patterns)
-                filter_query["eligibility_criteria"] = {"$regex": eligibility_regex, "$options": "i"}
+            search = self._advanced_query(keywords, sector, ministry, eligibility, sort_by)
             
             # Keyword search (if provided)
-            if keywords:
-                keyword_regex = "|".join([f".*{kw}.*" for kw in keywords])
-                filter_query["$or"] = [
-                    {"title": {"$regex": keyword_regex, "$options": "i"}},
-                    {"description": {"$regex": keyword_regex, "$options": "i"}},
-                    {"short_description": {"$regex": keyword_regex, "$options": "i"}},
-                    {"keywords": {"$elemMatch": {"$regex": keyword_regex, "$options": "i"}}},
-                    {"search_tags": {"$elemMatch": {"$regex": keyword_regex, "$options": "i"}}},
-                    {"benefits": {"$regex": keyword_regex, "$options": "i"}}
-                ]
-            
-            # Execute query with sorting
-            cursor = self.schemes_collection.find(filter_query)
-            
-            # Apply sorting
-            if sort_by == 'alphabetical':
-                cursor = cursor.sort("title", 1)  # Ascending
-            elif sort_by == 'newest':
-                cursor = cursor.sort("created_date", -1)  # Descending
-            elif sort_by == 'oldest':
-                cursor = cursor.sort("created_date", 1)  # Ascending
-            # For 'relevance', keep original order (no sorting)
-            
-            # Limit results to prevent overwhelming response
-            schemes = list(cursor.limit(50))
-            
-            # Convert ObjectId to string for JSON serialization
-            for scheme in schemes:
-                scheme['_id'] = str(scheme['_id'])
+            if search['compiled']:
+                return self._find_compiled(**search)
             
-            return schemes
+            cursor = self.schemes_collection.find(search['filter_query'])
+            if search['sort']:
+                cursor = cursor.sort(search['sort'])
+            return self._with_string_ids(list(cursor.limit(search['limit'])))
             
         except Exception as e:
             print(f"MongoDB advanced search error: {e}")
@@ -193,9 +825,103 @@ class MongoDBAdapter:
             print(f"MongoDB statistics error: {e}")
             return {"total_schemes": 0, "active_schemes": 0, "sectors": {}}
 
+
+
+class AsyncMongoDBAdapter:
+    """
+    Async counterpart of MongoDBAdapter for the async views
+    Builds the same queries (MongoDBAdapter's filter helpers) and runs them on
+    an AsyncMongoClient, so waiting on MongoDB does not hold a thread
+    """
+    
+    def __init__(self, client, database_name: Optional[str] = None, search_engine: Optional[str] = None):
+        self.client = client
+        self.db = self.client[database_name or _get_setting('MONGODB_DATABASE', DEFAULT_MONGODB_DATABASE)]
+        self.schemes_collection = self.db['government_schemes']
+        
+        self.search_engine = search_engine or _get_setting('SCHEME_SEARCH_ENGINE', 'regex')
+        if self.search_engine not in MongoDBAdapter.SEARCH_ENGINES:
+            self.search_engine = 'regex'
+    
+    async def search_schemes(self, query: str, keywords: List[str], entities: Dict, intent: str) -> List[Dict]:
+        """Search schemes using the configured search engine"""
+        if self.search_engine == 'bm25':
+            # The BM25 index lives in memory, shared with the sync adapter that keeps it fresh
+            return await asyncio.to_thread(get_adapter().search_schemes, query, keywords, entities, intent)
+        if self.search_engine == 'text':
+            return await self._text_search(query, keywords, entities, intent)
+        return await self._regex_search(query, keywords, entities, intent)
+    
+    async def get_corpus_version(self) -> int:
+        """Get the current scheme corpus version (0 if it was never bumped)"""
+        meta = await self.db[CORPUS_META_COLLECTION].find_one({"_id": CORPUS_VERSION_ID}, {"version": 1})
+        return meta['version'] if meta else 0
+    
+    async def _text_search(self, query: str, keywords: List[str], entities: Dict, intent: str) -> List[Dict]:
+        """Search schemes with the MongoDB $text index, ranked by textScore"""
+        try:
+            filter_query, projection, sort = MongoDBAdapter._text_query(query, keywords, entities, intent)
+            schemes = await self.schemes_collection.find(filter_query, projection).sort(sort).limit(
+                MongoDBAdapter.SEARCH_LIMIT).to_list()
+            if schemes:
+                return MongoDBAdapter._with_string_ids(schemes)
+            
+        except Exception as e:
+            print(f"MongoDB text search error: {e}")
+        
+        return await self._regex_search(query, keywords, entities, intent)
+    
+    async def _regex_search(self, query: str, keywords: List[str], entities: Dict, intent: str) -> List[Dict]:
+        """Search schemes in MongoDB with compiled, escaped term predicates"""
+        try:
+            search = MongoDBAdapter._regex_query(query, keywords, entities, intent)
+            return await self._find_compiled(**search) if search else []
+            
+        except Exception as e:
+            print(f"MongoDB search error: {e}")
+            return []
+    
+    async def _find_compiled(self, filter_query: Dict, compiled, text_fields, array_fields,
+                             limit: int, sort: Optional[List] = None) -> List[Dict]:
+        """See MongoDBAdapter._find_compiled"""
+        indexed_query, scan_query = MongoDBAdapter._compiled_queries(filter_query, compiled, text_fields, array_fields)
+        cursor = self.schemes_collection.find(indexed_query)
+        if sort:
+            cursor = cursor.sort(sort)
+        schemes = await cursor.limit(limit).to_list()
+        shape = query_compiler.INDEXED_SHAPE
+        
+        if not schemes and await self.schemes_collection.find_one({SEARCH_TERMS_FIELD: {"$exists": False}}, {"_id": 1}):
+            cursor = self.schemes_collection.find(scan_query)
+            if sort:
+                cursor = cursor.sort(sort)
+            schemes = await cursor.limit(limit).to_list()
+            shape = query_compiler.SCAN_SHAPE
+        
+        query_compiler.report(compiled, shape, len(schemes))
+        return MongoDBAdapter._with_string_ids(schemes)
+    
+    async def advanced_search(self, query: str, keywords: List[str], entities: Dict,
+                              sector: str = '', ministry: str = '', eligibility: str = '',
+                              sort_by: str = 'relevance') -> List[Dict]:
+        """Advanced search with enhanced filtering and sorting (see MongoDBAdapter.advanced_search)"""
+        try:
+            search = MongoDBAdapter._advanced_query(keywords, sector, ministry, eligibility, sort_by)
+            if search['compiled']:
+                return await self._find_compiled(**search)
+            
+            cursor = self.schemes_collection.find(search['filter_query'])
+            if search['sort']:
+                cursor = cursor.sort(search['sort'])
+            return MongoDBAdapter._with_string_ids(await cursor.limit(search['limit']).to_list())
+            
+        except Exception as e:
+            print(f"MongoDB advanced search error: {e}")
+            return []
+
 # Test the adapter
 if __name__ == "__main__":
-    adapter = MongoDBAdapter()
+    adapter = get_adapter()
     
     print("Testing MongoDB Adapter:")
     print("=" * 40)
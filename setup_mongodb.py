@@ -2,6 +2,7 @@ import os
 import pymongo
 from datetime import datetime
 import json
+from mongodb_adapter import bump_corpus_version, ensure_search_terms, ensure_text_index, prepare_scheme_document
 
 # MongoDB connection
 MONGODB_URI = 'mongodb://localhost:27017/'
@@ -837,6 +838,8 @@ def setup_mongodb_with_sample_data():
     
     # Insert comprehensive sample data
     schemes_data = create_comprehensive_sample_data()
+    for scheme in schemes_data:
+        prepare_scheme_document(scheme)
     
     try:
         result = schemes_collection.insert_many(schemes_data)
@@ -847,9 +850,13 @@ def setup_mongodb_with_sample_data():
         schemes_collection.create_index("keywords")
         schemes_collection.create_index("search_tags")
         schemes_collection.create_index("is_active")
-        schemes_collection.create_index([("title", "text"), ("description", "text"), ("keywords", "text")])
+        ensure_search_terms(schemes_collection)
+        ensure_text_index(schemes_collection)
         print("[OK] Created indexes for better search performance")
         
+        # Invalidate cached query results in running servers
+        bump_corpus_version(db)
+        
         # Verify data
         total_schemes = schemes_collection.count_documents({})
         active_schemes = schemes_collection.count_documents({"is_active": True})
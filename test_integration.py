@@ -35,8 +35,7 @@ def test_chatbot_logic():
     print("\nTesting chatbot logic...")
     try:
         # Set up chatbot
-        chatbot.set_session("test_session_123")
-        chatbot.set_language("en")
+        context = chatbot.get_context("test_session_123", "en")
         
         # Test queries
         test_queries = [
@@ -48,7 +47,7 @@ def test_chatbot_logic():
         
         for query in test_queries:
             print(f"\n🔍 Testing query: '{query}'")
-            result = chatbot.process_query(query, "en")
+            result = chatbot.process_query(query, "en", context=context)
             
             if result['success']:
                 print(f"   ✅ Success: Found {len(result['schemes'])} schemes")
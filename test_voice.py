@@ -31,7 +31,7 @@ def test_voice_processor():
     try:
         vp = VoiceProcessor()
         print(f"✅ Voice processor initialized successfully")
-        print(f"   Whisper model: {'Loaded' if vp.whisper_model else 'Not loaded (using fallback)'}")
+        print(f"   Whisper model: {'Loaded' if vp.stt_engine else 'Not loaded (using fallback)'}")
         print(f"   TTS engine: {'Available' if vp._get_tts_engine() else 'Not available'}")
         
         return True
@@ -66,12 +66,11 @@ def test_chatbot_voice_integration():
     print("\nTesting Chatbot Voice Integration...")
     
     try:
-        chatbot.set_session("test_voice_session")
-        chatbot.set_language("en")
+        context = chatbot.get_context("test_voice_session", "en")
         
         # Test with a dummy audio file path (will use fallback)
         dummy_audio_path = "dummy_audio.wav"
-        result = chatbot.process_voice_query(dummy_audio_path)
+        result = chatbot.process_voice_query(dummy_audio_path, context=context)
         
         print(f"   Voice query processing: {'✅ Working' if 'success' in result else '❌ Failed'}")
         print(f"   Response structure: {list(result.keys())}")